@@ -1,32 +1,190 @@
 #!/usr/bin/python3
 """Console Module"""
 
+import argparse
+import ast
 import cmd
-from models.base_model import BaseModel
-from models import storage
-from models.engine.file_storage import FileStorage
-from models.user import User
-from models.state import State
-from models.city import City
-from models.amenity import Amenity
-from models.place import Place
-from models.review import Review
+import copy
+import io
+import json
+import re
+import sys
+from collections import namedtuple
+from functools import lru_cache
+from itertools import islice
+import models
+from models.engine.query import Query
+from models.engine.serializers import SERIALIZERS
 import shlex
 
+CONDITION = re.compile(r"(\w+)\s*(<=|>=|==|!=|<|>|=)\s*(.*)", re.DOTALL)
+QUOTED = re.compile(r""""(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'""", re.DOTALL)
+ARGUMENT = re.compile(r"""\s*(\{.*\}|\[.*\]|
+                      (?:"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'|[^,"'])*?)
+                      \s*(,|$)""", re.VERBOSE | re.DOTALL)
+DOT_COMMAND = re.compile(r"([^.]*)\.([^(]*)\((.*)\)", re.DOTALL)
+PLAIN_COMMAND = re.compile(r"([A-Za-z0-9_]*)(.*)", re.DOTALL)
+
+Command = namedtuple("Command", ("class_name", "name", "arguments",
+                                 "error"))
+
+
+@lru_cache(maxsize=4096)
+def parse(line):
+    """Returns the Command written as ``<class>.<name>(<parameters>)``
+    in line, with the tuple of its arguments read by ``parse_arguments``
+    or the error that prevented it, or None if line is not written that
+    way
+    """
+    match = DOT_COMMAND.fullmatch(line.strip())
+    if match is None:
+        return None
+    class_name, name, parameters = match.groups()
+    try:
+        return Command(class_name, name,
+                       tuple(parse_arguments(parameters)), None)
+    except ValueError as error:
+        return Command(class_name, name, (), str(error))
+
+
+@lru_cache(maxsize=4096)
+def parse_plain(line):
+    """Returns the (command, argument, line) of a ``<command> <argument>``
+    line, as ``cmd.Cmd.parseline`` does
+    """
+    line = line.strip()
+    if not line:
+        return None, None, line
+    if line[0] == "?":
+        line = "help " + line[1:]
+    command, arg = PLAIN_COMMAND.match(line).groups()
+    return command, arg.strip(), line
+
+
+def parse_dictionary(text):
+    """Returns the dictionary written in text as JSON or else as a Python
+    literal, or None if text is neither
+    """
+    try:
+        value = json.loads(text)
+    except ValueError:
+        try:
+            value = ast.literal_eval(text.strip())
+        except (ValueError, SyntaxError, TypeError):
+            return None
+    return value if isinstance(value, dict) else None
+
+
+def parse_arguments(parameters):
+    """Returns the list of the comma separated arguments of a dot
+    command: quoted strings unquoted, dictionaries parsed by
+    ``parse_dictionary``, and anything else, such as an unquoted id or
+    value or a ``field<op>value`` condition, as written
+
+    Raises ValueError if an argument is empty, has an unterminated
+    quote or is an invalid dictionary.
+    """
+    arguments = []
+    pos = 0
+    parameters = parameters.strip()
+    while pos < len(parameters):
+        match = ARGUMENT.match(parameters, pos)
+        if match is None or not match.group(1):
+            raise ValueError("invalid arguments")
+        argument = match.group(1)
+        if argument[0] == "{":
+            argument = parse_dictionary(argument)
+            if argument is None:
+                raise ValueError("invalid dictionary")
+        elif QUOTED.fullmatch(argument):
+            try:
+                argument = ast.literal_eval(argument)
+            except (ValueError, SyntaxError):
+                argument = argument[1:-1]
+        arguments.append(argument)
+        pos = match.end()
+    return arguments
+
+
+class ScriptOutput(io.TextIOBase):
+    """A class representing ScriptOutput
+
+    Stands for stdout while a script runs: output lines are passed on to
+    out as they are written, except the ``** ... **`` error lines, which
+    go to err prefixed with ``location`` and are counted in ``failures``.
+    """
+
+    def __init__(self, out, err):
+        """Initializes the output writing to out and err"""
+        self.out = out
+        self.err = err
+        self.location = ""
+        self.failures = 0
+        self.line = ""
+        self.forward = False
+
+    def writable(self):
+        """Returns True"""
+        return True
+
+    def write(self, text):
+        """Writes text, deciding where each line goes from its first two
+        characters
+        """
+        written = len(text)
+        while text:
+            end = text.find("\n") + 1 or len(text)
+            part, text = text[:end], text[end:]
+            if self.forward:
+                self.out.write(part)
+            else:
+                self.line += part
+                if not self.line.startswith("**"[:len(self.line)]):
+                    self.out.write(self.line)
+                    self.line = ""
+                    self.forward = True
+                elif self.line.endswith("\n"):
+                    self.error(self.line)
+                    self.line = ""
+            if part.endswith("\n"):
+                self.forward = False
+        return written
+
+    def finish(self):
+        """Ends the output of a command, completing its last line"""
+        if self.line:
+            self.write("\n")
+        self.forward = False
+
+    def error(self, message):
+        """Reports the error message at the current location"""
+        self.err.write(f"{self.location}: {message.rstrip()}\n")
+        self.failures += 1
+
+    def flush(self):
+        """Flushes out and err"""
+        self.out.flush()
+        self.err.flush()
+
 
 class HBNBCommand(cmd.Cmd):
     """Entry point to command interpreter"""
     prompt = '(hbnb) '
-    defined_classes = {
-            "BaseModel": BaseModel,
-            "User": User,
-            "Place": Place,
-            "State": State,
-            "City": City,
-            "Amenity": Amenity,
-            "Review": Review
+    class_list = list(models.classes)
+    read_commands = {"show", "all", "count", "query", "explain", "help"}
+
+    read_dot_commands = {"all", "count", "show", "where", "near", "within",
+                         "nearest", "sum", "avg", "min", "max", "count_by",
+                         "cities", "places", "reviews"}
+
+    reserved_attributes = {"id", "created_at", "updated_at", "__class__"}
+
+    relation_commands = {
+            "State": ("cities",),
+            "City": ("places",),
+            "User": ("places", "reviews"),
+            "Place": ("reviews",)
             }
-    class_list = list(defined_classes.keys())
 
     def do_quit(self, _):
         """Quit command to exit the program
@@ -52,89 +210,140 @@ class HBNBCommand(cmd.Cmd):
         if args[0] not in HBNBCommand.class_list:
             print("** class doesn't exist **")
             return
-        new_instance = HBNBCommand.defined_classes[args[0]]()
+        new_instance = models.get_class(args[0])()
         new_instance.save()
         print(new_instance.id)
 
     def do_show(self, arg):
         """Prints string representation of instance based on class name and id
         """
-        if not arg:
-            print("** class name missing **")
-            return
-        args = arg.split()
-        if args[0] not in HBNBCommand.class_list:
-            print("** class doesn't exist **")
-            return
-        if len(args) < 2:
-            print("** instance id missing **")
-            return
-        obj_key = f"{args[0]}.{args[1]}"
-        objects = FileStorage.get_objects()
-        if obj_key not in objects:
-            print("** no instance found **")
-            return
-        else:
-            print(objects[obj_key])
+        obj = self.instance(arg.split())
+        if obj is not None:
+            print(obj)
 
     def do_destroy(self, arg):
         """Deletes an instance based on the class name and id
         """
-        if not arg:
+        obj = self.instance(arg.split())
+        if obj is not None:
+            models.storage.delete(obj)
+            models.storage.save()
+
+    def instance(self, args):
+        """Returns the instance named by the class name and id of args, or
+        None after printing why there is none
+        """
+        if not args:
             print("** class name missing **")
-            return
-        args = arg.split()
+            return None
         if args[0] not in HBNBCommand.class_list:
             print("** class doesn't exist **")
-            return
+            return None
         if len(args) < 2:
             print("** instance id missing **")
-            return
-        obj_key = f"{args[0]}.{args[1]}"
-        objects = FileStorage.get_objects()
-        if obj_key not in objects:
+            return None
+        obj = models.storage.get(args[0], args[1])
+        if obj is None:
             print("** no instance found **")
+        return obj
+
+    def do_count(self, arg):
+        """Prints the number of instances of a class, or of all classes:
+        count [<class>]
+        """
+        class_name = arg.strip() or None
+        if class_name is not None and class_name not in HBNBCommand.class_list:
+            print("** class doesn't exist **")
             return
-        else:
-            del objects[obj_key]
-            storage.save()
+        print(models.storage.count(class_name))
 
     def do_all(self, arg):
-        """Prints all string representation of all instances
+        """Prints all string representation of all instances:
+        all [<class>] [limit=<n>] [offset=<n>] [after=<key>]
+        [format=repr|json|ndjson]
+        """
+        self.list_all(arg.split())
+
+    def list_all(self, args):
+        """Prints the instances of the class named by args[0], or of all
+        classes, with the paging and format options that follow
         """
-        instance_list = []
-        objects = FileStorage.get_objects()
-        if arg:
-            args = arg.split()
-            if args[0] not in HBNBCommand.class_list:
+        class_name = None
+        if args and "=" not in args[0]:
+            class_name = args.pop(0)
+            if class_name not in HBNBCommand.class_list:
                 print("** class doesn't exist **")
                 return
+        options = self.options(args)
+        if options is None:
+            print("** invalid option **")
+            return
+        with models.storage.reading():
+            if class_name is None:
+                objects = models.storage.all()
             else:
-                for obj_key, obj in objects.items():
-                    if obj.__class__.__name__ == args[0]:
-                        instance_list.append(str(obj))
-        else:
-            for obj_key, obj in objects.items():
-                instance_list.append(str(obj))
-        print(instance_list)
+                objects = models.storage.all(class_name)
+            items = iter(objects.items())
+            after = options.get("after")
+            if after is not None:
+                if class_name is not None and "." not in after:
+                    after = f"{class_name}.{after}"
+                for obj_key, _ in items:
+                    if obj_key == after:
+                        break
+            limit = options.get("limit")
+            stop = None if limit is None else options["offset"] + limit
+            objects = (obj for _, obj in islice(items, options["offset"],
+                                                stop))
+            self.stream(objects, options["format"])
+
+    def options(self, args):
+        """Returns the dictionary of the paging and format options of all
+        written as ``key=value``, or None if one is invalid
+        """
+        options = {"offset": 0, "format": "repr"}
+        for option in args:
+            key, _, value = option.partition("=")
+            if key in ("limit", "offset") and value.isdigit():
+                options[key] = int(value)
+            elif key == "after" and value:
+                options[key] = value.strip('"\'')
+            elif key == "format" and value in ("repr", "json", "ndjson"):
+                options[key] = value
+            else:
+                return None
+        return options
+
+    def stream(self, objects, output="repr"):
+        """Prints objects one at a time: as the repr of the list of their
+        strings, as a JSON array, or as one JSON object per line
+        """
+        out = sys.stdout
+        if output == "ndjson":
+            for obj in objects:
+                out.write(json.dumps(obj.to_dict()) + "\n")
+            return
+        separator = "["
+        for obj in objects:
+            out.write(separator)
+            if output == "repr":
+                out.write(repr(str(obj)))
+            else:
+                out.write(json.dumps(obj.to_dict()))
+            separator = ", "
+        out.write("[]\n" if separator == "[" else "]\n")
 
     def do_update(self, arg):
         """Updates an instance based on the class name and id
         """
-        if not arg:
-            print("** class name missing **")
-            return
-        args = shlex.split(arg)
-        if args[0] not in HBNBCommand.class_list:
-            print("** class doesn't exist **")
-            return
-        if len(args) < 2:
-            print("** instance id missing **")
-            return
-        obj_key = f"{args[0]}.{args[1]}"
-        objects = FileStorage.get_objects()
-        if obj_key not in objects:
-            print("** no instance found **")
+        self.update(shlex.split(arg))
+
+    def update(self, args):
+        """Updates the instance named by the class name and id of args with
+        the attribute name and value pairs that follow them
+        """
+        obj = self.instance(args)
+        if obj is None:
             return
         if len(args) < 3:
             print("** attribute name missing **")
@@ -142,111 +351,400 @@ class HBNBCommand(cmd.Cmd):
         if len(args) < 4:
             print("** value missing **")
             return
-        obj = objects[obj_key]
-        attribute_name = args[2].strip('"').strip("'")
-        attribute = args[3].strip('"').strip("'")
+        if len(args) % 2:
+            print("** value missing **")
+            return
+        names = [name.strip('"').strip("'") for name in args[2::2]]
+        if self.reserved(names):
+            return
+        attributes = {}
+        for attribute_name, attribute in zip(names, args[3::2]):
+            attribute = attribute.strip('"').strip("'")
+            attributes[attribute_name] = self.cast(obj, attribute_name,
+                                                   attribute)
+        self.update_instance(obj, attributes)
+
+    def reserved(self, attribute_names):
+        """Prints an error and returns True if one of attribute_names is
+        kept by storage and cannot be updated
+        """
+        if HBNBCommand.reserved_attributes.isdisjoint(attribute_names):
+            return False
+        print("** attribute can't be updated **")
+        return True
+
+    def update_instance(self, obj, attributes):
+        """Sets all attributes on obj, then saves it once
+        """
+        if not attributes:
+            return
+        for attribute_name, attribute in attributes.items():
+            setattr(obj, attribute_name, attribute)
+        obj.save()
+
+    def cast(self, obj, attribute_name, attribute):
+        """Converts the string attribute to the type of the existing
+        attribute of obj, or to a number when it looks like one
+        """
         if hasattr(obj, attribute_name):
             attribute_type = type(getattr(obj, attribute_name))
-            attribute = attribute_type(attribute)
+            return attribute_type(attribute)
+        if attribute.isdigit():
+            return int(attribute)
+        try:
+            return float(attribute)
+        except ValueError:
+            return attribute
+
+    def do_begin(self, _):
+        """Starts a transaction: changes are saved together on commit
+        """
+        models.storage.begin()
+
+    def do_commit(self, _):
+        """Saves all changes made since begin
+        """
+        if not models.storage.in_transaction():
+            print("** no transaction in progress **")
+            return
+        models.storage.commit()
+
+    def do_rollback(self, _):
+        """Discards all changes made since begin
+        """
+        if not models.storage.in_transaction():
+            print("** no transaction in progress **")
+            return
+        models.storage.rollback()
+
+    def do_sync(self, _):
+        """Waits until every saved change is written to disk
+        """
+        if models.storage.in_transaction():
+            print("** transaction in progress **")
+            return
+        models.storage.flush()
+
+    def do_convert(self, arg):
+        """Rewrites the storage files in another format:
+        convert json|binary|gzip|lzma
+        """
+        name = arg.strip()
+        if not name:
+            print("** format missing **")
+        elif name not in SERIALIZERS:
+            print("** unknown format **")
+        elif not hasattr(models.storage, "convert"):
+            print("** storage has no file format **")
+        elif models.storage.in_transaction():
+            print("** transaction in progress **")
         else:
-            if attribute.isdigit():
-                attribute = int(attribute)
-            else:
-                try:
-                    attribute = float(attribute)
-                except ValueError:
-                    pass
-        setattr(obj, attribute_name, attribute)
-        obj.save()
+            models.storage.convert(name)
+
+    def run_batch(self, lines, name="<stdin>", checkpoint=0):
+        """Runs the commands of lines with saves deferred until the end,
+        or written every checkpoint commands. Blank lines and lines
+        starting with # are skipped. Returns the number of failed lines
+        and saves, a failed final save being reported at ``<name>:end``
+        """
+        stdout = sys.stdout
+        output = ScriptOutput(stdout, sys.stderr)
+        executed = 0
+        sys.stdout = output
+        try:
+            with models.storage.deferred():
+                for number, line in enumerate(lines, 1):
+                    line = line.strip()
+                    if not line or line.startswith("#"):
+                        continue
+                    output.location = f"{name}:{number}"
+                    try:
+                        stop = self.onecmd(line)
+                    except Exception as error:
+                        output.error(f"** {type(error).__name__}: "
+                                     f"{error} **")
+                        stop = False
+                    output.finish()
+                    if stop:
+                        break
+                    executed += 1
+                    if checkpoint and executed % checkpoint == 0:
+                        try:
+                            models.storage.flush()
+                        except Exception as error:
+                            output.error(f"** {type(error).__name__}: "
+                                         f"{error} **")
+        except Exception as error:
+            output.location = f"{name}:end"
+            output.error(f"** {type(error).__name__}: {error} **")
+        finally:
+            sys.stdout = stdout
+            output.flush()
+        return output.failures
+
+    def do_query(self, arg):
+        """Prints the instances found by a query:
+        query <class> [where <field> <op> <value> [and ...]]
+        [order by <field> [asc|desc]] [limit <n>] [offset <n>]
+        """
+        with models.storage.reading():
+            plan = self.plan(arg)
+            objects = None if plan is None else plan.execute()
+        if objects is not None:
+            self.stream(objects.values())
+
+    def do_explain(self, arg):
+        """Prints how a query would be run and its estimated cost:
+        explain <class> [where ...] [order by ...] [limit <n>] [offset <n>]
+        """
+        plan = self.plan(arg)
+        if plan is not None:
+            print(plan)
+
+    def plan(self, arg):
+        """Returns the storage plan for the query arg, or None after
+        printing why there is none
+        """
+        if not arg:
+            print("** class name missing **")
+            return None
+        try:
+            query = Query.parse(arg)
+        except ValueError:
+            print("** invalid query **")
+            return None
+        if query.class_name not in HBNBCommand.class_list:
+            print("** class doesn't exist **")
+            return None
+        return models.storage.plan(query)
+
+    def parseline(self, line):
+        """Returns the (command, argument, line) of line, parsed once for
+        every distinct line
+        """
+        return parse_plain(line)
+
+    def reads(self, line):
+        """Returns True if the command line only reads storage"""
+        command, _, line = self.parseline(line)
+        if command in HBNBCommand.read_commands:
+            return True
+        command = parse(line)
+        return (command is not None and
+                command.name in HBNBCommand.read_dot_commands)
 
     def default(self, line):
-        """Retrieves all instances of a class by using dot notation
+        """Runs the ``<class>.<command>(<parameters>)`` commands through
+        ``dot_commands``
         """
-        class_name = None
-        for char in line:
-            if char == ".":
-                args = line.split(".", 1)
-                command = args[1]
-                if command[-2:] == "()":
-                    command = command[:-2]
-                    parameters = None
-                elif "(" in command and ")" in command:
-                    inputs = command.split("(", 1)
-                    parameters = inputs[1].rstrip(")")
-                    command = inputs[0]
-                else:
-                    break
-                class_name = args[0]
-                break
-        if class_name is None:
+        command = parse(line)
+        if command is None:
             print(f"*** Unknown syntax: {line}")
             return
-        if command == "all":
-            self.do_all(class_name)
-        if command == "count":
-            self.count(class_name)
-        if command == "show":
-            if parameters is None:
-                self.do_show(class_name)
-                return
-            parameters = parameters.strip('"')
-            arg = f"{class_name} {parameters}"
-            self.do_show(arg)
-        if command == "destroy":
-            if parameters is None:
-                self.do_destroy(class_name)
-                return
-            parameters = parameters.strip('"')
-            arg = f"{class_name} {parameters}"
-            self.do_destroy(arg)
-        if command == "update":
-            if parameters is None:
-                self.do_update(class_name)
-                return
-            key_value_list = []
-            components = parameters.split(",", 1)
-            id_component = components[0]
-            id_component = id_component.strip('"')
-            id_component = id_component.strip("'")
-            key_value_component = components[1].strip(" ")
-            if key_value_component[0] == "{":
-                key_value_list = self.key_val_list(key_value_component)
-            else:
-                key_value_list.append(key_value_component.replace(",", ""))
-            kv_list = []
-            for pair in key_value_list:
-                if pair[0] == '"':
-                    kv_list.append(pair.replace('"', '', 2))
-                elif pair[0] == "'":
-                    kv_list.append(pair.replace("'", "", 2))
-                else:
-                    kv_list.append(pair)
-            key_value_list = kv_list.copy()
-            for pair in key_value_list:
-                arg = f"{class_name} {id_component} {pair}"
-                self.do_update(arg)
-
-    def count(self, class_name):
+        handler = HBNBCommand.dot_commands.get(command.name)
+        if handler is None:
+            return
+        if command.error is not None:
+            print(f"** {command.error} **")
+            return
+        handler(self, command)
+
+    def dot_all(self, command):
+        """Runs <class>.all(<options>)"""
+        options = " ".join(map(str, command.arguments)).split()
+        self.list_all([command.class_name, *options])
+
+    def dot_count(self, command):
         """Retrieves the number of instances of a class
         """
-        instance_list = []
-        objects = FileStorage.get_objects()
-        for obj_key, obj in objects.items():
-            if obj.__class__.__name__ == class_name:
-                instance_list.append(str(obj))
-        print(len(instance_list))
+        print(models.storage.count(command.class_name))
+
+    def dot_show(self, command):
+        """Runs <class>.show(<id>)"""
+        obj = self.instance([command.class_name,
+                             *map(str, command.arguments)])
+        if obj is not None:
+            print(obj)
+
+    def dot_destroy(self, command):
+        """Runs <class>.destroy(<id>)"""
+        obj = self.instance([command.class_name,
+                             *map(str, command.arguments)])
+        if obj is not None:
+            models.storage.delete(obj)
+            models.storage.save()
+
+    def dot_update(self, command):
+        """Runs <class>.update(<id>, <name>, <value>, ...) and
+        <class>.update(<id>, <dictionary>)
+        """
+        args = command.arguments
+        if len(args) == 2 and isinstance(args[1], dict):
+            self.update_dict(command.class_name, args[0], args[1])
+        else:
+            self.update([command.class_name, *map(str, args)])
 
-    def key_val_list(self, dictionary):
-        """Returns a list of key, value pairs from a dictionary
+    def update_dict(self, class_name, obj_id, dictionary):
+        """Updates an instance with every key/value of dictionary,
+        keeping the value types and saving once
         """
-        dictionary = dictionary.strip("{}")
-        key_value_list = dictionary.split(",")
-        kv_list = []
-        for pair in key_value_list:
-            kv_list.append(pair.replace(":", ""))
-        key_value_list = kv_list.copy()
-        return key_value_list
+        if class_name not in HBNBCommand.class_list:
+            print("** class doesn't exist **")
+            return
+        obj = models.storage.get(class_name, obj_id)
+        if obj is None:
+            print("** no instance found **")
+            return
+        attributes = {str(key): copy.deepcopy(value)
+                      for key, value in dictionary.items()}
+        if self.reserved(attributes):
+            return
+        self.update_instance(obj, attributes)
+
+    def dot_aggregate(self, command):
+        """Prints the sum, avg, min or max of an attribute over the
+        instances of a class, or their number by value with count_by
+        """
+        class_name, command, arguments, _ = command
+        if class_name not in HBNBCommand.class_list:
+            print("** class doesn't exist **")
+            return
+        field = str(arguments[0]) if arguments else ""
+        if not field:
+            print("** attribute name missing **")
+            return
+        if command == "count_by":
+            print(models.storage.count_by(class_name, field))
+        else:
+            print(models.storage.aggregate(class_name, command, field))
+
+    def dot_where(self, command):
+        """Prints the instances of a class matching every condition
+        """
+        class_name, _, arguments, _ = command
+        if class_name not in HBNBCommand.class_list:
+            print("** class doesn't exist **")
+            return
+        conditions = self.conditions(arguments)
+        if conditions is None:
+            print("** invalid condition **")
+            return
+        objects = models.storage.where(class_name, conditions)
+        self.stream(objects.values())
+
+    def dot_related(self, command):
+        """Prints the instances related to an instance, such as the
+        cities of a state
+        """
+        class_name, command, arguments, _ = command
+        if command not in HBNBCommand.relation_commands.get(class_name, ()):
+            return
+        if not arguments:
+            print("** instance id missing **")
+            return
+        obj = models.storage.get(class_name, str(arguments[0]))
+        if obj is None:
+            print("** no instance found **")
+            return
+        self.stream(getattr(obj, command)())
+
+    def dot_geo(self, command):
+        """Prints the instances of a class found by a geographic search:
+        near(lat, lon, km), within(min_lat, min_lon, max_lat, max_lon)
+        or nearest(lat, lon, k)
+        """
+        class_name, command, arguments, _ = command
+        if class_name not in HBNBCommand.class_list:
+            print("** class doesn't exist **")
+            return
+        try:
+            args = [ast.literal_eval(str(arg)) for arg in arguments]
+        except (ValueError, SyntaxError):
+            args = ()
+        arity = 4 if command == "within" else 3
+        if (len(args) != arity or
+                not all(type(arg) in (int, float) for arg in args) or
+                command == "nearest" and type(args[2]) is not int):
+            print("** invalid coordinates **")
+            return
+        objects = getattr(models.storage, command)(class_name, *args)
+        self.stream(objects.values())
+
+    def conditions(self, arguments):
+        """Returns the list of (field, op, value) conditions of the
+        arguments written as ``field<op>value``, or None if one of them
+        is not
+        """
+        conditions = []
+        for argument in arguments:
+            match = CONDITION.fullmatch(str(argument))
+            if match is None:
+                return None
+            field, op, value = match.groups()
+            try:
+                value = ast.literal_eval(value)
+            except (ValueError, SyntaxError):
+                pass
+            conditions.append((field, "==" if op == "=" else op, value))
+        return conditions
+
+    dot_commands = {
+            "all": dot_all,
+            "count": dot_count,
+            "show": dot_show,
+            "destroy": dot_destroy,
+            "update": dot_update,
+            "where": dot_where,
+            "near": dot_geo,
+            "within": dot_geo,
+            "nearest": dot_geo,
+            "sum": dot_aggregate,
+            "avg": dot_aggregate,
+            "min": dot_aggregate,
+            "max": dot_aggregate,
+            "count_by": dot_aggregate,
+            "cities": dot_related,
+            "places": dot_related,
+            "reviews": dot_related
+            }
+
+
+def main(argv=None):
+    """Runs the console: on the commands given with -c, on a script with
+    --batch or when stdin is not a terminal, interactively otherwise.
+    Returns the exit status
+    """
+    parser = argparse.ArgumentParser(description="AirBnB clone console")
+    parser.add_argument("-c", "--command", action="append",
+                        help="run COMMAND and exit (may be repeated)")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="run the commands of FILE (- for stdin)")
+    parser.add_argument("--checkpoint", metavar="N", type=int, default=0,
+                        help="save every N commands of a script")
+    args = parser.parse_args(argv)
+    try:
+        models.storage
+    except ValueError as error:
+        parser.error(str(error))
+    console = HBNBCommand()
+    if args.command:
+        failures = console.run_batch(args.command, "<command>",
+                                     args.checkpoint)
+        return 1 if failures else 0
+    if args.batch is None and sys.stdin.isatty():
+        console.cmdloop()
+        return 0
+    if args.batch in (None, "-"):
+        failures = console.run_batch(sys.stdin, "<stdin>", args.checkpoint)
+    else:
+        try:
+            with open(args.batch, encoding="utf-8") as f:
+                failures = console.run_batch(f, args.batch,
+                                             args.checkpoint)
+        except OSError as error:
+            parser.error(str(error))
+    return 1 if failures else 0
 
 
 if __name__ == '__main__':
-    HBNBCommand().cmdloop()
+    sys.exit(main())
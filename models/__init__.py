@@ -1,4 +1,71 @@
-from models.engine.file_storage import FileStorage
+"""Models Package
 
-storage = FileStorage()
-storage.reload()
+``storage`` is created and reloaded the first time it is used, not when
+the package is imported, and ``classes`` names the module of every model
+so that a model module is only imported once its class is needed.
+"""
+import os
+import threading
+from importlib import import_module
+
+classes = {
+        "BaseModel": "models.base_model",
+        "User": "models.user",
+        "Place": "models.place",
+        "State": "models.state",
+        "City": "models.city",
+        "Amenity": "models.amenity",
+        "Review": "models.review"
+        }
+
+_loaded = {}
+_lock = threading.RLock()
+_storage = None
+
+
+def get_class(name):
+    """Returns the model class called name, importing its module the
+    first time, or None if there is none
+    """
+    cls = _loaded.get(name)
+    if cls is None and name in classes:
+        cls = getattr(import_module(classes[name]), name)
+        _loaded[name] = cls
+    return cls
+
+
+def create_storage():
+    """Returns a new storage of the type set by the environment
+
+    Raises ValueError if HBNB_FORMAT names no format of ``serializers``.
+    """
+    if os.getenv("HBNB_TYPE_STORAGE") == "sqlite":
+        from models.engine.sqlite_storage import SQLiteStorage
+        return SQLiteStorage(os.getenv("HBNB_SQLITE_PATH", "file.db"))
+    from models.engine.file_storage import FileStorage
+    from models.engine.serializers import SERIALIZERS
+    name = os.getenv("HBNB_FORMAT") or None
+    if name is not None and name not in SERIALIZERS:
+        raise ValueError(f"HBNB_FORMAT must be one of "
+                         f"{', '.join(SERIALIZERS)}, not {name!r}")
+    FileStorage.journal = os.getenv("HBNB_JOURNAL") == "1"
+    FileStorage.lazy = os.getenv("HBNB_LAZY_RELOAD") == "1"
+    FileStorage.sharded = os.getenv("HBNB_SHARDED") == "1"
+    FileStorage.write_behind = os.getenv("HBNB_WRITE_BEHIND") == "1"
+    FileStorage.write_delay = float(os.getenv("HBNB_WRITE_DELAY", "0.1"))
+    FileStorage.format = name
+    return FileStorage()
+
+
+def __getattr__(name):
+    """Creates and reloads ``storage`` on first use"""
+    global _storage
+    if name != "storage":
+        raise AttributeError(f"module {__name__!r} has no attribute "
+                             f"{name!r}")
+    with _lock:
+        if _storage is None:
+            _storage = create_storage()
+            _storage.reload()
+            globals()["storage"] = _storage
+    return _storage
@@ -1,8 +1,8 @@
 #!/usr/bin/python3
 """Base Model Module"""
 
-from models import storage
-import uuid
+import models
+import sys
 from datetime import datetime
 
 
@@ -10,20 +10,39 @@ class BaseModel:
     """A class representating BaseModel"""
 
     def __init__(self, *args, **kwargs):
-        """Initializes BaseModel class instance"""
+        """Initializes BaseModel class instance. An instance built from
+        kwargs is not held in storage yet, so its attributes are set
+        straight into ``__dict__`` without marking it as changed
+        """
         if kwargs:
+            attributes = self.__dict__
+            timestamps = {}
             for key, value in kwargs.items():
                 if key == "__class__":
                     continue
-                if key in ("created_at", "updated_at"):
-                    setattr(self, key, datetime.fromisoformat(value))
-                else:
-                    setattr(self, key, value)
+                if type(value) is str:
+                    if key in ("created_at", "updated_at"):
+                        if value not in timestamps:
+                            timestamps[value] = datetime.fromisoformat(
+                                    value)
+                        value = timestamps[value]
+                    elif key == "id" or key.endswith("_id"):
+                        value = sys.intern(value)
+                attributes[key] = value
         else:
+            import uuid
             self.id = str(uuid.uuid4())
-            self.created_at = datetime.now()
-            self.updated_at = datetime.now()
-            storage.new(self)
+            self.created_at = self.updated_at = datetime.now()
+            models.storage.new(self)
+
+    def __setattr__(self, name, value):
+        """Sets an attribute and marks the instance as changed in storage,
+        which does both at once. Ids and foreign keys are interned so that
+        equal ids share memory
+        """
+        if type(value) is str and (name == "id" or name.endswith("_id")):
+            value = sys.intern(value)
+        models.storage.touch(self, name, value)
 
     def __str__(self):
         """String representation of BaseModel instance"""
@@ -34,7 +53,8 @@ class BaseModel:
         current datetime
         """
         self.updated_at = datetime.now()
-        storage.save()
+        models.storage.new(self)
+        models.storage.save()
 
     def to_dict(self):
         """Returns a dictionary containing all keys/values of __dict__
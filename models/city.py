@@ -1,6 +1,7 @@
 #!/usr/bin/python3
 """City Module"""
 
+import models
 from models.base_model import BaseModel
 
 
@@ -8,3 +9,8 @@ class City(BaseModel):
     """A class representing City"""
     state_id = ""
     name = ""
+
+    def places(self):
+        """Returns the list of Place instances of this city"""
+        return list(models.storage.related("Place", "city_id",
+                                           self.id).values())
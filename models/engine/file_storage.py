@@ -1,59 +1,1017 @@
 #!/usr/bin/python3
 """File Storage Module"""
 
+import atexit
 import json
-from importlib import import_module
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+from models import classes, get_class
+from models.engine.indexes import (AggregateIndex, ColumnIndex,
+                                   ForeignKeyIndex, GeoIndex, SortedIndex,
+                                   matches, nearest)
+from models.engine.locks import FileLock, RWLock
+from models.engine.query import Plan
+from models.engine.serializers import SERIALIZERS, Snapshot, detect, load
 
 
 class FileStorage:
-    """A class representing FileStorage"""
+    """A class representing FileStorage
+
+    Serializes instances to a file and deserializes them back; the modes
+    enabled by its public class attributes are the storage options of
+    the README.
+    """
 
     __file_path = "file.json"
     __objects = {}
+    __index = {}
+    __records = {}
+    __changed = set()
+    __removed = set()
+    __cache = {}
+    __encoded = "json"
+    __found = "json"
+    __undo = None
+    __pending = None
+    __depth = 0
+    __deferred = 0
+    __indexes = {}
+    __stale = set()
+    __cold = None
+    __gone = set()
+    __lock = RWLock()
+    __mutex = threading.RLock()
+    __flock = FileLock()
+    __seen = None
+    __flushing = threading.RLock()
+    __wakeup = threading.Condition()
+    __writer = None
+    __due = None
+
+    journal = False
+    journal_limit = 1024 * 1024
+    lazy = False
+    sharded = False
+    write_behind = False
+    write_delay = 0.1
+    format = None
+
+    class_module = classes
 
-    class_module = {
-            "BaseModel": "models.base_model",
-            "User": "models.user",
-            "Place": "models.place",
-            "State": "models.state",
-            "City": "models.city",
-            "Amenity": "models.amenity",
-            "Review": "models.review"
+    columns = {
+            "Place": ("price_by_night", "number_rooms", "number_bathrooms",
+                      "max_guest", "latitude", "longitude")
+            }
+
+    relations = {
+            "City": ("state_id",),
+            "Place": ("city_id", "user_id"),
+            "Review": ("place_id", "user_id")
             }
 
     @classmethod
     def get_objects(cls):
         """Getter method that returns items in ``__objects``"""
-        return cls.__objects
+        return cls().all()
+
+    @classmethod
+    def journal_path(cls):
+        """Returns the path of the journal file"""
+        return f"{cls.__file_path}.log"
+
+    @classmethod
+    def shard_dir(cls):
+        """Returns the path of the directory holding the shards"""
+        return f"{cls.__file_path}.d"
+
+    @classmethod
+    def shard_path(cls, class_name):
+        """Returns the path of the shard holding class_name"""
+        return os.path.join(cls.shard_dir(), f"{class_name}.json")
+
+    @classmethod
+    def lock_path(cls):
+        """Returns the path of the file locked between processes"""
+        return f"{cls.__file_path}.lock"
+
+    def reading(self):
+        """Returns a context manager holding storage shared, under which
+        the dictionaries returned by ``all`` and the plans returned by
+        ``plan`` can be used while other threads write
+        """
+        return FileStorage.__lock.reading
+
+    def all(self, cls=None):
+        """Returns the dictionary ``__objects``, or a dictionary of the
+        instances of cls when a class or class name is given
+        """
+        with FileStorage.__lock.reading:
+            if cls is None:
+                self.__thaw()
+                for class_name in list(FileStorage.__records):
+                    self.__materialize(class_name)
+                return FileStorage.__objects
+            if not isinstance(cls, str):
+                cls = cls.__name__
+            self.__materialize(cls)
+            return dict(FileStorage.__index.get(cls, {}))
+
+    def count(self, cls=None):
+        """Returns the number of objects, or of instances of cls"""
+        with FileStorage.__lock.reading:
+            self.__thaw()
+            if cls is None:
+                return len(FileStorage.__objects) + sum(
+                        len(records)
+                        for records in FileStorage.__records.values())
+            if not isinstance(cls, str):
+                cls = cls.__name__
+            return (len(FileStorage.__index.get(cls, {})) +
+                    len(FileStorage.__records.get(cls, {})))
+
+    def get(self, cls, obj_id):
+        """Returns the instance of cls (a class or class name) with id
+        obj_id, or None if there is none
+        """
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        obj_key = f"{cls}.{obj_id}"
+        obj = FileStorage.__objects.get(obj_key)
+        if obj is not None:
+            return obj
+        with FileStorage.__lock.reading:
+            return self.__lookup(obj_key)
+
+    def where(self, cls, conditions):
+        """Returns a dictionary of the instances of cls (a class or class
+        name) matching every (field, op, value) condition, op being one
+        of ``indexes.OPERATORS``
+        """
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        fields = ()
+        if ColumnIndex.vectorized:
+            fields = FileStorage.columns.get(cls, ())
+        indexed = [condition for condition in conditions
+                   if condition[0] in fields and
+                   type(condition[2]) in (int, float)]
+        others = [condition for condition in conditions
+                  if condition not in indexed]
+        with FileStorage.__lock.reading:
+            if indexed:
+                index = self.__index_of(cls, ColumnIndex, fields)
+                objects = index.where(indexed)
+            else:
+                objects = self.all(cls)
+            if not others:
+                return objects
+            return {obj_key: obj for obj_key, obj in objects.items()
+                    if matches(obj, others)}
+
+    def related(self, cls, field, value):
+        """Returns a dictionary of the instances of cls (a class or class
+        name) whose field equals value, such as the cities of a state
+        """
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        with FileStorage.__lock.reading:
+            return self.__index_of(cls, ForeignKeyIndex, field).get(value)
+
+    def aggregate(self, cls, function, field):
+        """Returns the sum, avg, min or max (function) of the numeric
+        values of field over the instances of cls, ignoring other values
+
+        Raises ValueError if function is not one of them.
+        """
+        if function not in AggregateIndex.functions:
+            raise ValueError(f"unknown aggregate {function!r}")
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        with FileStorage.__lock.reading:
+            index = self.__index_of(cls, AggregateIndex, field)
+            return getattr(index, function)()
+
+    def count_by(self, cls, field):
+        """Returns a dictionary of the number of instances of cls by value
+        of field
+        """
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        with FileStorage.__lock.reading:
+            return self.__index_of(cls, ForeignKeyIndex, field).counts()
 
-    def all(self):
-        """Returns the dictionary ``__objects``"""
-        return FileStorage.__objects
+    def plan(self, query):
+        """Returns the cheapest Plan for the ``query.Query`` query among
+        a class scan, an id lookup, the foreign key indexes of
+        ``relations`` and the sorted indexes of ``columns``
+        """
+        with FileStorage.__lock.reading:
+            return self.__plan(query)
+
+    def within(self, cls, min_lat, min_lon, max_lat, max_lon):
+        """Returns a dictionary of the instances of cls inside the box.
+        The box crosses the antimeridian when min_lon > max_lon
+        """
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        with FileStorage.__lock.reading:
+            index = self.__index_of(cls, GeoIndex)
+            return index.within(min_lat, min_lon, max_lat, max_lon)
+
+    def near(self, cls, lat, lon, km):
+        """Returns a dictionary of the instances of cls within km of
+        (lat, lon), nearest first
+        """
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        with FileStorage.__lock.reading:
+            return self.__index_of(cls, GeoIndex).near(lat, lon, km)
+
+    def nearest(self, cls, lat, lon, k):
+        """Returns a dictionary of the k instances of cls nearest to
+        (lat, lon), nearest first
+        """
+        return nearest(partial(self.near, cls), lat, lon, k)
 
     def new(self, obj):
         """Sets in ``__objects`` the obj with key ``obj_class_name.id``"""
         obj_key = f"{obj.__class__.__name__}.{obj.id}"
-        FileStorage.__objects[obj_key] = obj
+        with FileStorage.__lock.writing:
+            self.__remember(obj_key)
+            self.__put(obj_key, obj)
+            FileStorage.__changed.add(obj_key)
+            FileStorage.__removed.discard(obj_key)
+
+    def touch(self, obj, *attribute):
+        """Marks obj as changed if it is the instance held in storage,
+        after setting the (name, value) attribute if one is given. Both
+        happen under the write lock, so that a save running meanwhile
+        writes either the new value or the old one with obj still changed
+        """
+        obj_id = getattr(obj, "id", None)
+        obj_key = f"{obj.__class__.__name__}.{obj_id}"
+        if obj_id is None or FileStorage.__objects.get(obj_key) is not obj:
+            if attribute:
+                object.__setattr__(obj, *attribute)
+            return
+        with FileStorage.__lock.writing:
+            held = FileStorage.__objects.get(obj_key) is obj
+            if held:
+                self.__remember(obj_key)
+            if attribute:
+                object.__setattr__(obj, *attribute)
+            if held:
+                FileStorage.__changed.add(obj_key)
+                FileStorage.__cache.pop(obj_key, None)
+                if obj.__class__.__name__ in FileStorage.__indexes:
+                    FileStorage.__stale.add(obj_key)
+
+    def delete(self, obj):
+        """Deletes obj from ``__objects`` if it is present"""
+        obj_key = f"{obj.__class__.__name__}.{obj.id}"
+        with FileStorage.__lock.writing:
+            self.__remember(obj_key)
+            if self.__drop(obj_key):
+                FileStorage.__changed.discard(obj_key)
+                FileStorage.__removed.add(obj_key)
+                FileStorage.__cache.pop(obj_key, None)
 
     def save(self):
-        """Serializes ``__objects`` to the JSON file"""
-        obj_dictionary = {}
-        for obj_key, obj in FileStorage.__objects.items():
-            obj_dictionary[obj_key] = obj.to_dict()
-        with open(FileStorage.__file_path, 'w', encoding='utf-8') as f:
-            json.dump(obj_dictionary, f)
+        """Serializes ``__objects`` to the JSON file, or appends the
+        pending changes to the journal when journaling is enabled.
+        Does nothing inside a transaction or while saves are deferred,
+        and leaves the write to the background writer when
+        ``write_behind`` is enabled
+        """
+        if FileStorage.__depth or FileStorage.__deferred:
+            return
+        if FileStorage.write_behind:
+            self.__schedule()
+            return
+        self.flush()
+
+    def flush(self):
+        """Writes the pending changes now, even while saves are deferred,
+        unless a transaction is in progress, and returns once they are
+        on disk
+        """
+        with FileStorage.__wakeup:
+            FileStorage.__due = None
+        with FileStorage.__flushing, self.__hold():
+            with FileStorage.__lock.writing:
+                if FileStorage.__depth or not (FileStorage.__changed or
+                                               FileStorage.__removed):
+                    return
+                journal = FileStorage.journal
+                if not journal:
+                    changed = FileStorage.__changed | FileStorage.__removed
+                    class_names = {obj_key.split(".")[0]
+                                   for obj_key in changed}
+                else:
+                    self.__sync()
+                    lines = ["{" + self.__encode(obj_key, "json") + "}\n"
+                             for obj_key in FileStorage.__changed]
+                    lines += [json.dumps({obj_key: None}) + "\n"
+                              for obj_key in FileStorage.__removed]
+                    pending = self.__take()
+            if not journal:
+                self.compact(class_names)
+                return
+            try:
+                self.__repair_journal()
+                with open(FileStorage.journal_path(), 'a',
+                          encoding='utf-8') as f:
+                    f.writelines(lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    size = f.tell()
+            except BaseException:
+                self.__requeue(*pending)
+                raise
+            FileStorage.__seen = self.__version()
+            if size > FileStorage.journal_limit:
+                self.compact()
+
+    def in_transaction(self):
+        """Returns True if a transaction is in progress"""
+        return FileStorage.__depth > 0
+
+    def begin(self):
+        """Starts a transaction. Nested calls join the outer transaction
+        """
+        with FileStorage.__lock.writing:
+            if FileStorage.__depth == 0:
+                FileStorage.__undo = {}
+                FileStorage.__pending = (set(FileStorage.__changed),
+                                         set(FileStorage.__removed))
+            FileStorage.__depth += 1
+
+    def commit(self):
+        """Ends the current transaction, saving all of its changes at
+        once when the outermost transaction ends
+        """
+        with FileStorage.__lock.writing:
+            if FileStorage.__depth == 0:
+                return
+            FileStorage.__depth -= 1
+            if FileStorage.__depth:
+                return
+            FileStorage.__undo = None
+            FileStorage.__pending = None
+        self.save()
+
+    def rollback(self):
+        """Aborts the transaction and restores ``__objects`` to the state
+        it had when the outermost transaction began
+        """
+        with FileStorage.__lock.writing:
+            if FileStorage.__depth == 0:
+                return
+            undo = FileStorage.__undo
+            FileStorage.__undo = None
+            FileStorage.__depth = 0
+            for obj_key, state in undo.items():
+                if state is None:
+                    self.__drop(obj_key)
+                else:
+                    obj, attributes = state
+                    obj.__dict__.clear()
+                    obj.__dict__.update(attributes)
+                    self.__put(obj_key, obj)
+            (FileStorage.__changed,
+             FileStorage.__removed) = FileStorage.__pending
+            FileStorage.__pending = None
+
+    @contextmanager
+    def transaction(self):
+        """Context manager running its block inside a transaction that
+        is committed on success and rolled back on exception
+        """
+        self.begin()
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
+
+    @contextmanager
+    def deferred(self):
+        """Context manager deferring every save until the end of its
+        block, where the pending changes are written at once
+        """
+        with FileStorage.__lock.writing:
+            FileStorage.__deferred += 1
+        try:
+            yield self
+        finally:
+            with FileStorage.__lock.writing:
+                FileStorage.__deferred -= 1
+            self.save()
+
+    def compact(self, class_names=None):
+        """Writes every object to the file and truncates the journal.
+        When sharded, only the shards of class_names are written, or all
+        of them if class_names is None
+        """
+        with FileStorage.__flushing, self.__hold():
+            with FileStorage.__lock.writing:
+                self.__sync()
+                files = self.__snapshot(class_names)
+                name = FileStorage.__encoded
+                pending = self.__take()
+            try:
+                self.__write_files(files, SERIALIZERS[name])
+            except BaseException:
+                self.__requeue(*pending)
+                raise
+            FileStorage.__found = name
+            FileStorage.__seen = self.__version()
+
+    def convert(self, name):
+        """Rewrites every file in the format name of ``serializers``
+
+        Raises ValueError if the format is unknown.
+        """
+        if name not in SERIALIZERS:
+            raise ValueError(f"unknown format {name!r}")
+        with FileStorage.__flushing, self.__hold():
+            with FileStorage.__lock.writing:
+                FileStorage.format = name
+            self.compact()
 
     def reload(self):
-        """Deserializes the JSON file to ``__objects``"""
+        """Deserializes the file (or the shards) to ``__objects`` and
+        replays the journal on top of it
+        """
+        with FileStorage.__flushing, FileStorage.__lock.writing:
+            with self.__hold(shared=True):
+                migrate, torn = self.__read()
+            if torn:
+                with self.__hold():
+                    self.__repair_journal()
+            if migrate:
+                with self.__hold():
+                    self.compact()
+                    os.remove(FileStorage.__file_path)
+                    FileStorage.__seen = self.__version()
+
+    def __read(self):
+        """Restores the records of the files and replays the complete
+        records of the journal, which ``compact`` folds back into the
+        files once it grows past ``journal_limit`` bytes. Returns whether
+        the single file has to be split into shards, and whether the
+        journal ends in a torn record
+        """
+        migrate = False
+        torn = False
+        if FileStorage.sharded and os.path.isdir(FileStorage.shard_dir()):
+            self.__reload_shards()
+        elif not self.__map_cold():
+            migrate = (FileStorage.sharded and
+                       os.path.exists(FileStorage.__file_path))
+            try:
+                with open(FileStorage.__file_path, 'rb') as f:
+                    FileStorage.__found = detect(f)
+                    for obj_key, obj in load(f):
+                        self.__restore(obj_key, obj)
+            except Exception:
+                pass
+        try:
+            with open(FileStorage.journal_path(), 'rb') as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        torn = True
+                        break
+                    for obj_key, obj in json.loads(line).items():
+                        if obj is None:
+                            self.__drop(obj_key)
+                        else:
+                            self.__restore(obj_key, obj)
+        except Exception:
+            pass
+        FileStorage.__seen = self.__version()
+        return migrate, torn
+
+    @staticmethod
+    def __repair_journal():
+        """Cuts the journal after its last complete record, so that a
+        record left half written by an interrupted save is dropped rather
+        than joined to the next one
+        """
         try:
-            with open(FileStorage.__file_path) as f:
-                obj_dictionary = json.load(f)
-            for obj_key, obj in obj_dictionary.items():
+            with open(FileStorage.journal_path(), 'rb+') as f:
+                size = f.seek(0, os.SEEK_END)
+                if size:
+                    f.seek(size - 1)
+                if not size or f.read(1) == b"\n":
+                    return
+                f.seek(0)
+                f.truncate(f.read().rfind(b"\n") + 1)
+                os.fsync(f.fileno())
+        except FileNotFoundError:
+            pass
+
+    def __snapshot(self, class_names=None):
+        """Returns the (path, (key, fragment) members) of the file to
+        write, or of the shards of class_names (all of them if None) when
+        sharded, encoded in ``format``, or else in the format they were
+        read in (``__found``). It is taken under ``__lock`` and written
+        under ``__flushing`` only, so threads keep using storage during
+        the write
+        """
+        name = FileStorage.format or FileStorage.__found
+        if FileStorage.__encoded != name:
+            FileStorage.__cache.clear()
+            FileStorage.__encoded = name
+        if not FileStorage.sharded:
+            return [(FileStorage.__file_path,
+                     [(obj_key, self.__encode(obj_key))
+                      for obj_key in self.__keys()])]
+        if class_names is None:
+            class_names = set(self.class_module) | set(
+                    FileStorage.__index) | set(FileStorage.__records)
+        return [(FileStorage.shard_path(class_name),
+                 [(obj_key, self.__encode(obj_key))
+                  for obj_key in self.__keys(class_name)])
+                for class_name in class_names]
+
+    def __take(self):
+        """Returns the (changed, removed) keys of the pending changes and
+        starts new sets of them
+        """
+        pending = (FileStorage.__changed, FileStorage.__removed)
+        FileStorage.__changed = set()
+        FileStorage.__removed = set()
+        return pending
+
+    def __requeue(self, changed, removed):
+        """Marks the keys of a write that failed as pending again, unless
+        they changed since
+        """
+        with FileStorage.__lock.writing:
+            for obj_key in changed | removed:
+                if (obj_key in FileStorage.__changed or
+                        obj_key in FileStorage.__removed):
+                    continue
                 class_name = obj_key.split(".")[0]
-                module_path = self.class_module.get(class_name)
-                if module_path:
-                    module = import_module(module_path)
-                    cls = getattr(module, class_name)
-                    FileStorage.__objects[obj_key] = cls(**obj)
+                if (obj_key in FileStorage.__objects or
+                        obj_key in FileStorage.__records.get(class_name,
+                                                             ())):
+                    FileStorage.__changed.add(obj_key)
+                else:
+                    FileStorage.__removed.add(obj_key)
+
+    def __write_files(self, files, serializer):
+        """Replaces each file of the (path, members) files, written with
+        serializer, and removes the journal they include
+        """
+        if FileStorage.sharded:
+            os.makedirs(FileStorage.shard_dir(), exist_ok=True)
+        for path, members in files:
+            self.__replace(path, members, serializer)
+        if os.path.exists(FileStorage.journal_path()):
+            os.remove(FileStorage.journal_path())
+
+    @staticmethod
+    def __replace(path, members, serializer):
+        """Writes members with serializer to a temporary file, syncs it
+        to disk and renames it to path, so that a crash leaves either the
+        old or the new file
+        """
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                serializer.dump(f, members)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        if hasattr(os, "O_DIRECTORY"):
+            fd = os.open(os.path.dirname(path) or ".", os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def __schedule(self):
+        """Asks the background writer to write the pending changes,
+        starting it if needed
+        """
+        with FileStorage.__wakeup:
+            if FileStorage.__due is None:
+                FileStorage.__due = time.monotonic() + FileStorage.write_delay
+            writer = FileStorage.__writer
+            if writer is None or not writer.is_alive():
+                FileStorage.__writer = threading.Thread(
+                        target=self.__write_behind, daemon=True,
+                        name="FileStorage writer")
+                FileStorage.__writer.start()
+                atexit.register(self.__flush_at_exit)
+            FileStorage.__wakeup.notify()
+
+    def __flush_at_exit(self):
+        """Writes the changes still pending when the program exits,
+        without locking the files when there are none
+        """
+        with FileStorage.__flushing:
+            if FileStorage.__changed or FileStorage.__removed:
+                self.flush()
+
+    def __write_behind(self):
+        """Runs the background writer: waits for a save, lets the saves
+        of the next ``write_delay`` seconds join it until ``__due`` and
+        writes them all, unless a flush wrote them first. A failed write
+        stays pending for the next save or flush
+        """
+        while True:
+            with FileStorage.__wakeup:
+                while (FileStorage.__due is None or
+                       time.monotonic() < FileStorage.__due):
+                    FileStorage.__wakeup.wait(
+                            None if FileStorage.__due is None else
+                            FileStorage.__due - time.monotonic())
+                FileStorage.__due = None
+            if FileStorage.__changed or FileStorage.__removed:
+                try:
+                    self.flush()
+                except Exception:
+                    pass
+
+    def __hold(self, shared=False):
+        """Returns a context manager holding the lock shared with other
+        processes on ``lock_path``
+        """
+        return FileStorage.__flock.hold(FileStorage.lock_path(), shared)
+
+    def __version(self):
+        """Returns the inode, size and modification time of each file
+        holding objects, which change whenever a process writes them
+        """
+        version = []
+        for path in [FileStorage.__file_path, *self.__shard_paths(),
+                     FileStorage.journal_path()]:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            version.append((path, stat.st_ino, stat.st_size,
+                            stat.st_mtime_ns))
+        return version
+
+    def __sync(self):
+        """Merges the changes written by other processes since this one
+        last read or wrote the files: the objects changed or deleted here
+        win, the others are taken from the files, deletions included
+        """
+        if self.__version() == FileStorage.__seen:
+            return
+        records = self.__read_files()
+        if records is None:
+            return
+        mine = FileStorage.__changed | FileStorage.__removed
+        encoded = FileStorage.__encoded
+        for obj_key in [obj_key for obj_key in self.__keys()
+                        if obj_key not in records and obj_key not in mine]:
+            self.__drop(obj_key)
+        for obj_key, record in records.items():
+            if obj_key in mine:
+                continue
+            fragment = SERIALIZERS[encoded].encode(obj_key, record)
+            if FileStorage.__cache.get(obj_key) == fragment:
+                continue
+            obj = FileStorage.__objects.get(obj_key)
+            if obj is None:
+                self.__restore(obj_key, record)
+                continue
+            fresh = self.__build(obj_key, record)
+            if fresh is not None:
+                obj.__dict__.clear()
+                obj.__dict__.update(fresh.__dict__)
+                self.__put(obj_key, obj)
+                self.__cache_fragment(obj_key, fragment)
+
+    def __read_files(self):
+        """Returns the records of the files with the journal replayed on
+        top of them, or None if there are no files or they are corrupted
+        """
+        if not self.__version():
+            return None
+        records = {}
+        try:
+            for path in self.__shard_paths() or [FileStorage.__file_path]:
+                if os.path.exists(path):
+                    with open(path, 'rb') as f:
+                        records.update(load(f))
+            if os.path.exists(FileStorage.journal_path()):
+                with open(FileStorage.journal_path(), 'rb') as f:
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break
+                        records.update(json.loads(line))
+        except (OSError, ValueError):
+            return None
+        return {obj_key: record for obj_key, record in records.items()
+                if record is not None}
+
+    def __shard_paths(self):
+        """Returns the paths of the shards when sharded"""
+        shard_dir = FileStorage.shard_dir()
+        if not FileStorage.sharded or not os.path.isdir(shard_dir):
+            return []
+        return [os.path.join(shard_dir, name)
+                for name in sorted(os.listdir(shard_dir))
+                if name.endswith(".json")]
+
+    def __reload_shards(self):
+        """Reads all shards in parallel and restores their records"""
+        paths = self.__shard_paths()
+        if not paths:
+            return
+        try:
+            with open(paths[0], 'rb') as f:
+                FileStorage.__found = detect(f)
+        except OSError:
+            pass
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(min(len(paths), os.cpu_count() or 1)) as ex:
+            for members in ex.map(self.__read_shard, paths):
+                for obj_key, obj in members:
+                    self.__restore(obj_key, obj)
+
+    @staticmethod
+    def __read_shard(path):
+        """Returns the (key, record) pairs of the shard at path, up to
+        the first error
+        """
+        members = []
+        try:
+            with open(path, 'rb') as f:
+                for member in load(f):
+                    members.append(member)
         except Exception:
             pass
+        return members
+
+    def __map_cold(self):
+        """Maps the file as ``__cold`` when lazy, not sharded, storage is
+        empty and the file is a binary snapshot with an index. Returns
+        True if it did
+        """
+        if (not FileStorage.lazy or FileStorage.sharded or
+                FileStorage.__cold is not None or FileStorage.__objects or
+                FileStorage.__records):
+            return False
+        try:
+            FileStorage.__cold = Snapshot(FileStorage.__file_path)
+        except (OSError, ValueError):
+            return False
+        FileStorage.__found = "binary"
+        FileStorage.__gone = set()
+        return True
+
+    def __is_cold(self, obj_key):
+        """Returns True if obj_key is only held by the cold snapshot"""
+        cold = FileStorage.__cold
+        return (cold is not None and obj_key not in FileStorage.__gone and
+                obj_key in cold)
+
+    def __thaw(self):
+        """Moves the records of the cold snapshot that are neither built,
+        replaced nor deleted into ``__records``, and unmaps it
+        """
+        if FileStorage.__cold is None:
+            return
+        with FileStorage.__mutex:
+            cold = FileStorage.__cold
+            if cold is None:
+                return
+            for obj_key, obj in cold.items():
+                class_name = obj_key.split(".")[0]
+                if (obj_key in FileStorage.__gone or
+                        obj_key in FileStorage.__objects or
+                        class_name not in self.class_module):
+                    continue
+                records = FileStorage.__records.setdefault(class_name, {})
+                records.setdefault(obj_key, obj)
+            cold.close()
+            FileStorage.__cold = None
+            FileStorage.__gone = set()
+
+    def __restore(self, obj_key, obj):
+        """Stores the record obj read from a file, as a raw record in lazy
+        mode unless it is already held as an instance
+        """
+        if FileStorage.lazy and obj_key not in FileStorage.__objects:
+            class_name = obj_key.split(".")[0]
+            if class_name in self.class_module:
+                records = FileStorage.__records.setdefault(class_name, {})
+                records[obj_key] = obj
+        else:
+            self.__load(obj_key, obj)
+
+    def __lookup(self, obj_key):
+        """Returns the instance at obj_key, building it from its raw
+        record in ``__records`` if needed, or None. The instances are
+        built under ``__mutex``, one query at a time
+        """
+        obj = FileStorage.__objects.get(obj_key)
+        if obj is None:
+            class_name = obj_key.split(".")[0]
+            with FileStorage.__mutex:
+                records = FileStorage.__records.get(class_name)
+                if records and obj_key in records:
+                    self.__load(obj_key, records.pop(obj_key))
+                elif (obj_key not in FileStorage.__objects and
+                      self.__is_cold(obj_key)):
+                    self.__load(obj_key, FileStorage.__cold.get(obj_key))
+                obj = FileStorage.__objects.get(obj_key)
+        return obj
+
+    def __materialize(self, class_name):
+        """Builds instances from all raw records of class_name"""
+        self.__thaw()
+        if class_name not in FileStorage.__records:
+            return
+        with FileStorage.__mutex:
+            records = FileStorage.__records.pop(class_name, None)
+            if records:
+                for obj_key, obj in records.items():
+                    self.__load(obj_key, obj)
+
+    def __load(self, obj_key, obj):
+        """Builds the instance described by obj and stores it"""
+        instance = self.__build(obj_key, obj)
+        if instance is not None:
+            self.__put(obj_key, instance)
+
+    def __build(self, obj_key, obj):
+        """Returns the instance described by obj, or None if its class is
+        unknown
+        """
+        cls = get_class(obj_key.split(".")[0])
+        return None if cls is None else cls(**obj)
+
+    def __keys(self, class_name=None):
+        """Yields the keys of all objects, or of the instances of
+        class_name, built or not
+        """
+        self.__thaw()
+        if class_name is not None:
+            yield from FileStorage.__index.get(class_name, {})
+            yield from FileStorage.__records.get(class_name, {})
+            return
+        yield from FileStorage.__objects
+        for records in FileStorage.__records.values():
+            yield from records
+
+    def __encode(self, obj_key, name=None):
+        """Returns the fragment encoding the object at obj_key in the
+        format name, by default the format of ``__cache``, where it is
+        cached until the object changes, so that a save only encodes the
+        objects changed since the previous one
+        """
+        if name is None or name == FileStorage.__encoded:
+            fragment = FileStorage.__cache.get(obj_key)
+            if fragment is None:
+                fragment = SERIALIZERS[FileStorage.__encoded].encode(
+                        obj_key, self.__record(obj_key))
+                self.__cache_fragment(obj_key, fragment)
+            return fragment
+        return SERIALIZERS[name].encode(obj_key, self.__record(obj_key))
+
+    @staticmethod
+    def __cache_fragment(obj_key, fragment):
+        """Caches the fragment of obj_key, unless its object holds a list
+        or dict: changed in place, such as by ``append``, it would not be
+        marked changed, and must be encoded again at every save
+        """
+        obj = FileStorage.__objects.get(obj_key)
+        if obj is None or not any(type(value) in (list, dict)
+                                  for value in vars(obj).values()):
+            FileStorage.__cache[obj_key] = fragment
+
+    def __record(self, obj_key):
+        """Returns the record of the object at obj_key, built or not"""
+        obj = FileStorage.__objects.get(obj_key)
+        if obj is None:
+            return FileStorage.__records[obj_key.split(".")[0]][obj_key]
+        return obj.to_dict()
+
+    def __plan(self, query):
+        """Returns the cheapest Plan for query"""
+        class_name = query.class_name
+        plans = []
+        for condition in query.conditions:
+            field, op, value = condition
+            if field == "id" and op == "==":
+                obj = self.get(class_name, value)
+                rows = [] if obj is None else [(f"{class_name}.{value}", obj)]
+                plans.append(Plan(query, "unique index on id", len(rows),
+                                  partial(iter, rows), [condition]))
+            elif (field in FileStorage.relations.get(class_name, ()) and
+                  op == "=="):
+                index = self.__index_of(class_name, ForeignKeyIndex, field)
+                rows = index.get(value)
+                plans.append(Plan(query, f"foreign key index on {field}",
+                                  len(rows), rows.items, [condition]))
+            elif (field in FileStorage.columns.get(class_name, ()) and
+                  op != "!=" and type(value) in (int, float)):
+                index = self.__index_of(class_name, SortedIndex, field)
+                ordered = query.order_by == field
+                plans.append(Plan(query, f"sorted index on {field}",
+                                  index.count(op, value),
+                                  partial(index.range, op, value,
+                                          query.descending),
+                                  [condition], ordered))
+        if query.order_by in FileStorage.columns.get(class_name, ()):
+            index = self.__index_of(class_name, SortedIndex, query.order_by)
+            plans.append(Plan(query, f"sorted index scan on {query.order_by}",
+                              len(index),
+                              partial(index.scan, query.descending),
+                              ordered=True))
+        plans.append(Plan(query, "class scan", self.count(class_name),
+                          lambda: self.all(class_name).items()))
+        return min(plans, key=lambda plan: plan.cost)
+
+    def __index_of(self, class_name, index_type, *args):
+        """Returns the up to date index of index_type over class_name
+        built with args, building it from all instances if needed. The
+        indexes are kept in ``__indexes`` and catch up with the keys of
+        ``__stale`` before each query
+        """
+        with FileStorage.__mutex:
+            self.__materialize(class_name)
+            self.__refresh()
+            indexes = FileStorage.__indexes.setdefault(class_name, {})
+            index_id = (index_type, args)
+            index = indexes.get(index_id)
+            if index is None:
+                index = index_type(*args)
+                for obj_key, obj in FileStorage.__index.get(class_name,
+                                                            {}).items():
+                    index.add(obj_key, obj)
+                indexes[index_id] = index
+            if index_type is SortedIndex:
+                index.sort()
+            return index
+
+    def __refresh(self):
+        """Updates the indexes of the instances changed since the last
+        refresh
+        """
+        objects = FileStorage.__objects
+        for obj_key in FileStorage.__stale:
+            indexes = FileStorage.__indexes.get(obj_key.split(".")[0], {})
+            obj = objects.get(obj_key)
+            for index in indexes.values():
+                index.remove(obj_key)
+                if obj is not None:
+                    index.add(obj_key, obj)
+        FileStorage.__stale.clear()
+
+    def __remember(self, obj_key):
+        """Keeps the state of obj_key from before the transaction in
+        ``__undo``, for ``rollback`` to restore
+        """
+        if FileStorage.__undo is None or obj_key in FileStorage.__undo:
+            return
+        obj = self.__lookup(obj_key)
+        if obj is None:
+            FileStorage.__undo[obj_key] = None
+        else:
+            FileStorage.__undo[obj_key] = (obj, dict(obj.__dict__))
+
+    def __put(self, obj_key, obj):
+        """Stores obj under obj_key in ``__objects`` and the class index"""
+        class_name = obj.__class__.__name__
+        FileStorage.__records.get(class_name, {}).pop(obj_key, None)
+        FileStorage.__objects[obj_key] = obj
+        FileStorage.__cache.pop(obj_key, None)
+        FileStorage.__index.setdefault(class_name, {})[obj_key] = obj
+        if class_name in FileStorage.__indexes:
+            FileStorage.__stale.add(obj_key)
+
+    def __drop(self, obj_key):
+        """Removes obj_key from ``__objects`` and the class index.
+        Returns True if the key was present
+        """
+        FileStorage.__cache.pop(obj_key, None)
+        cold = self.__is_cold(obj_key)
+        if FileStorage.__cold is not None:
+            FileStorage.__gone.add(obj_key)
+        obj = FileStorage.__objects.pop(obj_key, None)
+        if obj is None:
+            records = FileStorage.__records.get(obj_key.split(".")[0], {})
+            return records.pop(obj_key, None) is not None or cold
+        class_name = obj.__class__.__name__
+        FileStorage.__index.get(class_name, {}).pop(obj_key, None)
+        if class_name in FileStorage.__indexes:
+            FileStorage.__stale.add(obj_key)
+        return True
@@ -0,0 +1,477 @@
+#!/usr/bin/python3
+"""Indexes Module
+
+Secondary indexes kept by FileStorage for one class each. Every index
+has ``add(obj_key, obj)`` and ``remove(obj_key)``, which storage calls
+whenever an instance of the class is created, changed or deleted.
+"""
+
+import importlib.util
+import math
+import operator
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+OPERATORS = {
+        "<": operator.lt,
+        "<=": operator.le,
+        ">": operator.gt,
+        ">=": operator.ge,
+        "==": operator.eq,
+        "!=": operator.ne
+        }
+
+EARTH_RADIUS = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS / 180
+
+
+def matches(obj, conditions):
+    """Returns True if obj satisfies every (field, op, value) condition.
+    A missing or incomparable attribute never matches
+    """
+    for field, op, value in conditions:
+        try:
+            if not OPERATORS[op](getattr(obj, field), value):
+                return False
+        except (AttributeError, TypeError):
+            return False
+    return True
+
+
+def sort_key(value):
+    """Returns a key ordering any attribute values: numbers, then
+    strings, then datetimes, then anything else, missing values last
+    """
+    if type(value) in (int, float, bool) and value == value:
+        return (0, value)
+    if isinstance(value, str):
+        return (1, value)
+    if isinstance(value, datetime):
+        return (2, value.isoformat())
+    if value is None:
+        return (4, "")
+    return (3, repr(value))
+
+
+def distance(lat1, lon1, lat2, lon2):
+    """Returns the great-circle distance in km between two points"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) *
+         math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat, lon, km):
+    """Returns (min_lat, min_lon, max_lat, max_lon) of a box holding
+    every point within km of (lat, lon). min_lon is greater than max_lon
+    when the box crosses the antimeridian
+    """
+    dlat = km / KM_PER_DEGREE
+    min_lat, max_lat = lat - dlat, lat + dlat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90), -180, min(max_lat, 90), 180
+    dlon = dlat / math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if dlon >= 180:
+        return min_lat, -180, max_lat, 180
+    min_lon = (lon - dlon + 180) % 360 - 180
+    max_lon = (lon + dlon + 180) % 360 - 180
+    return min_lat, min_lon, max_lat, max_lon
+
+
+def nearest(near, lat, lon, k):
+    """Returns a dictionary of the k instances closest to (lat, lon),
+    nearest first, using near(lat, lon, km) over a growing radius
+    """
+    km = KM_PER_DEGREE
+    while True:
+        found = near(lat, lon, km)
+        if len(found) >= k or km > math.pi * EARTH_RADIUS:
+            return dict(list(found.items())[:k])
+        km *= 4
+
+
+class ColumnIndex:
+    """A class representing ColumnIndex
+
+    Keeps numeric fields of the instances of a class in ``array('d')``
+    columns, one row per instance, so that conditions on them are
+    evaluated as NumPy masks over the arrays. Missing or non-numeric
+    values are stored as NaN. Storage only uses it when NumPy is
+    installed (``vectorized``): without NumPy, checking the attributes
+    of the instances is faster than a pass over the columns. NumPy is
+    only imported by the first query, to keep it out of the start.
+    """
+
+    vectorized = importlib.util.find_spec("numpy") is not None
+
+    def __init__(self, fields):
+        """Initializes an empty index over fields"""
+        self.fields = tuple(fields)
+        self.keys = []
+        self.objects = []
+        self.rows = {}
+        self.columns = {field: array("d") for field in self.fields}
+
+    def __len__(self):
+        """Returns the number of indexed instances"""
+        return len(self.keys)
+
+    def add(self, obj_key, obj):
+        """Appends the row of obj"""
+        self.rows[obj_key] = len(self.keys)
+        self.keys.append(obj_key)
+        self.objects.append(obj)
+        for field in self.fields:
+            value = getattr(obj, field, None)
+            if type(value) not in (int, float):
+                value = float("nan")
+            self.columns[field].append(value)
+
+    def remove(self, obj_key):
+        """Removes the row of obj_key by moving the last row into it"""
+        row = self.rows.pop(obj_key, None)
+        if row is None:
+            return
+        last_key = self.keys.pop()
+        last_obj = self.objects.pop()
+        for column in self.columns.values():
+            value = column.pop()
+            if last_key != obj_key:
+                column[row] = value
+        if last_key != obj_key:
+            self.keys[row] = last_key
+            self.objects[row] = last_obj
+            self.rows[last_key] = row
+
+    def where(self, conditions):
+        """Returns a dictionary of the instances matching every
+        (field, op, value) condition, whose fields must all be indexed
+        """
+        if not conditions:
+            return dict(zip(self.keys, self.objects))
+        import numpy
+        mask = numpy.ones(len(self.keys), dtype=bool)
+        for field, op, value in conditions:
+            column = numpy.frombuffer(self.columns[field])
+            mask &= OPERATORS[op](column, value)
+        rows = numpy.flatnonzero(mask).tolist()
+        return dict(zip(map(self.keys.__getitem__, rows),
+                        map(self.objects.__getitem__, rows)))
+
+
+class GeoIndex:
+    """A class representing GeoIndex
+
+    Buckets the instances of a class in a grid of ``cell_size`` degree
+    cells by their latitude and longitude, so that box and radius
+    searches only look at the cells they overlap.
+    """
+
+    def __init__(self, lat_field="latitude", lon_field="longitude",
+                 cell_size=0.5):
+        """Initializes an empty index over lat_field and lon_field"""
+        self.lat_field = lat_field
+        self.lon_field = lon_field
+        self.cell_size = cell_size
+        self.points = {}
+        self.cells = {}
+
+    def __len__(self):
+        """Returns the number of indexed instances"""
+        return len(self.points)
+
+    def add(self, obj_key, obj):
+        """Adds obj to the cell of its coordinates, if it has any"""
+        lat = getattr(obj, self.lat_field, None)
+        lon = getattr(obj, self.lon_field, None)
+        if (type(lat) not in (int, float) or type(lon) not in (int, float)
+                or not -90 <= lat <= 90 or not -180 <= lon <= 180):
+            return
+        cell = self.cell(lat, lon)
+        self.points[obj_key] = (lat, lon, cell)
+        self.cells.setdefault(cell, {})[obj_key] = obj
+
+    def remove(self, obj_key):
+        """Removes obj_key from its cell"""
+        point = self.points.pop(obj_key, None)
+        if point is None:
+            return
+        cell = self.cells[point[2]]
+        del cell[obj_key]
+        if not cell:
+            del self.cells[point[2]]
+
+    def cell(self, lat, lon):
+        """Returns the (row, column) of the cell holding (lat, lon)"""
+        return (math.floor(lat / self.cell_size),
+                math.floor(lon / self.cell_size))
+
+    def within(self, min_lat, min_lon, max_lat, max_lon):
+        """Returns a dictionary of the instances inside the box. The box
+        crosses the antimeridian when min_lon is greater than max_lon
+        """
+        if min_lon > max_lon:
+            found = self.within(min_lat, min_lon, max_lat, 180)
+            found.update(self.within(min_lat, -180, max_lat, max_lon))
+            return found
+        first_row, first_column = self.cell(min_lat, min_lon)
+        last_row, last_column = self.cell(max_lat, max_lon)
+        size = ((last_row - first_row + 1) *
+                (last_column - first_column + 1))
+        if size > len(self.cells):
+            cells = [cell for cell in self.cells
+                     if first_row <= cell[0] <= last_row and
+                     first_column <= cell[1] <= last_column]
+        else:
+            cells = [(row, column)
+                     for row in range(first_row, last_row + 1)
+                     for column in range(first_column, last_column + 1)
+                     if (row, column) in self.cells]
+        found = {}
+        for cell in cells:
+            for obj_key, obj in self.cells[cell].items():
+                lat, lon, _ = self.points[obj_key]
+                if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
+                    found[obj_key] = obj
+        return found
+
+    def near(self, lat, lon, km):
+        """Returns a dictionary of the instances within km of (lat, lon),
+        nearest first
+        """
+        found = []
+        for obj_key, obj in self.within(*bounding_box(lat, lon, km)).items():
+            point = self.points[obj_key]
+            point_distance = distance(lat, lon, point[0], point[1])
+            if point_distance <= km:
+                found.append((point_distance, obj_key, obj))
+        found.sort(key=lambda item: item[:2])
+        return {obj_key: obj for _, obj_key, obj in found}
+
+
+class ForeignKeyIndex:
+    """A class representing ForeignKeyIndex
+
+    Groups the instances of a class by the value of one field, usually
+    the id of the instance they belong to, such as ``City.state_id``.
+    """
+
+    def __init__(self, field):
+        """Initializes an empty index over field"""
+        self.field = field
+        self.values = {}
+        self.groups = {}
+
+    def __len__(self):
+        """Returns the number of indexed instances"""
+        return len(self.values)
+
+    def add(self, obj_key, obj):
+        """Adds obj to the group of its field value"""
+        value = getattr(obj, self.field, None)
+        try:
+            group = self.groups.setdefault(value, {})
+        except TypeError:
+            return
+        group[obj_key] = obj
+        self.values[obj_key] = value
+
+    def remove(self, obj_key):
+        """Removes obj_key from its group"""
+        if obj_key not in self.values:
+            return
+        value = self.values.pop(obj_key)
+        group = self.groups[value]
+        del group[obj_key]
+        if not group:
+            del self.groups[value]
+
+    def get(self, value):
+        """Returns a dictionary of the instances whose field is value"""
+        try:
+            return dict(self.groups.get(value, {}))
+        except TypeError:
+            return {}
+
+    def counts(self):
+        """Returns a dictionary of the number of instances by value"""
+        return {value: len(group) for value, group in self.groups.items()}
+
+
+class AggregateIndex:
+    """A class representing AggregateIndex
+
+    Keeps the count and sum of the finite numeric values of one field
+    over the instances of a class, and their minimum and maximum, so
+    that aggregates are answered in O(1). The minimum or maximum is only
+    searched again after the instance holding it is removed.
+    """
+
+    functions = ("sum", "avg", "min", "max")
+
+    def __init__(self, field):
+        """Initializes an empty index over field"""
+        self.field = field
+        self.values = {}
+        self.total = 0
+        self.low = None
+        self.high = None
+
+    def __len__(self):
+        """Returns the number of instances with a numeric value"""
+        return len(self.values)
+
+    def add(self, obj_key, obj):
+        """Adds the value of obj, if it is a finite number"""
+        value = getattr(obj, self.field, None)
+        if type(value) not in (int, float) or not math.isfinite(value):
+            return
+        self.values[obj_key] = value
+        self.total += value
+        if len(self.values) == 1:
+            self.low = self.high = value
+            return
+        if self.low is not None and value < self.low:
+            self.low = value
+        if self.high is not None and value > self.high:
+            self.high = value
+
+    def remove(self, obj_key):
+        """Removes the value of obj_key"""
+        value = self.values.pop(obj_key, None)
+        if value is None:
+            return
+        self.total -= value
+        if not self.values:
+            self.total = 0
+        if value == self.low:
+            self.low = None
+        if value == self.high:
+            self.high = None
+
+    def sum(self):
+        """Returns the sum of the values"""
+        return self.total
+
+    def avg(self):
+        """Returns the average of the values, or None if there is none"""
+        if not self.values:
+            return None
+        return self.total / len(self.values)
+
+    def min(self):
+        """Returns the smallest value, or None if there is none"""
+        if self.low is None and self.values:
+            self.low = min(self.values.values())
+        return self.low
+
+    def max(self):
+        """Returns the largest value, or None if there is none"""
+        if self.high is None and self.values:
+            self.high = max(self.values.values())
+        return self.high
+
+
+class SortedIndex:
+    """A class representing SortedIndex
+
+    Keeps the instances of a class ordered by the numeric value of one
+    field, so that range conditions and ``order by`` on it are answered
+    with binary searches instead of a scan. Instances whose value is not
+    a number are kept apart in ``others`` and ordered after the numbers,
+    as ``sort_key`` orders them. New entries are appended and the list
+    is only sorted again when it is next read.
+    """
+
+    def __init__(self, field):
+        """Initializes an empty index over field"""
+        self.field = field
+        self.entries = []
+        self.values = {}
+        self.objects = {}
+        self.others = {}
+        self.unsorted = False
+
+    def __len__(self):
+        """Returns the number of indexed instances"""
+        return len(self.objects)
+
+    def add(self, obj_key, obj):
+        """Adds the entry of obj"""
+        value = getattr(obj, self.field, None)
+        self.objects[obj_key] = obj
+        if sort_key(value)[0] != 0:
+            self.others[obj_key] = obj
+            return
+        self.values[obj_key] = value
+        self.entries.append((value, obj_key))
+        self.unsorted = True
+
+    def remove(self, obj_key):
+        """Removes the entry of obj_key"""
+        if self.objects.pop(obj_key, None) is None:
+            return
+        if self.others.pop(obj_key, None) is not None:
+            return
+        entry = (self.values.pop(obj_key), obj_key)
+        self.sort()
+        del self.entries[bisect_left(self.entries, entry)]
+
+    def sort(self):
+        """Sorts the entries appended since the last read"""
+        if self.unsorted:
+            self.entries.sort()
+            self.unsorted = False
+
+    def bounds(self, op, value):
+        """Returns the (start, stop) slice of the entries whose value
+        satisfies ``<op> value``, op being one of <, <=, >, >= or ==
+        """
+        self.sort()
+        key = operator.itemgetter(0)
+        start, stop = 0, len(self.entries)
+        if op in (">", "=="):
+            start = bisect_left(self.entries, value, key=key)
+        if op == ">":
+            start = bisect_right(self.entries, value, lo=start, key=key)
+        if op == ">=":
+            start = bisect_left(self.entries, value, key=key)
+        if op in ("<=", "=="):
+            stop = bisect_right(self.entries, value, lo=start, key=key)
+        if op == "<":
+            stop = bisect_left(self.entries, value, key=key)
+        return start, max(start, stop)
+
+    def count(self, op, value):
+        """Returns the number of instances satisfying ``<op> value``"""
+        start, stop = self.bounds(op, value)
+        return stop - start
+
+    def range(self, op, value, descending=False):
+        """Yields the (key, instance) pairs satisfying ``<op> value`` in
+        order of value
+        """
+        start, stop = self.bounds(op, value)
+        rows = range(start, stop)
+        if descending:
+            rows = reversed(rows)
+        for row in rows:
+            obj_key = self.entries[row][1]
+            yield obj_key, self.objects[obj_key]
+
+    def scan(self, descending=False):
+        """Yields the (key, instance) pairs of every instance in order of
+        value, as sorting them by ``sort_key`` would
+        """
+        self.sort()
+        others = sorted(self.others, reverse=descending, key=lambda key: (
+                sort_key(getattr(self.others[key], self.field, None)), key))
+        entries = self.entries
+        if descending:
+            entries = reversed(entries)
+            yield from ((key, self.others[key]) for key in others)
+        for _, obj_key in entries:
+            yield obj_key, self.objects[obj_key]
+        if not descending:
+            yield from ((key, self.others[key]) for key in others)
@@ -0,0 +1,92 @@
+#!/usr/bin/python3
+"""JSON Stream Module
+
+Reads and writes the top-level ``{key: record, ...}`` object of a
+storage file one member at a time, so that neither the whole file text
+nor a second copy of every record is ever held in memory.
+"""
+
+import json
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = " \t\n\r"
+
+decoder = json.JSONDecoder()
+
+
+def iter_members(f, chunk_size=CHUNK_SIZE):
+    """Yields the (key, value) pairs of the JSON object read from the
+    text file f, parsing one member at a time
+
+    Raises ValueError if the file does not hold a JSON object.
+    """
+    buffer = ""
+    pos = 0
+
+    def read_more():
+        """Appends the next chunk to the buffer, growing the chunk with
+        the buffer so that a huge value is not decoded over and over
+        """
+        nonlocal buffer, pos
+        chunk = f.read(max(chunk_size, len(buffer) - pos))
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return bool(chunk)
+
+    def peek():
+        """Returns the next non-whitespace character, or '' at the end"""
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in WHITESPACE:
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if not read_more():
+                return ""
+
+    def value():
+        """Decodes the next JSON value, reading more input as needed"""
+        nonlocal pos
+        peek()
+        while True:
+            try:
+                obj, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if not read_more():
+                    raise
+                continue
+            if end == len(buffer) and read_more():
+                continue
+            pos = end
+            return obj
+
+    if peek() != "{":
+        raise ValueError("expected a JSON object")
+    pos += 1
+    if peek() == "}":
+        return
+    while True:
+        key = value()
+        if not isinstance(key, str) or peek() != ":":
+            raise ValueError("expected a JSON object member")
+        pos += 1
+        yield key, value()
+        char = peek()
+        pos += 1
+        if char == "}":
+            return
+        if char != ",":
+            raise ValueError("expected ',' or '}'")
+
+
+def write_members(f, members):
+    """Writes a JSON object made of the already encoded ``"key": value``
+    members to the text file f, one member at a time
+    """
+    f.write("{")
+    separator = ""
+    for member in members:
+        f.write(separator)
+        f.write(member)
+        separator = ", "
+    f.write("}")
@@ -0,0 +1,167 @@
+#!/usr/bin/python3
+"""Locks Module
+
+Locks used by storage to be shared by threads and by processes.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from threading import get_ident
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class Reading:
+    """A class representing Reading
+
+    Context manager reading under an RWLock.
+    """
+
+    __slots__ = ("lock",)
+
+    def __init__(self, lock):
+        """Initializes the read side of lock"""
+        self.lock = lock
+
+    def __enter__(self):
+        """Waits until no thread writes or waits to, then reads"""
+        lock = self.lock
+        me = get_ident()
+        depth = lock.depths.get(me, 0)
+        if depth or lock.writer == me:
+            lock.depths[me] = depth + 1
+            return
+        with lock.mutex:
+            while lock.writer is not None or lock.waiting:
+                lock.blocked += 1
+                lock.condition.wait()
+                lock.blocked -= 1
+            lock.readers += 1
+        lock.depths[me] = 1
+
+    def __exit__(self, *exc_info):
+        """Stops reading"""
+        lock = self.lock
+        me = get_ident()
+        depth = lock.depths.pop(me) - 1
+        if depth:
+            lock.depths[me] = depth
+            return
+        if lock.writer == me:
+            return
+        with lock.mutex:
+            lock.readers -= 1
+            if not lock.readers and lock.waiting:
+                lock.condition.notify_all()
+
+
+class Writing:
+    """A class representing Writing
+
+    Context manager writing under an RWLock.
+    """
+
+    __slots__ = ("lock",)
+
+    def __init__(self, lock):
+        """Initializes the write side of lock"""
+        self.lock = lock
+
+    def __enter__(self):
+        """Waits until no other thread reads or writes, then writes"""
+        lock = self.lock
+        me = get_ident()
+        if lock.writer == me:
+            lock.writes += 1
+            return
+        if me in lock.depths:
+            raise RuntimeError("cannot write while reading")
+        with lock.mutex:
+            lock.waiting += 1
+            while lock.writer is not None or lock.readers:
+                lock.condition.wait()
+            lock.waiting -= 1
+            lock.writer = me
+            lock.writes = 1
+
+    def __exit__(self, *exc_info):
+        """Stops writing"""
+        lock = self.lock
+        lock.writes -= 1
+        if lock.writes:
+            return
+        with lock.mutex:
+            lock.writer = None
+            if lock.waiting or lock.blocked:
+                lock.condition.notify_all()
+
+
+class RWLock:
+    """A class representing RWLock
+
+    Lets any number of threads read at once, or one thread write, using
+    ``with lock.reading:`` and ``with lock.writing:``. A waiting writer
+    keeps new readers out so that writers are not starved; ``waiting``
+    and ``blocked`` count the writers and readers waiting. Both sides
+    are reentrant, ``depths`` counting the nested reads of each thread,
+    and the writing thread may also read, but a reading thread cannot
+    start writing: that raises RuntimeError instead of deadlocking.
+    """
+
+    def __init__(self):
+        """Initializes an unlocked lock"""
+        self.mutex = threading.Lock()
+        self.condition = threading.Condition(self.mutex)
+        self.readers = 0
+        self.writer = None
+        self.writes = 0
+        self.waiting = 0
+        self.blocked = 0
+        self.depths = {}
+        self.reading = Reading(self)
+        self.writing = Writing(self)
+
+
+class FileLock:
+    """A class representing FileLock
+
+    Advisory lock shared with other processes on the file at a path,
+    held exclusively or shared with other readers. It is reentrant, the
+    outermost ``hold`` choosing the mode, so the threads of a process
+    must not hold it at the same time. Does nothing where fcntl is not
+    available.
+    """
+
+    def __init__(self):
+        """Initializes a lock that is not held"""
+        self.file = None
+        self.depth = 0
+
+    @contextmanager
+    def hold(self, path, shared=False):
+        """Context manager holding the lock on the file at path"""
+        if self.depth == 0 and fcntl is not None:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.file = open(path, "a")
+            try:
+                fcntl.flock(self.file,
+                            fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            except BaseException:
+                self.file.close()
+                self.file = None
+                raise
+        self.depth += 1
+        try:
+            yield
+        finally:
+            self.depth -= 1
+            if self.depth == 0 and self.file is not None:
+                fcntl.flock(self.file, fcntl.LOCK_UN)
+                self.file.close()
+                self.file = None
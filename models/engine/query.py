@@ -0,0 +1,205 @@
+#!/usr/bin/python3
+"""Query Module
+
+Parses the query language of the console::
+
+    <class> [where <field> <op> <value> [and ...]]
+            [order by <field> [asc|desc]] [limit <n>] [offset <n>]
+
+and runs the ``Plan`` chosen by the storage ``plan`` method, which picks
+the cheapest way to read the instances among the indexes it keeps.
+"""
+
+import ast
+import math
+import re
+from itertools import islice
+from models.engine.indexes import OPERATORS, matches, sort_key
+
+TOKEN = re.compile(r"""\s*(?:("[^"]*"|'[^']*')|(<=|>=|==|!=|<|>|=)|
+                   ([^\s<>=!]+))""", re.VERBOSE)
+KEYWORDS = ("where", "and", "order", "by", "asc", "desc", "limit", "offset")
+
+
+class Query:
+    """A class representing Query"""
+
+    def __init__(self, class_name, conditions=(), order_by=None,
+                 descending=False, limit=None, offset=0):
+        """Initializes a query on the instances of class_name"""
+        self.class_name = class_name
+        self.conditions = list(conditions)
+        self.order_by = order_by
+        self.descending = descending
+        self.limit = limit
+        self.offset = offset
+
+    def __str__(self):
+        """Returns the query written in the query language"""
+        text = self.class_name
+        if self.conditions:
+            text += f" where {describe(self.conditions)}"
+        if self.order_by is not None:
+            text += f" order by {self.order_by}"
+            if self.descending:
+                text += " desc"
+        if self.limit is not None:
+            text += f" limit {self.limit}"
+        if self.offset:
+            text += f" offset {self.offset}"
+        return text
+
+    @classmethod
+    def parse(cls, text):
+        """Returns the Query written in text
+
+        Raises ValueError if text is not a valid query.
+        """
+        tokens = []
+        pos = 0
+        text = text.strip()
+        while pos < len(text):
+            match = TOKEN.match(text, pos)
+            if match is None:
+                raise ValueError(f"unexpected {text[pos:]!r}")
+            tokens.append(match.group(match.lastindex))
+            pos = match.end()
+        if not tokens:
+            raise ValueError("class name missing")
+        query = cls(tokens.pop(0))
+        words = [token.lower() for token in tokens]
+        pos = 0
+
+        def expect(*expected):
+            """Returns the next token, which must not be a keyword, or be
+            one of expected
+            """
+            nonlocal pos
+            if pos >= len(tokens):
+                raise ValueError("unexpected end of query")
+            token = tokens[pos]
+            if expected and words[pos] not in expected:
+                raise ValueError(f"expected {expected[0]!r}, got {token!r}")
+            if not expected and words[pos] in KEYWORDS:
+                raise ValueError(f"unexpected {token!r}")
+            pos += 1
+            return token
+
+        def number():
+            """Returns the next token as a count of rows"""
+            token = expect()
+            if not token.isdigit():
+                raise ValueError(f"expected a number, got {token!r}")
+            return int(token)
+
+        if pos < len(tokens) and words[pos] == "where":
+            pos += 1
+            while True:
+                field = expect()
+                op = expect(*OPERATORS, "=")
+                query.conditions.append((field, "==" if op == "=" else op,
+                                         literal(expect())))
+                if pos == len(tokens) or words[pos] != "and":
+                    break
+                pos += 1
+        if pos < len(tokens) and words[pos] == "order":
+            pos += 1
+            expect("by")
+            query.order_by = expect()
+            if pos < len(tokens) and words[pos] in ("asc", "desc"):
+                query.descending = words[pos] == "desc"
+                pos += 1
+        if pos < len(tokens) and words[pos] == "limit":
+            pos += 1
+            query.limit = number()
+        if pos < len(tokens) and words[pos] == "offset":
+            pos += 1
+            query.offset = number()
+        if pos < len(tokens):
+            raise ValueError(f"unexpected {tokens[pos]!r}")
+        return query
+
+
+def describe(conditions):
+    """Returns conditions written as in a where clause"""
+    return " and ".join(f"{field} {op} {value!r}"
+                        for field, op, value in conditions)
+
+
+def literal(token):
+    """Returns the Python value of token, or token itself as a string"""
+    try:
+        return ast.literal_eval(token)
+    except (ValueError, SyntaxError):
+        return token
+
+
+class Plan:
+    """A class representing Plan
+
+    One way of running a query: ``fetch`` returns the (key, instance)
+    pairs found through ``access``, about ``rows`` of them, which already
+    satisfy the conditions of ``used``, and are already sorted as the
+    query asks when ``ordered`` is True. The remaining conditions are
+    checked on each instance, then the instances are sorted if needed
+    and sliced.
+    """
+
+    def __init__(self, query, access, rows, fetch, used=(), ordered=False):
+        """Initializes a plan for query"""
+        self.query = query
+        self.access = access
+        self.rows = rows
+        self.fetch = fetch
+        self.ordered = ordered or query.order_by is None
+        self.used = list(used)
+        self.filters = [condition for condition in query.conditions
+                        if condition not in used]
+
+    @property
+    def cost(self):
+        """Returns the estimated number of instances looked at, plus
+        ``n log n`` when they have to be sorted
+        """
+        query = self.query
+        rows = self.rows
+        if self.ordered and query.limit is not None and not self.filters:
+            return min(rows, query.offset + query.limit)
+        if not self.ordered and rows > 1:
+            return rows + math.ceil(rows * math.log2(rows))
+        return rows
+
+    def execute(self):
+        """Returns the dictionary of the instances found by the query, in
+        order
+        """
+        query = self.query
+        rows = self.fetch()
+        if self.filters:
+            rows = ((obj_key, obj) for obj_key, obj in rows
+                    if matches(obj, self.filters))
+        if not self.ordered:
+            rows = sorted(rows, reverse=query.descending,
+                          key=lambda row: (sort_key(getattr(
+                              row[1], query.order_by, None)), row[0]))
+        stop = None
+        if query.limit is not None:
+            stop = query.offset + query.limit
+        return dict(islice(rows, query.offset, stop))
+
+    def __str__(self):
+        """Returns the description printed by the explain command"""
+        query = self.query
+        access = self.access
+        if self.used:
+            access += f" ({describe(self.used)})"
+        lines = [f"{query.class_name}: {access}, ~{self.rows} rows"]
+        if self.filters:
+            lines.append(f"  filter: {describe(self.filters)}")
+        if not self.ordered:
+            order = "desc" if query.descending else "asc"
+            lines.append(f"  sort: {query.order_by} {order}")
+        if query.limit is not None or query.offset:
+            lines.append(f"  offset {query.offset}, limit {query.limit}")
+        lines.append(f"  estimated cost: {self.cost}")
+        return "\n".join(lines)
@@ -0,0 +1,396 @@
+#!/usr/bin/python3
+"""Serializers Module
+
+Formats of the storage files. A serializer encodes each record (the
+``to_dict()`` of an instance, or a record read from a file) into a
+fragment that storage caches, and writes the (key, fragment) members as
+a file:
+
+    json    the JSON object ``{key: record, ...}``
+    binary  ``MAGIC`` followed by one frame per record: the length and
+            the CRC32 of the ``marshal`` encoding of the (key, record)
+            pair as ``FRAME``, then the encoding itself. Values keep
+            their types, and ``created_at`` and ``updated_at`` are
+            stored as integer microseconds since the epoch. A frame of
+            length 0 ends the frames, and is followed by the index of
+            the keys: one entry per record, sorted by key, made of the
+            key padded with NUL bytes to the length of the longest key
+            and of the offset and length of the marshal encoding of the
+            record as ``ENTRY``. ``FOOTER`` ends the file with the
+            offset of the index, the number of entries, their key width
+            and ``INDEX_MAGIC``
+    gzip    the binary format compressed with gzip
+    lzma    the binary format compressed with lzma
+
+``load`` reads the records of a file in any of them, telling which from
+its first bytes with ``detect``. ``Snapshot`` maps a binary file and
+decodes one record at a time, found by a binary search of its index.
+The compression modules are only imported to read or write a
+compressed file.
+
+Records are encoded with version 4 of ``marshal``, which every Python
+since 3.4 reads and writes, because it decodes about twice as fast as
+the same records unpacked with ``struct`` in Python, which would make
+the binary format slower to read than JSON. What marshal is not made
+for is kept away from it: only the values JSON has are encoded, as JSON
+would write them, and the CRC32 of each frame is checked before it is
+decoded, so that a corrupted file raises ValueError. Like the code,
+storage files must come from a trusted source. The frames of version 1
+files, which have no CRC32, are still read.
+"""
+
+import io
+import json
+import marshal
+import mmap
+import struct
+from datetime import datetime, timedelta
+from zlib import crc32
+from models.engine.json_stream import iter_members, write_members
+
+MAGIC = b"HBNB\x02"
+MAGIC_V1 = b"HBNB\x01"
+GZIP_MAGIC = b"\x1f\x8b"
+LZMA_MAGIC = b"\xfd7zXZ\x00"
+MARSHAL_VERSION = 4
+CHUNK_SIZE = 64 * 1024
+FRAME = struct.Struct("<II")
+FRAME_V1 = struct.Struct("<I")
+ENTRY = struct.Struct("<QI")
+INDEX_MAGIC = b"HBNBIDX\x01"
+FOOTER = struct.Struct(f"<QII{len(INDEX_MAGIC)}s")
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+TIMESTAMPS = ("created_at", "updated_at")
+SCALARS = {str, int, float, bool, type(None)}
+
+
+class JSONSerializer:
+    """A class representing JSONSerializer"""
+
+    def encode(self, key, record):
+        """Returns the ``"key": {...}`` JSON member of record"""
+        return f"{json.dumps(key)}: {json.dumps(record, default=str_of)}"
+
+    def dump(self, f, members):
+        """Writes the (key, fragment) members as a JSON object to the
+        binary file f
+        """
+        text = io.TextIOWrapper(f, encoding="utf-8")
+        write_members(text, (fragment for _, fragment in members))
+        text.flush()
+        text.detach()
+
+    def read(self, f):
+        """Yields the (key, record) pairs of the JSON object of the binary
+        file f
+        """
+        yield from iter_members(io.TextIOWrapper(f, encoding="utf-8"))
+
+
+class BinarySerializer:
+    """A class representing BinarySerializer"""
+
+    indexed = True
+
+    def encode(self, key, record):
+        """Returns the frame of the (key, record) pair
+
+        Raises TypeError for the values JSON cannot write.
+        """
+        record = dict(record)
+        for field in TIMESTAMPS:
+            value = record.get(field)
+            if isinstance(value, str):
+                value = datetime.fromisoformat(value)
+            if isinstance(value, datetime):
+                record[field] = (value - EPOCH) // MICROSECOND
+        for field, value in record.items():
+            if type(value) not in SCALARS:
+                record[field] = plain(value)
+        payload = marshal.dumps((key, record), MARSHAL_VERSION)
+        return FRAME.pack(len(payload), crc32(payload)) + payload
+
+    def dump(self, f, members):
+        """Writes ``MAGIC`` and the frames of the (key, fragment) members
+        to the binary file f, followed by their index if ``indexed``
+        """
+        f.write(MAGIC)
+        if not self.indexed:
+            f.writelines(fragment for _, fragment in members)
+            return
+        entries = []
+        offset = len(MAGIC)
+        for key, fragment in members:
+            f.write(fragment)
+            entries.append((key.encode(), offset + FRAME.size,
+                            len(fragment) - FRAME.size))
+            offset += len(fragment)
+        f.write(FRAME.pack(0, 0))
+        offset += FRAME.size
+        width = max((len(key) for key, _, _ in entries), default=0)
+        entries.sort()
+        f.writelines(key.ljust(width, b"\0") + ENTRY.pack(start, length)
+                     for key, start, length in entries)
+        f.write(FOOTER.pack(offset, len(entries), width, INDEX_MAGIC))
+
+    def read(self, f, chunk_size=CHUNK_SIZE):
+        """Yields the (key, record) pairs of the frames of the binary file
+        f, which starts with ``MAGIC`` or ``MAGIC_V1``, reading chunk_size
+        bytes at a time
+
+        Raises ValueError if the file is truncated or corrupted.
+        """
+        magic = f.read(len(MAGIC))
+        if magic != MAGIC and magic != MAGIC_V1:
+            raise ValueError("expected the binary format")
+        checked = magic == MAGIC
+        header = FRAME if checked else FRAME_V1
+        unpack_from = header.unpack_from
+        size = header.size
+        buffer = f.read(chunk_size)
+        view = memoryview(buffer)
+        pos = 0
+        while True:
+            if len(buffer) - pos >= size:
+                fields = unpack_from(buffer, pos)
+                if not fields[0]:
+                    return
+                start = pos + size
+                end = start + fields[0]
+                if end <= len(buffer):
+                    payload = view[start:end]
+                    if checked and crc32(payload) != fields[1]:
+                        raise ValueError("corrupted frame")
+                    pos = end
+                    yield unframe(payload)
+                    continue
+            chunk = f.read(max(chunk_size, len(buffer) - pos))
+            if not chunk:
+                if pos < len(buffer):
+                    raise ValueError("truncated frame")
+                return
+            view.release()
+            buffer = buffer[pos:] + chunk
+            view = memoryview(buffer)
+            pos = 0
+
+
+class GzipSerializer(BinarySerializer):
+    """A class representing GzipSerializer"""
+
+    indexed = False
+
+    def dump(self, f, members):
+        """Writes the binary format compressed with gzip to f"""
+        import gzip
+        with gzip.GzipFile(fileobj=f, mode="wb", compresslevel=6,
+                           mtime=0) as compressed:
+            super().dump(compressed, members)
+
+
+class LZMASerializer(BinarySerializer):
+    """A class representing LZMASerializer"""
+
+    indexed = False
+
+    def dump(self, f, members):
+        """Writes the binary format compressed with lzma to f"""
+        import lzma
+        with lzma.LZMAFile(f, "wb") as compressed:
+            super().dump(compressed, members)
+
+
+class Snapshot:
+    """A class representing Snapshot
+
+    Binary file with an index, mapped in memory, whose records are
+    decoded one at a time: ``get`` finds a key by a binary search of
+    the index, so it reads a few pages whatever the size of the file.
+    """
+
+    def __init__(self, path):
+        """Maps the file at path
+
+        Raises ValueError if it is not a binary file with an index.
+        """
+        with open(path, "rb") as f:
+            try:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError("empty file") from None
+        data = self.map
+        self.checked = data[:len(MAGIC)] == MAGIC
+        self.header = FRAME if self.checked else FRAME_V1
+        if (len(data) < len(MAGIC) + self.header.size + FOOTER.size or
+                data[:len(MAGIC)] not in (MAGIC, MAGIC_V1) or
+                data[-len(INDEX_MAGIC):] != INDEX_MAGIC):
+            self.close()
+            raise ValueError("expected the binary format with an index")
+        self.index, self.count, self.width, _ = FOOTER.unpack_from(
+                data, len(data) - FOOTER.size)
+        if self.index + self.count * (self.width + ENTRY.size) != len(
+                data) - FOOTER.size:
+            self.close()
+            raise ValueError("corrupted index")
+
+    def __len__(self):
+        """Returns the number of records"""
+        return self.count
+
+    def __contains__(self, key):
+        """Returns True if the file holds a record at key"""
+        return self.find(key) is not None
+
+    def find(self, key):
+        """Returns the (offset, length) of the record at key, or None"""
+        target = key.encode()
+        width = self.width
+        if len(target) > width or b"\0" in target:
+            return None
+        target = target.ljust(width, b"\0")
+        data = self.map
+        size = width + ENTRY.size
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            start = self.index + middle * size
+            found = data[start:start + width]
+            if found < target:
+                low = middle + 1
+            elif found > target:
+                high = middle
+            else:
+                return ENTRY.unpack_from(data, start + width)
+        return None
+
+    def get(self, key):
+        """Returns the record at key, or None
+
+        Raises ValueError if the record is corrupted.
+        """
+        found = self.find(key)
+        if found is None:
+            return None
+        offset, length = found
+        return self.decode(offset, length)[1]
+
+    def items(self):
+        """Yields the (key, record) pairs in the order of the file"""
+        data = self.map
+        header = self.header
+        pos = len(MAGIC)
+        while True:
+            length = header.unpack_from(data, pos)[0]
+            if not length:
+                return
+            pos += header.size
+            yield self.decode(pos, length)
+            pos += length
+
+    def decode(self, offset, length):
+        """Returns the (key, record) pair encoded at offset
+
+        Raises ValueError if it is corrupted.
+        """
+        payload = self.map[offset:offset + length]
+        if self.checked and crc32(payload) != FRAME.unpack_from(
+                self.map, offset - FRAME.size)[1]:
+            raise ValueError("corrupted frame")
+        return unframe(payload)
+
+    def close(self):
+        """Unmaps the file"""
+        self.map.close()
+
+
+SERIALIZERS = {
+        "json": JSONSerializer(),
+        "binary": BinarySerializer(),
+        "gzip": GzipSerializer(),
+        "lzma": LZMASerializer()
+        }
+
+
+def detect(f):
+    """Returns the name of the format of the buffered binary file f,
+    without moving its position
+    """
+    head = f.peek(len(LZMA_MAGIC))
+    if head.startswith(GZIP_MAGIC):
+        return "gzip"
+    if head.startswith(LZMA_MAGIC):
+        return "lzma"
+    return "binary" if head.startswith((MAGIC, MAGIC_V1)) else "json"
+
+
+def load(f):
+    """Yields the (key, record) pairs of the buffered binary file f
+    written in any format of ``SERIALIZERS``
+
+    Raises ValueError if the file is corrupted.
+    """
+    name = detect(f)
+    errors = (EOFError, OSError)
+    if name == "gzip":
+        import gzip
+        f = gzip.GzipFile(fileobj=f)
+    elif name == "lzma":
+        import lzma
+        f = lzma.LZMAFile(f)
+        errors += (lzma.LZMAError,)
+    try:
+        if f.peek(len(MAGIC)).startswith((MAGIC, MAGIC_V1)):
+            yield from SERIALIZERS["binary"].read(f)
+        else:
+            yield from SERIALIZERS["json"].read(f)
+    except errors as error:
+        raise ValueError(f"corrupted file: {error}") from None
+
+
+def unframe(payload):
+    """Returns the (key, record) pair of the marshal encoding payload
+
+    Raises ValueError if payload does not encode one.
+    """
+    try:
+        key, record = marshal.loads(payload)
+    except (EOFError, TypeError, ValueError):
+        raise ValueError("corrupted frame") from None
+    if type(key) is not str or type(record) is not dict:
+        raise ValueError("corrupted frame")
+    return key, decode(record)
+
+
+def plain(value):
+    """Returns value as JSON writes it, with lists for tuples and ISO
+    strings for datetimes
+
+    Raises TypeError for the values JSON cannot write.
+    """
+    if type(value) in SCALARS:
+        return value
+    if type(value) in (list, tuple):
+        return [plain(item) for item in value]
+    return json.loads(json.dumps(value, default=str_of))
+
+
+def decode(record):
+    """Returns record with its integer timestamps turned into datetimes
+    """
+    created_at = record.get("created_at")
+    if type(created_at) is int:
+        record["created_at"] = EPOCH + created_at * MICROSECOND
+    updated_at = record.get("updated_at")
+    if type(updated_at) is int:
+        record["updated_at"] = (record["created_at"]
+                                if updated_at == created_at else
+                                EPOCH + updated_at * MICROSECOND)
+    return record
+
+
+def str_of(value):
+    """Returns the ISO format of the datetime value for JSON"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
@@ -0,0 +1,450 @@
+#!/usr/bin/python3
+"""SQLite Storage Module"""
+
+import json
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from models import get_class
+from models.engine.file_storage import FileStorage
+from functools import partial
+from models.engine.indexes import (OPERATORS, AggregateIndex, bounding_box,
+                                   distance, matches, nearest)
+from models.engine.locks import RWLock
+from models.engine.query import Plan
+
+FIELD = re.compile(r"^[A-Za-z_]\w*$")
+
+
+class SQLiteStorage:
+    """A class representing SQLiteStorage
+
+    Objects are kept in a local SQLite database with one table per class
+    of ``FileStorage.class_module``. Each row holds the id and the JSON
+    encoded ``to_dict()`` of an instance, so lookups, class scans,
+    updates and deletes only touch the rows involved. Instances that
+    have been read are kept in ``__objects`` so that a row is always
+    represented by the same instance.
+
+    The fields of ``FileStorage.columns`` and ``FileStorage.relations``
+    get expression indexes, so ``where`` conditions on them and
+    ``related`` lookups are answered from the index.
+
+    The connection is shared by threads under ``__lock``, held shared
+    by queries and exclusively by changes, and SQLite itself locks the
+    database between processes.
+    """
+
+    class_module = FileStorage.class_module
+    columns = FileStorage.columns
+    relations = FileStorage.relations
+
+    def __init__(self, db_path="file.db"):
+        """Initializes the storage for the database at db_path"""
+        self.__db_path = db_path
+        self.__connection = None
+        self.__objects = {}
+        self.__changed = set()
+        self.__touched = None
+        self.__depth = 0
+        self.__deferred = 0
+        self.__lock = RWLock()
+        self.__mutex = threading.Lock()
+
+    def reading(self):
+        """Returns a context manager holding storage shared, under which
+        the plans returned by ``plan`` can be used while other threads
+        write
+        """
+        return self.__lock.reading
+
+    def all(self, cls=None):
+        """Returns a dictionary of all objects, or of the instances of cls
+        when a class or class name is given
+        """
+        with self.__lock.reading:
+            if cls is None:
+                objects = {}
+                for class_name in self.class_module:
+                    objects.update(self.all(class_name))
+                return objects
+            if not isinstance(cls, str):
+                cls = cls.__name__
+            if cls not in self.class_module:
+                return {}
+            rows = self.__execute(f'SELECT id, data FROM "{cls}"')
+            return {f"{cls}.{row[0]}": self.__build(cls, row)
+                    for row in rows.fetchall()}
+
+    def count(self, cls=None):
+        """Returns the number of objects, or of instances of cls"""
+        with self.__lock.reading:
+            if cls is None:
+                return sum(self.count(class_name)
+                           for class_name in self.class_module)
+            if not isinstance(cls, str):
+                cls = cls.__name__
+            if cls not in self.class_module:
+                return 0
+            rows = self.__execute(f'SELECT COUNT(*) FROM "{cls}"')
+            return rows.fetchone()[0]
+
+    def get(self, cls, obj_id):
+        """Returns the instance of cls (a class or class name) with id
+        obj_id, or None if there is none
+        """
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        obj = self.__objects.get(f"{cls}.{obj_id}")
+        if obj is not None or cls not in self.class_module:
+            return obj
+        with self.__lock.reading:
+            row = self.__execute(
+                    f'SELECT id, data FROM "{cls}" WHERE id = ?',
+                    (obj_id,)).fetchone()
+            if row is None:
+                return None
+            return self.__build(cls, row)
+
+    def where(self, cls, conditions):
+        """Returns a dictionary of the instances of cls (a class or class
+        name) matching every (field, op, value) condition, op being one
+        of ``indexes.OPERATORS``
+        """
+        with self.__lock.reading:
+            if not isinstance(cls, str):
+                cls = cls.__name__
+            if cls not in self.class_module:
+                return {}
+            sql, parameters = self.__select(cls, conditions)
+            rows = self.__execute(sql, parameters).fetchall()
+            objects = {}
+            for row in rows:
+                obj = self.__build(cls, row)
+                if matches(obj, conditions):
+                    objects[f"{cls}.{row[0]}"] = obj
+            return objects
+
+    def aggregate(self, cls, function, field):
+        """Returns the sum, avg, min or max (function) of the numeric
+        values of field over the instances of cls, ignoring other values
+
+        Raises ValueError if function is not one of them.
+        """
+        with self.__lock.reading:
+            if function not in AggregateIndex.functions:
+                raise ValueError(f"unknown aggregate {function!r}")
+            if not isinstance(cls, str):
+                cls = cls.__name__
+            if cls not in self.class_module or not FIELD.match(field):
+                return 0 if function == "sum" else None
+            value, parameters = self.__value(cls, field)
+            sql = f"{function.upper()}({value})"
+            row = self.__execute(
+                    f'SELECT {sql} FROM "{cls}" '
+                    f"WHERE typeof({value}) IN ('integer', 'real')",
+                    parameters * 2).fetchone()
+            if row[0] is None and function == "sum":
+                return 0
+            return row[0]
+
+    def count_by(self, cls, field):
+        """Returns a dictionary of the number of instances of cls by value
+        of field
+        """
+        with self.__lock.reading:
+            if not isinstance(cls, str):
+                cls = cls.__name__
+            if cls not in self.class_module or not FIELD.match(field):
+                return {}
+            value, parameters = self.__value(cls, field)
+            rows = self.__execute(f'SELECT {value}, COUNT(*) FROM "{cls}" '
+                                  f"GROUP BY {value}", parameters * 2)
+            return dict(rows.fetchall())
+
+    def plan(self, query):
+        """Returns the Plan for the ``query.Query`` query, described with
+        the access path reported by SQLite for its conditions
+        """
+        with self.__lock.reading:
+            class_name = query.class_name
+            used = query.conditions
+            if class_name not in self.class_module:
+                return Plan(query, "unknown class", 0, partial(iter, ()),
+                            used)
+            sql, parameters = self.__select(class_name, query.conditions)
+            steps = self.__execute(f"EXPLAIN QUERY PLAN {sql}", parameters)
+            access = "; ".join(step[-1] for step in steps.fetchall())
+            return Plan(query, access, self.count(class_name),
+                        lambda: self.where(class_name, used).items(), used)
+
+    def related(self, cls, field, value):
+        """Returns a dictionary of the instances of cls (a class or class
+        name) whose field equals value, such as the cities of a state
+        """
+        return self.where(cls, [(field, "==", value)])
+
+    def within(self, cls, min_lat, min_lon, max_lat, max_lon):
+        """Returns a dictionary of the instances of cls inside the box.
+        The box crosses the antimeridian when min_lon > max_lon
+        """
+        if min_lon > max_lon:
+            found = self.within(cls, min_lat, min_lon, max_lat, 180)
+            found.update(self.within(cls, min_lat, -180, max_lat, max_lon))
+            return found
+        return self.where(cls, [("latitude", ">=", min_lat),
+                                ("latitude", "<=", max_lat),
+                                ("longitude", ">=", min_lon),
+                                ("longitude", "<=", max_lon)])
+
+    def near(self, cls, lat, lon, km):
+        """Returns a dictionary of the instances of cls within km of
+        (lat, lon), nearest first
+        """
+        found = []
+        box = bounding_box(lat, lon, km)
+        for obj_key, obj in self.within(cls, *box).items():
+            obj_distance = distance(lat, lon, obj.latitude, obj.longitude)
+            if obj_distance <= km:
+                found.append((obj_distance, obj_key, obj))
+        found.sort(key=lambda item: item[:2])
+        return {obj_key: obj for _, obj_key, obj in found}
+
+    def nearest(self, cls, lat, lon, k):
+        """Returns a dictionary of the k instances of cls nearest to
+        (lat, lon), nearest first
+        """
+        return nearest(partial(self.near, cls), lat, lon, k)
+
+    def new(self, obj):
+        """Adds obj to its table"""
+        with self.__lock.writing:
+            obj_key = f"{obj.__class__.__name__}.{obj.id}"
+            self.__remember(obj_key, obj)
+            self.__objects[obj_key] = obj
+            self.__write(obj)
+
+    def touch(self, obj, *attribute):
+        """Marks obj as changed if it is the instance held in storage,
+        after setting the (name, value) attribute if one is given, both
+        under the write lock
+        """
+        obj_id = getattr(obj, "id", None)
+        obj_key = f"{obj.__class__.__name__}.{obj_id}"
+        if obj_id is None or self.__objects.get(obj_key) is not obj:
+            if attribute:
+                object.__setattr__(obj, *attribute)
+            return
+        with self.__lock.writing:
+            held = self.__objects.get(obj_key) is obj
+            if held:
+                self.__remember(obj_key, obj)
+            if attribute:
+                object.__setattr__(obj, *attribute)
+            if held:
+                self.__changed.add(obj_key)
+
+    def delete(self, obj):
+        """Deletes the row of obj from its table"""
+        with self.__lock.writing:
+            class_name = obj.__class__.__name__
+            obj_key = f"{class_name}.{obj.id}"
+            self.__remember(obj_key, obj)
+            self.__objects.pop(obj_key, None)
+            self.__changed.discard(obj_key)
+            if class_name in self.class_module:
+                self.__execute(f'DELETE FROM "{class_name}" WHERE id = ?',
+                               (obj.id,))
+
+    def save(self):
+        """Writes the changed objects to their rows and commits, unless a
+        transaction is in progress or saves are deferred
+        """
+        if self.__deferred == 0:
+            self.flush()
+
+    def flush(self):
+        """Writes the changed objects to their rows and commits, even
+        while saves are deferred, unless a transaction is in progress
+        """
+        with self.__lock.writing:
+            for obj_key in self.__changed:
+                obj = self.__objects.get(obj_key)
+                if obj is not None:
+                    self.__write(obj)
+            self.__changed.clear()
+            if self.__depth == 0 and self.__connection is not None:
+                self.__connection.commit()
+
+    @contextmanager
+    def deferred(self):
+        """Context manager deferring every save until the end of its
+        block, where the pending changes are committed at once
+        """
+        with self.__lock.writing:
+            self.__deferred += 1
+        try:
+            yield self
+        finally:
+            with self.__lock.writing:
+                self.__deferred -= 1
+            self.save()
+
+    def reload(self):
+        """Opens the database and creates the missing tables"""
+        with self.__lock.writing, self.__mutex:
+            self.__open()
+
+    def close(self):
+        """Closes the database connection"""
+        with self.__lock.writing:
+            if self.__connection is not None:
+                self.__connection.close()
+                self.__connection = None
+
+    def in_transaction(self):
+        """Returns True if a transaction is in progress"""
+        return self.__depth > 0
+
+    def begin(self):
+        """Starts a transaction. Nested calls join the outer transaction
+        """
+        with self.__lock.writing:
+            if self.__depth == 0:
+                self.flush()
+                self.__touched = {}
+            self.__depth += 1
+
+    def commit(self):
+        """Ends the current transaction, committing all of its changes at
+        once when the outermost transaction ends
+        """
+        with self.__lock.writing:
+            if self.__depth == 0:
+                return
+            self.__depth -= 1
+            if self.__depth == 0:
+                self.__touched = None
+                self.save()
+
+    def rollback(self):
+        """Aborts the transaction and restores every instance it touched
+        from its committed row
+        """
+        with self.__lock.writing:
+            if self.__depth == 0:
+                return
+            touched = self.__touched
+            self.__touched = None
+            self.__depth = 0
+            self.__changed.clear()
+            self.__connection.rollback()
+            for obj_key, obj in touched.items():
+                class_name = obj.__class__.__name__
+                self.__objects.pop(obj_key, None)
+                row = self.__execute(
+                        f'SELECT id, data FROM "{class_name}" WHERE id = ?',
+                        (obj.id,)).fetchone()
+                if row is not None:
+                    stored = self.__build(class_name, row)
+                    obj.__dict__.clear()
+                    obj.__dict__.update(stored.__dict__)
+                    self.__objects[obj_key] = obj
+
+    @contextmanager
+    def transaction(self):
+        """Context manager running its block inside a transaction that
+        is committed on success and rolled back on exception
+        """
+        self.begin()
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
+
+    def __execute(self, sql, parameters=()):
+        """Runs sql on the database, opening it first if needed"""
+        if self.__connection is None:
+            with self.__mutex:
+                if self.__connection is None:
+                    self.__open()
+        return self.__connection.execute(sql, parameters)
+
+    def __open(self):
+        """Opens the database if needed and creates the missing tables"""
+        connection = self.__connection
+        if connection is None:
+            connection = sqlite3.connect(self.__db_path,
+                                         check_same_thread=False)
+        for class_name in self.class_module:
+            connection.execute(
+                    f'CREATE TABLE IF NOT EXISTS "{class_name}" '
+                    '(id TEXT PRIMARY KEY, data TEXT NOT NULL)')
+            for field in (self.columns.get(class_name, ()) +
+                          self.relations.get(class_name, ())):
+                connection.execute(
+                        'CREATE INDEX IF NOT EXISTS '
+                        f'"{class_name}_{field}" ON "{class_name}" '
+                        f"(json_extract(data, '$.{field}'))")
+        connection.commit()
+        self.__connection = connection
+
+    def __value(self, class_name, field):
+        """Returns the (sql, parameters) expression of the value of field,
+        which is the class default when the row does not have it
+        """
+        value = f"json_extract(data, '$.{field}')"
+        default = getattr(get_class(class_name), field, None)
+        if type(default) in (int, float, str):
+            return (f"(CASE WHEN json_type(data, '$.{field}') IS NULL "
+                    f"THEN ? ELSE {value} END)", [default])
+        return value, []
+
+    def __select(self, class_name, conditions):
+        """Returns the (sql, parameters) selecting the rows of class_name
+        that may match conditions, using the conditions SQLite can check
+        """
+        model = get_class(class_name)
+        clauses = []
+        parameters = []
+        for field, op, value in conditions:
+            if (not FIELD.match(field) or op not in OPERATORS or
+                    type(value) not in (int, float, str)):
+                continue
+            clause = f"json_extract(data, '$.{field}') {op} ?"
+            parameters.append(value)
+            if matches(model, [(field, op, value)]):
+                clause = (f"({clause} OR "
+                          f"json_extract(data, '$.{field}') IS NULL)")
+            clauses.append(clause)
+        sql = f'SELECT id, data FROM "{class_name}"'
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        return sql, parameters
+
+    def __write(self, obj):
+        """Inserts or replaces the row of obj"""
+        class_name = obj.__class__.__name__
+        if class_name in self.class_module:
+            self.__execute(f'INSERT OR REPLACE INTO "{class_name}" '
+                           '(id, data) VALUES (?, ?)',
+                           (obj.id, json.dumps(obj.to_dict())))
+
+    def __build(self, class_name, row):
+        """Returns the instance held for the row (id, data) of the table
+        class_name, building it if needed
+        """
+        obj_key = f"{class_name}.{row[0]}"
+        obj = self.__objects.get(obj_key)
+        if obj is None:
+            obj = get_class(class_name)(**json.loads(row[1]))
+            obj = self.__objects.setdefault(obj_key, obj)
+        return obj
+
+    def __remember(self, obj_key, obj):
+        """Keeps track of the instances touched by the transaction"""
+        if self.__touched is not None:
+            self.__touched.setdefault(obj_key, obj)
@@ -1,6 +1,7 @@
 #!/usr/bin/python3
 """Place Module"""
 
+import models
 from models.base_model import BaseModel
 
 
@@ -17,3 +18,8 @@ class Place(BaseModel):
     latitude = 0.0
     longitude = 0.0
     amenity_ids = []
+
+    def reviews(self):
+        """Returns the list of Review instances of this place"""
+        return list(models.storage.related("Review", "place_id",
+                                           self.id).values())
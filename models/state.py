@@ -1,9 +1,15 @@
 #!/usr/bin/python3
 """State Module"""
 
+import models
 from models.base_model import BaseModel
 
 
 class State(BaseModel):
     """A class representing State"""
     name = ""
+
+    def cities(self):
+        """Returns the list of City instances of this state"""
+        return list(models.storage.related("City", "state_id",
+                                           self.id).values())
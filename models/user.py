@@ -1,6 +1,7 @@
 #!/usr/bin/python3
 """User Module"""
 
+import models
 from models.base_model import BaseModel
 
 
@@ -10,3 +11,13 @@ class User(BaseModel):
     password = ""
     first_name = ""
     last_name = ""
+
+    def places(self):
+        """Returns the list of Place instances owned by this user"""
+        return list(models.storage.related("Place", "user_id",
+                                           self.id).values())
+
+    def reviews(self):
+        """Returns the list of Review instances written by this user"""
+        return list(models.storage.related("Review", "user_id",
+                                           self.id).values())
@@ -0,0 +1,290 @@
+#!/usr/bin/python3
+"""Server Module
+
+Serves the console commands to concurrent clients over TCP, one command
+per line with its output followed by an empty line, and over a small
+JSON-over-HTTP API:
+
+    POST /command           {"command": "<command>"}
+    GET  /<class>           [?limit=<n>&offset=<n>]
+    GET  /<class>/<id>
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from urllib.parse import parse_qs, urlsplit
+from console import HBNBCommand
+import models
+
+STATUS = {
+        200: "OK",
+        400: "Bad Request",
+        404: "Not Found",
+        405: "Method Not Allowed"
+        }
+
+
+class ThreadOutput(io.TextIOBase):
+    """A class representing ThreadOutput
+
+    Stands for stdout while the server runs: what a thread prints goes to
+    the buffer it set as ``local.buffer``, or else to ``stdout``, so that
+    commands running at once on several threads keep their own output.
+    """
+
+    def __init__(self, stdout):
+        """Initializes the output writing to stdout by default"""
+        self.stdout = stdout
+        self.local = threading.local()
+
+    def writable(self):
+        """Returns True"""
+        return True
+
+    def write(self, text):
+        """Writes text to the buffer of the current thread"""
+        return getattr(self.local, "buffer", self.stdout).write(text)
+
+    def flush(self):
+        """Flushes stdout"""
+        self.stdout.flush()
+
+
+class HBNBServer:
+    """A class representing HBNBServer
+
+    Commands that change storage run one at a time on the ``worker``
+    thread, and the commands and requests that only read it run on the
+    ``readers`` threads while holding storage shared, so the event loop
+    keeps serving clients while commands run. Saves are deferred while
+    the server runs, and the pending changes are flushed on the
+    ``flusher`` thread every ``flush_interval`` seconds and when the
+    server stops, so that neither reads nor commands wait for a write to
+    disk. The transaction commands are refused, since every client
+    shares the one storage.
+    """
+
+    refused_commands = {"begin", "commit", "rollback"}
+
+    def __init__(self, host="127.0.0.1", port=5000, http_port=8000,
+                 flush_interval=1.0, readers=4):
+        """Initializes a server listening on host"""
+        self.host = host
+        self.port = port
+        self.http_port = http_port
+        self.flush_interval = flush_interval
+        self.output = ThreadOutput(sys.stdout)
+        self.console = HBNBCommand(stdout=self.output)
+        self.worker = ThreadPoolExecutor(1)
+        self.readers = ThreadPoolExecutor(readers)
+        self.flusher = ThreadPoolExecutor(1)
+        self.servers = []
+        self.clients = set()
+
+    async def start(self):
+        """Starts listening; a port of None disables that protocol"""
+        if self.port is not None:
+            self.servers.append(await asyncio.start_server(
+                    self.handle_commands, self.host, self.port))
+        if self.http_port is not None:
+            self.servers.append(await asyncio.start_server(
+                    self.handle_http, self.host, self.http_port))
+
+    async def serve(self):
+        """Serves clients until cancelled, saving periodically"""
+        with models.storage.deferred(), \
+                contextlib.redirect_stdout(self.output):
+            await self.start()
+            try:
+                while True:
+                    await asyncio.sleep(self.flush_interval)
+                    await self.flush()
+            finally:
+                await self.close()
+
+    async def close(self):
+        """Stops listening, disconnects the clients and flushes the
+        pending changes
+        """
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+        self.servers = []
+        tasks = list(self.clients)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.flush()
+
+    async def flush(self):
+        """Writes the pending changes on the flusher, printing a failure
+        to stderr: the changes stay pending for the next flush
+        """
+        try:
+            await self.call(self.flusher, models.storage.flush)
+        except Exception as error:
+            print(f"** flush failed: {type(error).__name__}: {error} **",
+                  file=sys.stderr)
+
+    async def call(self, executor, function, *args):
+        """Returns the result of function(*args) run on executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, function, *args)
+
+    async def execute(self, line):
+        """Returns the (output, stop) of the command line, run on the
+        readers if it only reads storage, or else on the worker
+        """
+        if self.console.parseline(line)[0] in HBNBServer.refused_commands:
+            return ("** transactions are not supported by the server **\n",
+                    False)
+        if self.console.reads(line):
+            return await self.call(self.readers, self.shared, self.run,
+                                   line)
+        return await self.call(self.worker, self.run, line)
+
+    @staticmethod
+    def shared(function, *args):
+        """Returns function(*args) run while holding storage shared"""
+        with models.storage.reading():
+            return function(*args)
+
+    def run(self, line):
+        """Runs the command line and returns (output, stop)"""
+        output = io.StringIO()
+        self.output.local.buffer = output
+        try:
+            stop = self.console.onecmd(line)
+        except Exception as error:
+            print(f"** {type(error).__name__}: {error} **")
+            stop = False
+        finally:
+            del self.output.local.buffer
+        return output.getvalue(), stop
+
+    async def handle_commands(self, reader, writer):
+        """Runs the commands sent by a TCP client, one per line"""
+        task = asyncio.current_task()
+        self.clients.add(task)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                output, stop = await self.execute(line.decode())
+                writer.write(output.encode() + b"\n")
+                await writer.drain()
+                if stop:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.clients.discard(task)
+            writer.close()
+
+    async def handle_http(self, reader, writer):
+        """Answers one HTTP request"""
+        try:
+            status, body = await self.respond(reader)
+        except (ValueError, asyncio.IncompleteReadError):
+            status, body = 400, {"error": "bad request"}
+        data = json.dumps(body).encode()
+        writer.write(f"HTTP/1.1 {status} {STATUS[status]}\r\n"
+                     "Content-Type: application/json\r\n"
+                     f"Content-Length: {len(data)}\r\n"
+                     "Connection: close\r\n\r\n".encode() + data)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def respond(self, reader):
+        """Reads an HTTP request and returns its (status, JSON body)
+
+        Raises ValueError if the request is malformed.
+        """
+        request = (await reader.readline()).decode().split()
+        if len(request) != 3:
+            raise ValueError("malformed request line")
+        method, target, _ = request
+        length = 0
+        while True:
+            header = (await reader.readline()).decode().strip()
+            if not header:
+                break
+            name, _, value = header.partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        body = await reader.readexactly(length) if length else b""
+        url = urlsplit(target)
+        path = [part for part in url.path.split("/") if part]
+        if path == ["command"]:
+            if method != "POST":
+                return 405, {"error": "method not allowed"}
+            request = json.loads(body)
+            command = request.get("command") if isinstance(
+                    request, dict) else None
+            if not isinstance(command, str):
+                raise ValueError("command missing")
+            output, _ = await self.execute(command)
+            lines = output.splitlines()
+            return 200, {"output": [line for line in lines
+                                    if not line.startswith("**")],
+                         "errors": [line for line in lines
+                                    if line.startswith("**")]}
+        if method != "GET":
+            return 405, {"error": "method not allowed"}
+        if (not path or len(path) > 2 or
+                path[0] not in HBNBCommand.class_list):
+            return 404, {"error": "class doesn't exist"}
+        query = parse_qs(url.query)
+        return await self.call(self.readers, self.shared, self.fetch, path,
+                               int(query.get("limit", [-1])[0]),
+                               int(query.get("offset", [0])[0]))
+
+    def fetch(self, path, limit, offset):
+        """Returns the (status, JSON body) of the instance at
+        <class>/<id>, or of a page of the instances of <class>
+        """
+        if len(path) == 2:
+            obj = models.storage.get(path[0], path[1])
+            if obj is None:
+                return 404, {"error": "no instance found"}
+            return 200, obj.to_dict()
+        stop = None if limit < 0 else offset + limit
+        objects = islice(models.storage.all(path[0]).values(), offset,
+                         stop)
+        return 200, [obj.to_dict() for obj in objects]
+
+
+def main(argv=None):
+    """Runs the server until interrupted"""
+    parser = argparse.ArgumentParser(description="AirBnB clone server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000,
+                        help="port of the command protocol")
+    parser.add_argument("--http-port", type=int, default=8000,
+                        help="port of the JSON API")
+    parser.add_argument("--flush-interval", type=float, default=1.0,
+                        metavar="SECONDS", help="how often to save")
+    parser.add_argument("--readers", type=int, default=4, metavar="N",
+                        help="threads running the reads")
+    args = parser.parse_args(argv)
+    server = HBNBServer(args.host, args.port, args.http_port,
+                        args.flush_interval, args.readers)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,404 @@
+#!/usr/bin/python3
+"""Benchmarks of storage and console operations at scale
+
+Run from the root of the repository::
+
+    python -m tests.benchmarks.bench run --sizes 1000 100000 -o new.json
+    python -m tests.benchmarks.bench compare old.json new.json
+
+Each dataset size is measured in its own process and temporary directory,
+so that the peak RSS reported is that of the size alone and ``file.json``
+of the working directory is left alone. Storage is configured by the
+usual ``HBNB_*`` environment variables, which are recorded in the output.
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import datetime
+from time import perf_counter
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+
+SIZES = (1000, 10000, 100000)
+
+THREADS = (1, 2, 4, 8)
+
+MIX = {"State": 1, "City": 5, "User": 20, "Amenity": 2, "Place": 40,
+       "Review": 32}
+
+CONSOLE_CLASS = "User"
+
+RELOAD = """import time
+import models
+storage = models.create_storage()
+start = time.perf_counter()
+storage.reload()
+print(time.perf_counter() - start)
+"""
+
+
+def percentile(samples, q):
+    """Returns the q-th percentile of the sorted samples, by nearest rank
+    """
+    return samples[max(0, math.ceil(q / 100 * len(samples)) - 1)]
+
+
+def summarize(samples, items=1, elapsed=None):
+    """Returns the statistics of the latencies in samples, in seconds, of
+    operations on items objects each, which took elapsed seconds of wall
+    time if they overlapped
+    """
+    samples = sorted(samples)
+    total = elapsed or sum(samples)
+    return {"count": len(samples),
+            "throughput": len(samples) * items / total if total else None,
+            "p50_ms": percentile(samples, 50) * 1000,
+            "p99_ms": percentile(samples, 99) * 1000}
+
+
+def peak_rss(children=False):
+    """Returns the peak resident set size in KiB of this process, or of
+    its largest child, or None where it cannot be read
+    """
+    if resource is None:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    rss = resource.getrusage(who).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def counts(size):
+    """Returns the number of instances of each class in a dataset of size
+    objects, in the order they have to be created
+    """
+    total = sum(MIX.values())
+    numbers = {class_name: max(1, size * weight // total)
+               for class_name, weight in MIX.items()}
+    numbers["Review"] = max(1, size - sum(numbers.values()) +
+                            numbers["Review"])
+    return numbers
+
+
+def fake(class_name, i, rng, ids):
+    """Returns synthetic attributes of the i-th instance of class_name,
+    which refer to the instances already created, listed in ids by class
+    """
+    if class_name == "State":
+        return {"name": f"State {i}"}
+    if class_name == "City":
+        return {"state_id": rng.choice(ids["State"]), "name": f"City {i}"}
+    if class_name == "User":
+        return {"email": f"user{i}@hbnb.io", "password": f"pwd{i}",
+                "first_name": f"First {i}", "last_name": f"Last {i}"}
+    if class_name == "Amenity":
+        return {"name": f"Amenity {i}"}
+    if class_name == "Place":
+        return {"city_id": rng.choice(ids["City"]),
+                "user_id": rng.choice(ids["User"]),
+                "name": f"Place {i}",
+                "description": "A place to stay " * rng.randint(1, 8),
+                "number_rooms": rng.randint(1, 10),
+                "number_bathrooms": rng.randint(1, 4),
+                "max_guest": rng.randint(1, 16),
+                "price_by_night": rng.randint(10, 500),
+                "latitude": rng.uniform(-90, 90),
+                "longitude": rng.uniform(-180, 180),
+                "amenity_ids": rng.sample(ids["Amenity"],
+                                          min(3, len(ids["Amenity"])))}
+    return {"place_id": rng.choice(ids["Place"]),
+            "user_id": rng.choice(ids["User"]),
+            "text": "Great stay " * rng.randint(1, 20)}
+
+
+def populate(size, rng):
+    """Creates a dataset of size objects of every class. Returns the
+    objects, their ids by class and the latencies of their ``__init__``
+    """
+    import models
+    objects = []
+    ids = {}
+    samples = []
+    for class_name, count in counts(size).items():
+        cls = models.get_class(class_name)
+        ids[class_name] = []
+        for i in range(count):
+            start = perf_counter()
+            obj = cls()
+            samples.append(perf_counter() - start)
+            for name, value in fake(class_name, i, rng, ids).items():
+                setattr(obj, name, value)
+            objects.append(obj)
+            ids[class_name].append(obj.id)
+    return objects, ids, samples
+
+
+def run_console(ids, rng, ops):
+    """Returns the latencies of ops console commands of each kind on the
+    instances of CONSOLE_CLASS
+    """
+    from console import HBNBCommand
+    console = HBNBCommand()
+    output = io.StringIO()
+
+    def timed(line):
+        """Returns the latency of line and what it printed"""
+        output.seek(0)
+        output.truncate()
+        with contextlib.redirect_stdout(output):
+            start = perf_counter()
+            console.onecmd(line)
+            elapsed = perf_counter() - start
+        return elapsed, output.getvalue()
+
+    samples = {"create": [], "show": [], "update": [], "count": [],
+               "all": [], "destroy": []}
+    created = []
+    for _ in range(ops):
+        elapsed, printed = timed(f"create {CONSOLE_CLASS}")
+        samples["create"].append(elapsed)
+        created.append(printed.strip())
+    for _ in range(ops):
+        obj_id = rng.choice(ids[CONSOLE_CLASS])
+        samples["show"].append(timed(f"show {CONSOLE_CLASS} {obj_id}")[0])
+    for i in range(ops):
+        obj_id = rng.choice(ids[CONSOLE_CLASS])
+        samples["update"].append(timed(
+                f'update {CONSOLE_CLASS} {obj_id} first_name "Bench {i}"')[0])
+    for _ in range(ops):
+        samples["count"].append(timed(f"count {CONSOLE_CLASS}")[0])
+    for _ in range(max(1, ops // 10)):
+        samples["all"].append(timed(f"all {CONSOLE_CLASS}")[0])
+    for obj_id in created:
+        samples["destroy"].append(timed(
+                f"destroy {CONSOLE_CLASS} {obj_id}")[0])
+    return samples
+
+
+def run_reads(ids, seed, threads, reads):
+    """Returns the latencies of reads lookups by email of instances of
+    CONSOLE_CLASS made by each of threads threads at once, and the wall
+    time they took
+    """
+    import models
+    storage = models.storage
+    emails = [storage.get(CONSOLE_CLASS, obj_id).email
+              for obj_id in ids[CONSOLE_CLASS]]
+    storage.where(CONSOLE_CLASS, [("email", "==", emails[0])])
+    samples = [[] for _ in range(threads)]
+    barrier = threading.Barrier(threads + 1)
+
+    def work(latencies, rng):
+        """Makes reads lookups of random emails"""
+        barrier.wait()
+        for _ in range(reads):
+            conditions = [("email", "==", rng.choice(emails))]
+            start = perf_counter()
+            storage.where(CONSOLE_CLASS, conditions)
+            latencies.append(perf_counter() - start)
+    workers = [threading.Thread(target=work,
+                                args=(latencies, random.Random(seed + i)))
+               for i, latencies in enumerate(samples)]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    start = perf_counter()
+    for worker in workers:
+        worker.join()
+    elapsed = perf_counter() - start
+    return [latency for latencies in samples for latency in latencies], elapsed
+
+
+def measure(size, ops, repeat, seed, threads=THREADS, reads=2000):
+    """Returns the results of the benchmarks on a dataset of size objects
+    held in the storage of the working directory. Reads are measured
+    with each number of threads
+    """
+    import models
+    rng = random.Random(seed)
+    operations = {}
+    objects, ids, samples = populate(size, rng)
+    operations["init"] = summarize(samples)
+    samples = []
+    for obj in objects:
+        start = perf_counter()
+        obj.to_dict()
+        samples.append(perf_counter() - start)
+    operations["to_dict"] = summarize(samples)
+    storage = models.storage
+    samples = []
+    for _ in range(repeat):
+        for obj in objects:
+            storage.touch(obj)
+        start = perf_counter()
+        storage.save()
+        samples.append(perf_counter() - start)
+    operations["save"] = summarize(samples, len(objects))
+    samples = [float(subprocess.run([sys.executable, "-c", RELOAD],
+                                    check=True, capture_output=True,
+                                    text=True).stdout)
+               for _ in range(repeat)]
+    operations["reload"] = summarize(samples, len(objects))
+    for count in threads:
+        samples, elapsed = run_reads(ids, seed, count, reads)
+        operations[f"where x{count}"] = summarize(samples,
+                                                  elapsed=elapsed)
+    for name, samples in run_console(ids, rng, ops).items():
+        operations[name] = summarize(samples)
+    return {"size": size, "objects": len(objects),
+            "peak_rss_kb": peak_rss(),
+            "reload_peak_rss_kb": peak_rss(children=True),
+            "operations": operations}
+
+
+def report(result, file=sys.stdout):
+    """Prints the results of one dataset size as a table"""
+    print(f"{result['objects']} objects, peak RSS "
+          f"{result['peak_rss_kb']} KiB (reload "
+          f"{result['reload_peak_rss_kb']} KiB)", file=file)
+    print(f"  {'operation':<10}{'count':>8}{'per second':>14}"
+          f"{'p50 ms':>12}{'p99 ms':>12}", file=file)
+    for name, stats in result["operations"].items():
+        throughput = stats["throughput"] or 0
+        print(f"  {name:<10}{stats['count']:>8}{throughput:>14.1f}"
+              f"{stats['p50_ms']:>12.4f}{stats['p99_ms']:>12.4f}",
+              file=file)
+
+
+def run(sizes, ops, repeat, seed, threads=THREADS, reads=2000):
+    """Measures each size in its own process and returns the run"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+            filter(None, (ROOT, env.get("PYTHONPATH"))))
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            output = subprocess.run(
+                    [sys.executable, "-m", "tests.benchmarks.bench",
+                     "worker", str(size), "--ops", str(ops),
+                     "--repeat", str(repeat), "--seed", str(seed),
+                     "--reads", str(reads), "--threads",
+                     *map(str, threads)],
+                    cwd=directory, env=env, check=True,
+                    stdout=subprocess.PIPE, text=True).stdout
+        result = json.loads(output)
+        report(result)
+        results.append(result)
+    return {"created_at": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "environment": {name: value
+                            for name, value in os.environ.items()
+                            if name.startswith("HBNB_")},
+            "ops": ops, "repeat": repeat, "seed": seed,
+            "threads": list(threads), "reads": reads,
+            "results": results}
+
+
+def compare(old, new, threshold):
+    """Returns the rows comparing the runs old and new on the sizes and
+    operations they share, each (size, name, metric, old value, new
+    value, change, regressed). p50 latency and peak RSS regress when they
+    grow by more than threshold, throughput when it drops by more than
+    threshold
+    """
+    rows = []
+    old_results = {result["size"]: result for result in old["results"]}
+    for result in new["results"]:
+        before = old_results.get(result["size"])
+        if before is None:
+            continue
+        metrics = [("process", "peak_rss_kb", before["peak_rss_kb"],
+                    result["peak_rss_kb"], 1)]
+        for name, stats in result["operations"].items():
+            if name not in before["operations"]:
+                continue
+            was = before["operations"][name]
+            metrics.append((name, "p50_ms", was["p50_ms"],
+                            stats["p50_ms"], 1))
+            metrics.append((name, "throughput", was["throughput"],
+                            stats["throughput"], -1))
+        for name, metric, was, value, sign in metrics:
+            if not was or value is None:
+                continue
+            change = value / was - 1
+            rows.append((result["size"], name, metric, was, value, change,
+                         sign * change > threshold))
+    return rows
+
+
+def main(argv=None):
+    """Runs the benchmarks, or compares two runs. Returns the exit status,
+    1 when the comparison found a regression
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--sizes", metavar="N", type=int, nargs="+",
+                            default=SIZES,
+                            help="numbers of objects of the datasets")
+    run_parser.add_argument("-o", "--output", metavar="FILE",
+                            help="write the results as JSON to FILE")
+    worker_parser = commands.add_parser(
+            "worker", help="measure one size and print it as JSON")
+    worker_parser.add_argument("size", type=int)
+    for subparser in (run_parser, worker_parser):
+        subparser.add_argument("--ops", type=int, default=20,
+                               help="console commands of each kind")
+        subparser.add_argument("--repeat", type=int, default=3,
+                               help="saves and reloads to time")
+        subparser.add_argument("--seed", type=int, default=0)
+        subparser.add_argument("--threads", metavar="N", type=int,
+                               nargs="+", default=THREADS,
+                               help="numbers of threads reading at once")
+        subparser.add_argument("--reads", type=int, default=2000,
+                               help="lookups made by each reading thread")
+    compare_parser = commands.add_parser(
+            "compare", help="flag the regressions between two runs")
+    compare_parser.add_argument("old", help="JSON results of a run")
+    compare_parser.add_argument("new", help="JSON results of a later run")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="relative change that is a "
+                                     "regression (default 0.1)")
+    args = parser.parse_args(argv)
+    if args.command == "worker":
+        print(json.dumps(measure(args.size, args.ops, args.repeat,
+                                 args.seed, args.threads, args.reads)))
+        return 0
+    if args.command == "run":
+        results = run(args.sizes, args.ops, args.repeat, args.seed,
+                      args.threads, args.reads)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+        return 0
+    runs = []
+    for path in (args.old, args.new):
+        with open(path, encoding="utf-8") as f:
+            runs.append(json.load(f))
+    rows = compare(*runs, args.threshold)
+    print(f"{'size':>9} {'operation':<10}{'metric':<12}{'old':>14}"
+          f"{'new':>14}{'change':>9}")
+    for size, name, metric, was, value, change, regressed in rows:
+        print(f"{size:>9} {name:<10}{metric:<12}{was:>14.4f}"
+              f"{value:>14.4f}{change:>+9.1%}"
+              f"{'  REGRESSION' if regressed else ''}")
+    return 1 if any(row[-1] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+"""Unittests for the benchmarks module"""
+import json
+import os
+import tempfile
+import unittest
+from io import StringIO
+from unittest import mock
+from tests.benchmarks.bench import (MIX, compare, counts, main, percentile,
+                                    summarize)
+
+
+class TestBench(unittest.TestCase):
+    """Test Suite"""
+
+    def test_percentile(self):
+        """Tests percentiles by nearest rank"""
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 50), 50)
+        self.assertEqual(percentile(samples, 99), 99)
+        self.assertEqual(percentile([7], 99), 7)
+        stats = summarize([0.002, 0.001, 0.003, 0.002], items=10)
+        self.assertEqual(stats["count"], 4)
+        self.assertAlmostEqual(stats["throughput"], 5000)
+        self.assertAlmostEqual(stats["p50_ms"], 2)
+        self.assertAlmostEqual(stats["p99_ms"], 3)
+
+    def test_counts(self):
+        """Tests that datasets have the size asked with every class"""
+        for size in (10, 1000, 12345):
+            numbers = counts(size)
+            self.assertEqual(list(numbers), list(MIX))
+            self.assertEqual(sum(numbers.values()), size)
+            self.assertTrue(all(numbers.values()))
+
+    def test_compare(self):
+        """Tests that slower latencies, lower throughputs and larger RSS
+        beyond the threshold are flagged
+        """
+        def run(p50, throughput, rss):
+            return {"results": [{"size": 10, "peak_rss_kb": rss,
+                                 "operations": {"save": {
+                                     "p50_ms": p50,
+                                     "throughput": throughput}}}]}
+        rows = compare(run(1, 100, 1000), run(1.05, 80, 1500), 0.1)
+        self.assertEqual([row[1:3] + row[-1:] for row in rows],
+                         [("process", "peak_rss_kb", True),
+                          ("save", "p50_ms", False),
+                          ("save", "throughput", True)])
+        self.assertEqual(compare(run(1, 100, 1000),
+                                 {"results": []}, 0.1), [])
+
+    def test_run_and_compare(self):
+        """Tests that a run writes every operation and compares equal to
+        itself
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bench.json")
+            with mock.patch("sys.stdout", StringIO()):
+                self.assertEqual(main(["run", "--sizes", "30", "--ops", "2",
+                                       "--repeat", "1", "--threads", "1",
+                                       "2", "--reads", "5", "-o", path]),
+                                 0)
+                self.assertEqual(main(["compare", path, path]), 0)
+            with open(path, encoding="utf-8") as f:
+                results = json.load(f)["results"]
+        self.assertEqual(results[0]["objects"], 30)
+        self.assertEqual(set(results[0]["operations"]),
+                         {"init", "to_dict", "save", "reload", "create",
+                          "show", "update", "all", "count", "destroy",
+                          "where x1", "where x2"})
+        self.assertEqual(results[0]["operations"]["where x2"]["count"], 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,12 +2,20 @@
 """Unit tests for HBNBCommand console"""
 
 import unittest
+import json
 import os
+import subprocess
 import sys
+import tempfile
 from io import StringIO
-from console import HBNBCommand
+from unittest import mock
+from console import (Command, HBNBCommand, main, parse, parse_arguments,
+                     parse_plain)
 from models import storage
 from models.base_model import BaseModel
+from models.state import State
+from models.place import Place
+from models.city import City
 
 
 class TestHBNBCommand(unittest.TestCase):
@@ -24,8 +32,9 @@ class TestHBNBCommand(unittest.TestCase):
         """Clean up after each test"""
         sys.stdout = sys.__stdout__
         self.stdout.close()
-        if os.path.exists("file.json"):
-            os.remove("file.json")
+        for path in ("file.json", "file.json.lock"):
+            if os.path.exists(path):
+                os.remove(path)
 
     def get_output(self):
         """Helper to get the output from stdout"""
@@ -137,6 +146,47 @@ class TestHBNBCommand(unittest.TestCase):
         output = self.get_output()
         self.assertIn(str(obj), output)
 
+    def test_all_output_unchanged(self):
+        """Test that streamed 'all' prints the repr of the list of strings
+        """
+        self.console.onecmd("all Place")
+        self.assertEqual(self.get_output(), str([
+                str(obj) for obj in storage.all(Place).values()]))
+
+    def test_all_paging(self):
+        """Test 'all' with limit, offset and after"""
+        states = [State() for _ in range(3)]
+        keys = list(storage.all(State))
+        position = keys.index(f"State.{states[0].id}")
+        self.console.onecmd(f"all State offset={position + 1} limit=1")
+        self.console.onecmd(f"State.all(after={states[1].id}, limit=1)")
+        self.console.onecmd("all State limit=0")
+        self.assertEqual(self.get_output().split("\n"), [
+                str([str(states[1])]), str([str(states[2])]), "[]"])
+        for state in states:
+            storage.delete(state)
+
+    def test_all_json_formats(self):
+        """Test 'all' with format=ndjson and format=json"""
+        state = State()
+        self.console.onecmd(f"all State after=State.{state.id}")
+        self.console.onecmd(f"all State offset={storage.count(State) - 1} "
+                            "format=ndjson")
+        self.console.onecmd(f"all State offset={storage.count(State) - 1} "
+                            "format=json")
+        output = self.get_output().split("\n")
+        self.assertEqual(output[0], "[]")
+        self.assertEqual(json.loads(output[1]), state.to_dict())
+        self.assertEqual(json.loads(output[2]), [state.to_dict()])
+        storage.delete(state)
+
+    def test_all_invalid_option(self):
+        """Test 'all' with an invalid option"""
+        self.console.onecmd("all State limit=-1")
+        self.console.onecmd("all format=xml")
+        self.assertEqual(self.get_output(), "** invalid option **\n"
+                         "** invalid option **")
+
     def test_all_invalid_class(self):
         """Test 'all' with an invalid class name"""
         self.console.onecmd("all InvalidClass")
@@ -184,6 +234,458 @@ class TestHBNBCommand(unittest.TestCase):
         obj = storage.all()[f"BaseModel.{obj.id}"]
         self.assertEqual(obj.name, "John Doe")
 
+    def test_count(self):
+        """Test '<class>.count()' for a class"""
+        self.console.onecmd("State.count()")
+        before = int(self.get_output())
+        State().save()
+        self.console.onecmd("State.count()")
+        self.assertEqual(self.get_output().split()[-1], str(before + 1))
+
+    def test_commit_without_begin(self):
+        """Test 'commit' and 'rollback' outside a transaction"""
+        self.console.onecmd("commit")
+        self.console.onecmd("rollback")
+        self.assertEqual(self.get_output(),
+                         "** no transaction in progress **\n"
+                         "** no transaction in progress **")
+
+    def test_begin_commit(self):
+        """Test that 'commit' saves the changes made after 'begin'"""
+        self.console.onecmd("begin")
+        self.console.onecmd("create State")
+        obj_id = self.get_output()
+        self.assertFalse(os.path.exists("file.json"))
+        self.console.onecmd("commit")
+        with open("file.json") as f:
+            self.assertIn(obj_id, f.read())
+
+    def test_begin_rollback(self):
+        """Test that 'rollback' discards the changes made after 'begin'"""
+        self.console.onecmd("begin")
+        self.console.onecmd("create State")
+        obj_id = self.get_output()
+        self.console.onecmd("rollback")
+        self.assertNotIn(f"State.{obj_id}", storage.all())
+
+    def test_sync(self):
+        """Test that 'sync' writes the pending changes, but not inside a
+        transaction
+        """
+        with storage.deferred():
+            self.console.onecmd("create State")
+            obj_id = self.get_output()
+            self.console.onecmd("sync")
+            with open("file.json") as f:
+                self.assertIn(obj_id, f.read())
+        self.console.onecmd("begin")
+        self.console.onecmd("sync")
+        self.console.onecmd("rollback")
+        self.assertEqual(self.get_output().splitlines()[-1],
+                         "** transaction in progress **")
+
+    def test_convert(self):
+        """Test that 'convert' rewrites the file in the format given"""
+        self.console.onecmd("create State")
+        obj_id = self.get_output()
+        try:
+            self.console.onecmd("convert binary")
+            with open("file.json", "rb") as f:
+                self.assertTrue(f.read().startswith(b"HBNB"))
+            storage.reload()
+            self.assertIsNotNone(storage.get(State, obj_id))
+        finally:
+            self.console.onecmd("convert json")
+        with open("file.json") as f:
+            self.assertIn(obj_id, f.read())
+        self.console.onecmd("convert")
+        self.console.onecmd("convert yaml")
+        self.assertEqual(self.get_output().splitlines()[-2:],
+                         ["** format missing **", "** unknown format **"])
+
+    def test_update_several_attributes(self):
+        """Test 'update' with several attribute/value pairs"""
+        obj = BaseModel()
+        obj.save()
+        with mock.patch.object(storage, "save") as save:
+            self.console.onecmd(f'update BaseModel {obj.id} '
+                                f'name "John Doe" age 89')
+            self.assertEqual(save.call_count, 1)
+        self.assertEqual(obj.name, "John Doe")
+        self.assertEqual(obj.age, 89)
+
+    def test_update_odd_pairs(self):
+        """Test that 'update' applies nothing when a value is missing"""
+        obj = BaseModel()
+        obj.save()
+        self.console.onecmd(f"update BaseModel {obj.id} name John age")
+        self.assertEqual(self.get_output(), "** value missing **")
+        self.assertFalse(hasattr(obj, "name"))
+
+    def test_update_dict(self):
+        """Test '<class>.update(id, dict)' saves once with value types"""
+        obj = BaseModel()
+        obj.save()
+        command = (f'BaseModel.update("{obj.id}", '
+                   '{"name": "John, Jr", \'age\': 89, '
+                   '"ratio": 1.5, "tags": ["a", "b"]})')
+        with mock.patch.object(storage, "save") as save:
+            self.console.onecmd(command)
+            self.assertEqual(save.call_count, 1)
+        self.assertEqual(obj.name, "John, Jr")
+        self.assertEqual(obj.age, 89)
+        self.assertEqual(obj.ratio, 1.5)
+        self.assertEqual(obj.tags, ["a", "b"])
+        obj.tags.append("c")
+        self.console.onecmd(command)
+        self.assertEqual(obj.tags, ["a", "b"])
+
+    def test_update_dict_json(self):
+        """Test '<class>.update(id, dict)' with JSON literals"""
+        obj = BaseModel()
+        obj.save()
+        self.console.onecmd(f'BaseModel.update("{obj.id}", '
+                            '{"active": true, "note": null})')
+        self.assertIs(obj.active, True)
+        self.assertIsNone(obj.note)
+
+    def test_update_dict_invalid(self):
+        """Test that an invalid dictionary updates nothing"""
+        obj = BaseModel()
+        obj.save()
+        for dictionary in ('{"age": yes}', '{"age": 1', "{1, 2}"):
+            self.console.onecmd(f'BaseModel.update("{obj.id}", '
+                                f'{dictionary})')
+            self.assertEqual(self.get_output().splitlines()[-1],
+                             "** invalid dictionary **")
+        self.assertFalse(hasattr(obj, "age"))
+
+    def test_update_reserved(self):
+        """Test that both update forms refuse the attributes kept by
+        storage
+        """
+        obj = BaseModel()
+        obj.save()
+        created_at = obj.created_at
+        for command in (f'BaseModel.update("{obj.id}", '
+                        '{"created_at": "yesterday", "name": "x"})',
+                        f"BaseModel.update({obj.id}, id, 1)",
+                        f"update BaseModel {obj.id} name x updated_at x",
+                        f'update BaseModel {obj.id} __class__ "User"'):
+            self.console.onecmd(command)
+            self.assertEqual(self.get_output().splitlines()[-1],
+                             "** attribute can't be updated **")
+        self.assertEqual(obj.created_at, created_at)
+        self.assertFalse(hasattr(obj, "name"))
+        obj.save()
+
+    def test_update_dict_nonexistent_instance(self):
+        """Test '<class>.update(id, dict)' with a nonexistent instance"""
+        self.console.onecmd('BaseModel.update("1234", {"name": "John"})')
+        self.assertEqual(self.get_output(), "** no instance found **")
+
+    def test_update_dot_attribute(self):
+        """Test '<class>.update(id, name, value)'"""
+        obj = BaseModel()
+        obj.save()
+        self.console.onecmd(f'BaseModel.update("{obj.id}", "name", "Betty")')
+        self.assertEqual(obj.name, "Betty")
+
+    def test_update_dot_unquoted(self):
+        """Test '<class>.update(id, name, value)' without quotes"""
+        obj = BaseModel()
+        obj.save()
+        self.console.onecmd(f"BaseModel.update({obj.id}, name, Betty, "
+                            f"age, 89)")
+        self.assertEqual((obj.name, obj.age), ("Betty", 89))
+        self.console.onecmd(f"BaseModel.update({obj.id})")
+        self.assertEqual(self.get_output(), "** attribute name missing **")
+
+    def test_dot_quoted_ids(self):
+        """Test that every dot command reads ids quoted either way"""
+        state = State()
+        state.save()
+        for quote in ('"', "'", ""):
+            self.console.onecmd(f"State.show({quote}{state.id}{quote})")
+            self.assertIn(state.id, self.get_output().splitlines()[-1])
+            self.console.onecmd(f"State.cities({quote}{state.id}{quote})")
+            self.assertEqual(self.get_output().splitlines()[-1], "[]")
+        self.console.onecmd(f"State.destroy('{state.id}')")
+        self.assertIsNone(storage.get(State, state.id))
+
+    def test_dot_invalid_arguments(self):
+        """Test that a dot command with unparsable arguments prints why
+        """
+        self.console.onecmd('State.show("1234)')
+        self.assertEqual(self.get_output(), "** invalid arguments **")
+
+    def test_update_dot_invalid(self):
+        """Test '<class>.update' with an empty argument"""
+        obj = BaseModel()
+        obj.save()
+        self.console.onecmd(f"BaseModel.update({obj.id}, , Betty)")
+        self.assertEqual(self.get_output(), "** invalid arguments **")
+        self.assertFalse(hasattr(obj, "Betty"))
+
+    def test_where(self):
+        """Test '<class>.where(conditions)'"""
+        place = Place()
+        place.price_by_night = 42
+        place.name = "Villa, by the sea"
+        place.save()
+        self.console.onecmd('Place.where(price_by_night<=42, '
+                            'name="Villa, by the sea")')
+        self.assertIn(place.id, self.get_output())
+        storage.delete(place)
+
+    def test_where_invalid(self):
+        """Test '<class>.where()' with an invalid condition or class"""
+        self.console.onecmd("Place.where(price_by_night)")
+        self.console.onecmd("Unknown.where(a=1)")
+        self.assertEqual(self.get_output(), "** invalid condition **\n"
+                         "** class doesn't exist **")
+
+    def test_geo_commands(self):
+        """Test '<class>.near()', '.within()' and '.nearest()'"""
+        place = Place()
+        place.latitude = 5.6037
+        place.longitude = -0.1870
+        place.save()
+        self.console.onecmd("Place.near(5.6, -0.19, 5)")
+        self.console.onecmd("Place.within(5, -1, 6, 0)")
+        self.console.onecmd("Place.nearest(5.6, -0.19, 1)")
+        self.assertEqual(self.get_output().count(place.id), 6)
+        storage.delete(place)
+
+    def test_geo_invalid(self):
+        """Test geographic commands with invalid arguments"""
+        self.console.onecmd("Place.near(5.6, -0.19)")
+        self.console.onecmd("Place.nearest(5.6, -0.19, 1.5)")
+        self.console.onecmd('Place.within("a", 1, 2, 3)')
+        self.assertEqual(self.get_output(),
+                         "\n".join(["** invalid coordinates **"] * 3))
+
+    def test_relation_commands(self):
+        """Test '<class>.cities(<id>)' and its errors"""
+        state = State()
+        state.save()
+        city = City()
+        city.state_id = state.id
+        city.save()
+        self.console.onecmd(f'State.cities("{state.id}")')
+        self.assertIn(city.id, self.get_output())
+        self.stdout.truncate(0)
+        self.stdout.seek(0)
+        self.console.onecmd("State.cities()")
+        self.console.onecmd('State.cities("missing")')
+        self.assertEqual(self.get_output(), "** instance id missing **\n"
+                         "** no instance found **")
+        storage.delete(city)
+        storage.delete(state)
+
+    def test_query(self):
+        """Test 'query' with where, order by and limit"""
+        cheap = Place()
+        cheap.price_by_night = 5
+        cheap.save()
+        dear = Place()
+        dear.price_by_night = 6
+        dear.save()
+        self.console.onecmd("query Place where price_by_night <= 6 "
+                            "order by price_by_night desc limit 1")
+        self.assertIn(dear.id, self.get_output())
+        self.assertNotIn(cheap.id, self.get_output())
+        storage.delete(cheap)
+        storage.delete(dear)
+
+    def test_explain(self):
+        """Test 'explain' and invalid queries"""
+        self.console.onecmd("explain Place order by price_by_night limit 1")
+        self.assertIn("sorted index scan on price_by_night",
+                      self.get_output())
+        self.stdout.truncate(0)
+        self.stdout.seek(0)
+        self.console.onecmd("query")
+        self.console.onecmd("query Unknown")
+        self.console.onecmd("explain Place where")
+        self.assertEqual(self.get_output(), "** class name missing **\n"
+                         "** class doesn't exist **\n"
+                         "** invalid query **")
+
+    def test_aggregates(self):
+        """Test '<class>.avg(<attribute>)' and '<class>.count_by()'"""
+        place = Place()
+        place.user_id = "aggregate-user"
+        place.save()
+        self.console.onecmd("Place.min(price_by_night)")
+        self.console.onecmd("Place.count_by(user_id)")
+        self.console.onecmd("Place.avg()")
+        self.console.onecmd("Unknown.sum(price)")
+        output = self.get_output().split("\n")
+        self.assertEqual(output[0], "0")
+        self.assertIn("'aggregate-user': 1", output[1])
+        self.assertEqual(output[2:], ["** attribute name missing **",
+                                      "** class doesn't exist **"])
+        storage.delete(place)
+
+    def test_run_batch(self):
+        """Test that a script saves once and reports errors per line"""
+        lines = ["# a comment", "create State", "", "create Unknown",
+                 "State.count()", "update State"]
+        stderr = StringIO()
+        with mock.patch("sys.stderr", stderr), \
+                mock.patch.object(storage, "flush",
+                                  wraps=storage.flush) as flush:
+            failures = self.console.run_batch(lines, "script")
+        self.assertEqual(failures, 2)
+        self.assertEqual(flush.call_count, 1)
+        output = self.get_output().split("\n")
+        self.assertIsNotNone(storage.get(State, output[0]))
+        self.assertEqual(output[1], str(storage.count(State)))
+        self.assertEqual(stderr.getvalue(),
+                         "script:4: ** class doesn't exist **\n"
+                         "script:6: ** instance id missing **\n")
+
+    def test_run_batch_exception_and_checkpoint(self):
+        """Test that failing lines do not stop the script, and saves
+        every checkpoint commands
+        """
+        place = Place()
+        place.save()
+        lines = [f"update Place {place.id} number_rooms many",
+                 "count Unknown", "create Place", "create Place", "quit",
+                 "create Place"]
+        stderr = StringIO()
+        with mock.patch("sys.stderr", stderr), \
+                mock.patch.object(storage, "flush",
+                                  wraps=storage.flush) as flush:
+            failures = self.console.run_batch(lines, "script", 2)
+        self.assertEqual(failures, 2)
+        self.assertEqual(flush.call_count, 3)
+        self.assertTrue(stderr.getvalue().startswith(
+                "script:1: ** ValueError: "))
+        self.assertEqual(len(self.get_output().split("\n")), 2)
+
+    def test_run_batch_failed_saves(self):
+        """Test that failed checkpoint and final saves are reported"""
+        stderr = StringIO()
+        with mock.patch("sys.stderr", stderr), \
+                mock.patch.object(storage, "flush",
+                                  side_effect=OSError("disk full")):
+            failures = self.console.run_batch(["create State"] * 2,
+                                              "script", 2)
+        self.assertEqual(failures, 2)
+        self.assertEqual(stderr.getvalue(),
+                         "script:2: ** OSError: disk full **\n"
+                         "script:end: ** OSError: disk full **\n")
+
+    def test_main_batch_file(self):
+        """Test 'console.py --batch <file>' exit status"""
+        with open("test_script.cmds", "w") as f:
+            f.write("create Unknown\n")
+        self.addCleanup(os.remove, "test_script.cmds")
+        with mock.patch("sys.stderr", StringIO()):
+            self.assertEqual(main(["--batch", "test_script.cmds"]), 1)
+        with mock.patch("sys.stdin", StringIO("all State limit=0\n")):
+            self.assertEqual(main([]), 0)
+
+    def test_main_command_imports(self):
+        """Test that 'console.py -c "count User"' on a lazily reloaded file
+        imports no model module, nor the modules only some formats and
+        storages need
+        """
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        records = {"Place.1": {"id": "1", "__class__": "Place",
+                               "created_at": "2017-09-28T21:03:54.052298",
+                               "updated_at": "2017-09-28T21:03:54.052298"}}
+        records["User.2"] = dict(records["Place.1"], id="2",
+                                 __class__="User")
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "file.json"), "w") as f:
+                json.dump(records, f)
+            result = subprocess.run(
+                    [sys.executable, "-X", "importtime",
+                     os.path.join(root, "console.py"),
+                     "-c", "count User", "-c", "count"],
+                    cwd=directory, capture_output=True, text=True,
+                    env={**os.environ, "PYTHONPATH": root,
+                         "HBNB_LAZY_RELOAD": "1"})
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.stdout.split(), ["1", "2"])
+        imported = {line.rsplit("|", 1)[-1].strip()
+                    for line in result.stderr.splitlines()
+                    if line.startswith("import time:")}
+        self.assertIn("models.engine.file_storage", imported)
+        for module in ("models.base_model", "models.user", "models.place",
+                       "concurrent.futures", "gzip", "sqlite3", "numpy"):
+            self.assertNotIn(module, imported)
+
+    def test_reads(self):
+        """Test telling the commands that only read storage"""
+        for line in ("show State 1", "all", "count Place", "?show",
+                     "Place.where(max_guest>=4)", "User.places(1)",
+                     "query Place limit 2"):
+            self.assertTrue(self.console.reads(line), line)
+        for line in ("create State", "update State 1 name x", "quit",
+                     "State.update(1, name, x)", "State.destroy(1)",
+                     "begin", "convert json", "", "Unknown syntax"):
+            self.assertFalse(self.console.reads(line), line)
+
+    def test_parse(self):
+        """Test parsing the '<class>.<command>(<parameters>)' syntax"""
+        self.assertEqual(parse(' Place.show("1234") '),
+                         Command("Place", "show", ("1234",), None))
+        self.assertEqual(parse("Place.count()"),
+                         Command("Place", "count", (), None))
+        self.assertEqual(parse("Place.update(1, {'a': (1, 2)})"),
+                         Command("Place", "update", ("1", {"a": (1, 2)}),
+                                 None))
+        self.assertEqual(parse("Place.show('1)"),
+                         Command("Place", "show", (), "invalid arguments"))
+        self.assertIsNone(parse("Place.count"))
+        self.assertIsNone(parse("create Place"))
+        hits = parse.cache_info().hits
+        parse("Place.count()")
+        self.assertEqual(parse.cache_info().hits, hits + 1)
+
+    def test_parse_arguments(self):
+        """Test parsing the comma separated arguments of a dot command"""
+        self.assertEqual(parse_arguments(""), [])
+        self.assertEqual(parse_arguments('1-2, "John, Jr", \'a\\\'b\''),
+                         ["1-2", "John, Jr", "a'b"])
+        self.assertEqual(parse_arguments("1, {'a': (1, 2)}"),
+                         ["1", {"a": (1, 2)}])
+        self.assertEqual(parse_arguments('1, tags, [1, 2], x,'),
+                         ["1", "tags", "[1, 2]", "x"])
+        self.assertEqual(parse_arguments('a="b, c", d<1'),
+                         ['a="b, c"', "d<1"])
+        for parameters, error in (("1,,x", "invalid arguments"),
+                                  ('1, "x', "invalid arguments"),
+                                  ("1, {'a': 1", "invalid dictionary")):
+            with self.assertRaisesRegex(ValueError, error):
+                parse_arguments(parameters)
+
+    def test_parse_plain(self):
+        """Test parsing the '<command> <argument>' syntax like cmd.Cmd"""
+        self.assertEqual(parse_plain("  show Place 1 "),
+                         ("show", "Place 1", "show Place 1"))
+        self.assertEqual(parse_plain("?all"), ("help", "all", "help all"))
+        self.assertEqual(parse_plain(""), (None, None, ""))
+        self.assertEqual(parse_plain("Place.all()"),
+                         ("Place", ".all()", "Place.all()"))
+
+    def test_dot_commands_dispatch(self):
+        """Test that every dot command is in the dispatch table and that
+        unknown ones print nothing
+        """
+        for name in ("all", "count", "show", "destroy", "update", "where",
+                     "near", "within", "nearest", "sum", "count_by",
+                     "cities"):
+            self.assertIn(name, HBNBCommand.dot_commands)
+        self.console.onecmd("Place.unknown()")
+        self.console.onecmd("State.reviews(1)")
+        self.assertEqual(self.get_output(), "")
+
 
 if __name__ == "__main__":
     unittest.main()
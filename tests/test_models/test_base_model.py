@@ -87,6 +87,25 @@ class TestBaseModel(unittest.TestCase):
         self.obj_no_dict.save()
         self.assertNotEqual(updated, self.obj_no_dict.updated_at)
 
+    def test_ids_are_interned(self):
+        """Test that equal ids and foreign keys share one string"""
+        place_id = "".join(["ec28a5da", "-3743"])
+        obj1 = BaseModel(id="".join(["ab", "cd"]), place_id=place_id)
+        obj2 = BaseModel(id="".join(["ab", "cd"]))
+        obj2.place_id = "".join(["ec28a5da", "-3743"])
+        self.assertIs(obj1.id, obj2.id)
+        self.assertIs(obj1.place_id, obj2.place_id)
+
+    def test_equal_timestamps_are_shared(self):
+        """Test that equal created_at/updated_at share one datetime"""
+        obj_dict = dict(self.obj_dict)
+        obj_dict["updated_at"] = obj_dict["created_at"]
+        obj = BaseModel(**obj_dict)
+        self.assertIs(obj.created_at, obj.updated_at)
+        self.assertIs(self.obj_no_dict.created_at,
+                      self.obj_no_dict.updated_at)
+        self.assertEqual(obj.to_dict(), obj_dict | {"__class__": "BaseModel"})
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,6 +1,7 @@
 #!/usr/bin/python3
 """Unittests for City class"""
 from models.city import City
+from models.place import Place
 import datetime
 import unittest
 
@@ -89,6 +90,15 @@ class TestCity(unittest.TestCase):
         self.obj_no_dict.save()
         self.assertNotEqual(updated, self.obj_no_dict.updated_at)
 
+    def test_places(self):
+        """Test that places follows the city_id of Place instances"""
+        child = Place()
+        self.assertEqual(self.obj_no_dict.places(), [])
+        child.city_id = self.obj_no_dict.id
+        self.assertEqual(self.obj_no_dict.places(), [child])
+        child.city_id = "other"
+        self.assertEqual(self.obj_no_dict.places(), [])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,9 +1,28 @@
 #!/usr/bin/python3
 
 import unittest
+import json
 import os
+import shutil
+import subprocess
+import sys
+import threading
+from datetime import datetime
+from unittest import mock
+import models
 from models.engine.file_storage import FileStorage
+from models.engine.indexes import ColumnIndex
+from models.engine.query import Plan, Query
+from models.engine.serializers import load
 from models.base_model import BaseModel
+from models.user import User
+from models.place import Place
+from models.review import Review
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class TestFileStorage(unittest.TestCase):
@@ -18,8 +37,9 @@ class TestFileStorage(unittest.TestCase):
 
     def tearDown(self):
         """Clean up resources after each test"""
-        if os.path.exists(self.file_path):
-            os.remove(self.file_path)
+        for path in (self.file_path, FileStorage.lock_path()):
+            if os.path.exists(path):
+                os.remove(path)
 
     def test_instance_creation(self):
         """Test that FileStorage is instantiated properly"""
@@ -124,6 +144,847 @@ class TestFileStorage(unittest.TestCase):
         self.assertIn(key, self.storage.all())
         self.assertEqual(self.storage.all()[key].id, obj.id)
 
+    def test_all_with_class(self):
+        """Test that 'all' filters on a class or class name"""
+        user = User()
+        obj = BaseModel()
+        users = self.storage.all(User)
+        self.assertIn(f"User.{user.id}", users)
+        self.assertNotIn(f"BaseModel.{obj.id}", users)
+        self.assertEqual(users, self.storage.all("User"))
+        self.assertEqual(self.storage.all("Unknown"), {})
+
+    def test_count(self):
+        """Test that 'count' follows new and delete"""
+        total = self.storage.count()
+        users = self.storage.count(User)
+        user = User()
+        self.assertEqual(self.storage.count(), total + 1)
+        self.assertEqual(self.storage.count("User"), users + 1)
+        self.storage.delete(user)
+        self.assertEqual(self.storage.count(), total)
+        self.assertEqual(self.storage.count("User"), users)
+        self.assertNotIn(f"User.{user.id}", self.storage.all(User))
+
+    def test_save_encodes_only_changed_objects(self):
+        """Test that clean objects reuse their cached encoding"""
+        obj1 = BaseModel()
+        obj2 = BaseModel()
+        self.storage.save()
+        with mock.patch.object(BaseModel, "to_dict",
+                               autospec=True,
+                               side_effect=BaseModel.to_dict) as to_dict:
+            obj1.name = "Betty"
+            self.storage.save()
+            self.storage.save()
+        encoded = [call.args[0] for call in to_dict.call_args_list]
+        self.assertEqual(encoded.count(obj1), 1)
+        self.assertEqual(encoded.count(obj2), 0)
+        with open(self.file_path) as f:
+            objects = json.load(f)
+        self.assertEqual(objects[f"BaseModel.{obj1.id}"]["name"], "Betty")
+        self.assertEqual(objects[f"BaseModel.{obj2.id}"], obj2.to_dict())
+
+    def test_save_after_change_in_place(self):
+        """Test that a list changed in place is saved with other changes
+        """
+        place = Place()
+        place.amenity_ids = []
+        self.storage.save()
+        place.amenity_ids.append("x")
+        BaseModel().save()
+        with open(self.file_path) as f:
+            objects = json.load(f)
+        self.assertEqual(objects[f"Place.{place.id}"]["amenity_ids"], ["x"])
+        self.storage.delete(place)
+
+    def test_where_follows_changes(self):
+        """Test that 'where' sees new, updated and deleted places"""
+        cheap = Place()
+        cheap.price_by_night = 50
+        cheap.max_guest = 4
+        dear = Place()
+        dear.price_by_night = 500
+        conditions = [("price_by_night", "<", 100), ("max_guest", ">=", 4)]
+        found = self.storage.where(Place, conditions)
+        self.assertIn(f"Place.{cheap.id}", found)
+        self.assertNotIn(f"Place.{dear.id}", found)
+        dear.price_by_night = 80
+        dear.max_guest = 5
+        self.assertIn(f"Place.{dear.id}",
+                      self.storage.where("Place", conditions))
+        self.storage.delete(cheap)
+        self.assertNotIn(f"Place.{cheap.id}",
+                         self.storage.where("Place", conditions))
+        self.storage.delete(dear)
+
+    @unittest.skipUnless(numpy, "requires NumPy")
+    def test_where_uses_columns(self):
+        """Test that 'where' reads the columns when NumPy is installed
+        and finds the same places as a scan
+        """
+        places = [Place() for _ in range(20)]
+        for price, place in zip(range(0, 200, 10), places):
+            place.price_by_night = price
+            place.max_guest = price % 7
+        places[0].price_by_night = "free"
+        conditions = [("price_by_night", "<", 100), ("max_guest", ">=", 2)]
+        with mock.patch.object(ColumnIndex, "where", autospec=True,
+                               side_effect=ColumnIndex.where) as where:
+            found = self.storage.where(Place, conditions)
+            self.assertEqual(where.call_count, 1)
+            with mock.patch.object(ColumnIndex, "vectorized", False):
+                self.assertEqual(self.storage.where(Place, conditions),
+                                 found)
+            self.assertEqual(where.call_count, 1)
+        self.assertEqual(len(found), 7)
+        for place in places:
+            self.storage.delete(place)
+
+    def test_where_on_other_fields(self):
+        """Test 'where' on fields that have no column"""
+        place = Place()
+        place.name = "Villa"
+        found = self.storage.where(Place, [("name", "==", "Villa"),
+                                           ("price_by_night", "==", 0)])
+        self.assertIn(f"Place.{place.id}", found)
+        self.storage.delete(place)
+
+    def test_geo_queries_follow_changes(self):
+        """Test near, within and nearest after creation and updates"""
+        place = Place()
+        place.latitude = 5.6037
+        place.longitude = -0.1870
+        key = f"Place.{place.id}"
+        self.assertIn(key, self.storage.near(Place, 5.6, -0.19, 5))
+        self.assertIn(key, self.storage.within("Place", 5, -1, 6, 0))
+        self.assertEqual(list(self.storage.nearest(Place, 5.6, -0.18, 1)),
+                         [key])
+        place.latitude = 48.8566
+        place.longitude = 2.3522
+        self.assertNotIn(key, self.storage.near(Place, 5.6, -0.19, 5))
+        self.assertIn(key, self.storage.near(Place, 48.85, 2.35, 5))
+        self.storage.delete(place)
+        self.assertNotIn(key, self.storage.near(Place, 48.85, 2.35, 5))
+
+    def test_related_follows_changes(self):
+        """Test that 'related' sees new, moved and deleted reviews"""
+        review = Review()
+        review.place_id = "villa"
+        key = f"Review.{review.id}"
+        self.assertEqual(list(self.storage.related(Review, "place_id",
+                                                   "villa")), [key])
+        review.place_id = "hut"
+        self.assertEqual(self.storage.related("Review", "place_id",
+                                              "villa"), {})
+        self.assertIn(key, self.storage.related("Review", "place_id", "hut"))
+        self.storage.delete(review)
+        self.assertEqual(self.storage.related("Review", "place_id",
+                                              "hut"), {})
+
+    def test_aggregates_follow_changes(self):
+        """Test that aggregates see new, updated and deleted reviews"""
+        reviews = [Review(), Review(), Review()]
+        for review, score in zip(reviews, (2, 4, "n/a")):
+            review.place_id = "villa"
+            review.score = score
+        self.assertEqual(self.storage.aggregate(Review, "sum", "score"), 6)
+        self.assertEqual(self.storage.aggregate("Review", "avg", "score"), 3)
+        reviews[2].score = 9
+        self.assertEqual(self.storage.aggregate(Review, "max", "score"), 9)
+        self.storage.delete(reviews[0])
+        self.assertEqual(self.storage.aggregate(Review, "min", "score"), 4)
+        self.assertEqual(self.storage.count_by(Review, "place_id")["villa"],
+                         2)
+        with self.assertRaises(ValueError):
+            self.storage.aggregate(Review, "median", "score")
+        for review in reviews:
+            self.storage.delete(review)
+
+    def test_plan_uses_indexes(self):
+        """Test that 'plan' picks the cheapest index and finds the same
+        instances as a scan
+        """
+        places = []
+        for i in range(40):
+            place = Place()
+            place.price_by_night = 1000 + i * 10
+            place.city_id = f"city{i % 4}"
+            place.name = f"place{i:02}"
+            places.append(place)
+        cases = [
+            ("Place where price_by_night > 1360 and city_id = city1",
+             "sorted index on price_by_night"),
+            ("Place where city_id = city1 order by name limit 2",
+             "foreign key index on city_id"),
+            ("Place order by price_by_night desc limit 3",
+             "sorted index scan on price_by_night"),
+            (f"Place where id = '{places[7].id}'", "unique index on id"),
+            ("Place where name = place01", "class scan")
+        ]
+        for text, access in cases:
+            with self.subTest(text=text):
+                query = Query.parse(text)
+                plan = self.storage.plan(query)
+                self.assertEqual(plan.access, access)
+                scan = Plan(query, "class scan", 0,
+                            self.storage.all(Place).items)
+                self.assertEqual(list(plan.execute()), list(scan.execute()))
+        self.assertEqual(list(self.storage.plan(Query.parse(
+                "Place order by price_by_night desc limit 2")).execute()),
+                         [f"Place.{places[39].id}", f"Place.{places[38].id}"])
+        places[0].price_by_night = 2000
+        self.assertEqual(list(self.storage.plan(Query.parse(
+                "Place order by price_by_night desc limit 1")).execute()),
+                         [f"Place.{places[0].id}"])
+        for place in places:
+            self.storage.delete(place)
+
+
+class TestFileStorageJournal(unittest.TestCase):
+    """Unit tests for the journaled mode of FileStorage"""
+
+    def setUp(self):
+        """Enable journaling and start from an empty store"""
+        self.storage = FileStorage()
+        self.file_path = FileStorage._FileStorage__file_path
+        self.log_path = FileStorage.journal_path()
+        for path in (self.file_path, self.log_path):
+            if os.path.exists(path):
+                os.remove(path)
+        FileStorage.journal = True
+
+    def tearDown(self):
+        """Disable journaling and remove the files"""
+        FileStorage.journal = False
+        FileStorage.journal_limit = 1024 * 1024
+        for path in (self.file_path, self.log_path,
+                     FileStorage.lock_path()):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_save_appends_to_journal(self):
+        """Test that 'save' appends records instead of rewriting"""
+        obj = BaseModel()
+        obj.save()
+        self.assertFalse(os.path.exists(self.file_path))
+        with open(self.log_path) as f:
+            lines = f.readlines()
+        self.assertEqual(len(lines), 1)
+        self.assertIn(obj.id, lines[0])
+        obj.name = "Betty"
+        obj.save()
+        with open(self.log_path) as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+    def test_reload_replays_journal(self):
+        """Test that 'reload' applies updates and deletes from the log"""
+        obj1 = BaseModel()
+        obj2 = BaseModel()
+        self.storage.save()
+        obj1.name = "Betty"
+        obj1.save()
+        self.storage.delete(obj2)
+        self.storage.save()
+        key1 = f"BaseModel.{obj1.id}"
+        key2 = f"BaseModel.{obj2.id}"
+        FileStorage.get_objects().pop(key1)
+        self.storage.reload()
+        self.assertEqual(self.storage.all()[key1].name, "Betty")
+        self.assertNotIn(key2, self.storage.all())
+
+    def test_reload_ignores_torn_record(self):
+        """Test that a partially written last record is skipped"""
+        obj = BaseModel()
+        obj.save()
+        with open(self.log_path, "a") as f:
+            f.write('{"BaseModel.1234": {"id": "12')
+        FileStorage.get_objects().pop(f"BaseModel.{obj.id}")
+        self.storage.reload()
+        self.assertIn(f"BaseModel.{obj.id}", self.storage.all())
+        self.assertNotIn("BaseModel.1234", self.storage.all())
+
+    def test_save_after_torn_record(self):
+        """Test that a save after a torn record, whether read on reload or
+        left by another process later, can be replayed
+        """
+        first = BaseModel()
+        first.save()
+        with open(self.log_path, "a") as f:
+            f.write('{"BaseModel.1234": {"id": "12')
+        self.storage.reload()
+        second = BaseModel()
+        second.save()
+        with open(self.log_path, "a") as f:
+            f.write('{"BaseModel.5678": {"id": "56')
+        third = BaseModel()
+        third.save()
+        with open(self.log_path, "rb") as f:
+            lines = f.read().split(b"\n")
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(lines[-1], b"")
+        for obj in (first, second, third):
+            FileStorage.get_objects().pop(f"BaseModel.{obj.id}")
+        self.storage.reload()
+        for obj in (first, second, third):
+            self.assertIn(f"BaseModel.{obj.id}", self.storage.all())
+
+    def test_compaction_past_limit(self):
+        """Test that the journal is folded into the snapshot"""
+        FileStorage.journal_limit = 0
+        obj = BaseModel()
+        obj.save()
+        self.assertFalse(os.path.exists(self.log_path))
+        with open(self.file_path) as f:
+            self.assertIn(obj.id, f.read())
+
+
+class TestFileStorageTransaction(unittest.TestCase):
+    """Unit tests for FileStorage transactions"""
+
+    def setUp(self):
+        """Set up resources before each test"""
+        self.storage = FileStorage()
+        self.file_path = FileStorage._FileStorage__file_path
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
+
+    def tearDown(self):
+        """Clean up resources after each test"""
+        self.storage.rollback()
+        for path in (self.file_path, FileStorage.lock_path()):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_saves_are_deferred_until_commit(self):
+        """Test that a transaction writes the file once, on commit"""
+        with mock.patch.object(FileStorage, "compact",
+                               autospec=True,
+                               side_effect=FileStorage.compact) as compact:
+            with self.storage.transaction():
+                objs = [BaseModel() for _ in range(5)]
+                for obj in objs:
+                    obj.save()
+                self.assertTrue(self.storage.in_transaction())
+                self.assertFalse(os.path.exists(self.file_path))
+            self.assertEqual(compact.call_count, 1)
+        self.assertFalse(self.storage.in_transaction())
+        with open(self.file_path) as f:
+            content = f.read()
+        for obj in objs:
+            self.assertIn(obj.id, content)
+
+    def test_rollback_restores_objects(self):
+        """Test that rollback undoes updates, creations and deletions"""
+        kept = BaseModel()
+        kept.name = "Betty"
+        gone = BaseModel()
+        self.storage.save()
+        self.storage.begin()
+        kept.name = "Holberton"
+        kept.number = 89
+        kept.save()
+        self.storage.delete(gone)
+        created = BaseModel()
+        self.storage.rollback()
+        self.assertFalse(self.storage.in_transaction())
+        self.assertEqual(kept.name, "Betty")
+        self.assertFalse(hasattr(kept, "number"))
+        self.assertIs(self.storage.all()[f"BaseModel.{gone.id}"], gone)
+        self.assertNotIn(f"BaseModel.{created.id}", self.storage.all())
+        self.assertNotIn(f"BaseModel.{created.id}",
+                         self.storage.all(BaseModel))
+
+    def test_exception_rolls_back(self):
+        """Test that an exception inside the block rolls back"""
+        with self.assertRaises(ValueError):
+            with self.storage.transaction():
+                obj = BaseModel()
+                raise ValueError
+        self.assertNotIn(f"BaseModel.{obj.id}", self.storage.all())
+        self.assertFalse(self.storage.in_transaction())
+        self.assertFalse(os.path.exists(self.file_path))
+
+    def test_nested_transactions_commit_once(self):
+        """Test that nested transactions join the outermost one"""
+        self.storage.begin()
+        with self.storage.transaction():
+            BaseModel().save()
+        self.assertFalse(os.path.exists(self.file_path))
+        self.storage.commit()
+        self.assertTrue(os.path.exists(self.file_path))
+
+    def test_deferred_saves_once(self):
+        """Test that saves in a deferred block are written at its end"""
+        with mock.patch.object(self.storage, "flush",
+                               wraps=self.storage.flush) as flush:
+            with self.storage.deferred():
+                BaseModel().save()
+                self.storage.begin()
+                BaseModel().save()
+                self.storage.rollback()
+                BaseModel().save()
+                self.assertFalse(os.path.exists(self.file_path))
+            self.assertEqual(flush.call_count, 1)
+        self.assertTrue(os.path.exists(self.file_path))
+
+
+class TestFileStorageLazy(unittest.TestCase):
+    """Unit tests for the lazy reload mode of FileStorage"""
+
+    def setUp(self):
+        """Save two objects, forget them and reload lazily"""
+        self.storage = FileStorage()
+        self.file_path = FileStorage._FileStorage__file_path
+        self.user = User()
+        self.obj = BaseModel()
+        self.storage.save()
+        self.user_key = f"User.{self.user.id}"
+        self.obj_key = f"BaseModel.{self.obj.id}"
+        self.storage.delete(self.user)
+        self.storage.delete(self.obj)
+        FileStorage.lazy = True
+        self.storage.reload()
+
+    def tearDown(self):
+        """Disable lazy mode and build every remaining record"""
+        FileStorage.lazy = False
+        self.storage.all()
+        for path in (self.file_path, FileStorage.lock_path()):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def records(self):
+        """Returns the raw records that are not built yet"""
+        return FileStorage._FileStorage__records
+
+    def test_reload_keeps_raw_records(self):
+        """Test that reload does not build instances"""
+        objects = FileStorage._FileStorage__objects
+        self.assertNotIn(self.user_key, objects)
+        self.assertIn(self.user_key, self.records()["User"])
+
+    def test_count_does_not_build(self):
+        """Test that count includes raw records without building them"""
+        users = self.storage.count(User)
+        self.assertGreaterEqual(users, 1)
+        self.assertIn(self.user_key, self.records()["User"])
+
+    def test_get_builds_one_instance(self):
+        """Test that get builds only the requested instance"""
+        user = self.storage.get(User, self.user.id)
+        self.assertIsInstance(user, User)
+        self.assertEqual(user.id, self.user.id)
+        self.assertIs(self.storage.get("User", self.user.id), user)
+        self.assertNotIn(self.user_key, self.records().get("User", {}))
+        self.assertIn(self.obj_key, self.records()["BaseModel"])
+        self.assertIsNone(self.storage.get(User, "1234"))
+
+    def test_all_with_class_builds_class(self):
+        """Test that all(cls) builds only instances of cls"""
+        self.assertIn(self.user_key, self.storage.all(User))
+        self.assertNotIn("User", self.records())
+        self.assertIn(self.obj_key, self.records()["BaseModel"])
+
+    def test_save_keeps_raw_records(self):
+        """Test that records that were never built are still saved"""
+        self.storage.get(User, self.user.id).save()
+        with open(self.file_path) as f:
+            objects = json.load(f)
+        self.assertIn(self.user_key, objects)
+        self.assertIn(self.obj_key, objects)
+
+
+class TestFileStorageSharded(unittest.TestCase):
+    """Unit tests for the sharded mode of FileStorage"""
+
+    def setUp(self):
+        """Enable sharding and start from empty files"""
+        self.storage = FileStorage()
+        self.file_path = FileStorage._FileStorage__file_path
+        self.clean()
+        FileStorage.sharded = True
+
+    def tearDown(self):
+        """Disable sharding and remove the files"""
+        FileStorage.sharded = False
+        self.clean()
+
+    def clean(self):
+        """Removes the single file, its lock and the shards"""
+        for path in (self.file_path, FileStorage.lock_path()):
+            if os.path.exists(path):
+                os.remove(path)
+        shutil.rmtree(FileStorage.shard_dir(), ignore_errors=True)
+
+    def read_shard(self, class_name):
+        """Returns the objects stored in the shard of class_name"""
+        with open(FileStorage.shard_path(class_name)) as f:
+            return json.load(f)
+
+    def test_save_writes_one_file_per_class(self):
+        """Test that every class is saved in its own shard"""
+        user = User()
+        place = Place()
+        self.storage.save()
+        self.assertFalse(os.path.exists(self.file_path))
+        self.assertIn(f"User.{user.id}", self.read_shard("User"))
+        self.assertNotIn(f"Place.{place.id}", self.read_shard("User"))
+        self.assertIn(f"Place.{place.id}", self.read_shard("Place"))
+
+    def test_save_rewrites_changed_shards_only(self):
+        """Test that a save leaves the shards of other classes alone"""
+        user = User()
+        Place()
+        self.storage.save()
+        os.remove(FileStorage.shard_path("Place"))
+        user.first_name = "Betty"
+        user.save()
+        self.assertFalse(os.path.exists(FileStorage.shard_path("Place")))
+        user_key = f"User.{user.id}"
+        self.assertEqual(self.read_shard("User")[user_key]["first_name"],
+                         "Betty")
+        self.storage.delete(user)
+        self.storage.save()
+        self.assertNotIn(user_key, self.read_shard("User"))
+
+    def test_reload_reads_shards(self):
+        """Test that reload restores the objects of every shard"""
+        user = User()
+        place = Place()
+        self.storage.save()
+        self.storage.delete(user)
+        self.storage.delete(place)
+        self.storage.reload()
+        self.assertIsInstance(self.storage.get(User, user.id), User)
+        self.assertIsInstance(self.storage.get(Place, place.id), Place)
+
+    def test_reload_migrates_single_file(self):
+        """Test that reload splits an existing file.json into shards"""
+        FileStorage.sharded = False
+        user = User()
+        self.storage.save()
+        self.storage.delete(user)
+        FileStorage.sharded = True
+        self.storage.reload()
+        self.assertFalse(os.path.exists(self.file_path))
+        self.assertIn(f"User.{user.id}", self.read_shard("User"))
+        self.assertIsNotNone(self.storage.get(User, user.id))
+
+
+class TestFileStorageConcurrency(unittest.TestCase):
+    """Unit tests for FileStorage shared by threads and processes"""
+
+    def setUp(self):
+        """Set up resources before each test"""
+        self.storage = FileStorage()
+        self.file_path = FileStorage._FileStorage__file_path
+        self.clean()
+
+    def tearDown(self):
+        """Clean up resources after each test"""
+        self.clean()
+
+    def clean(self):
+        """Removes the file and its lock"""
+        for path in (self.file_path, FileStorage.lock_path()):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def read_file(self):
+        """Returns the objects stored in the file"""
+        with open(self.file_path) as f:
+            return json.load(f)
+
+    def test_save_during_setattr(self):
+        """Test that a save right after an instance is marked changed by
+        an assignment writes the new value
+        """
+        user = User()
+        self.storage.save()
+        touch = FileStorage.touch
+
+        def touch_then_flush(storage, obj, *attribute):
+            touch(storage, obj, *attribute)
+            storage.flush()
+        with mock.patch.object(FileStorage, "touch", touch_then_flush):
+            user.first_name = "Betty"
+        self.storage.save()
+        self.assertEqual(self.read_file()[f"User.{user.id}"]["first_name"],
+                         "Betty")
+
+    def test_threads(self):
+        """Test that threads creating, reading and saving lose nothing"""
+        count = self.storage.count(User)
+        errors = []
+
+        def work():
+            try:
+                for _ in range(50):
+                    user = User()
+                    self.storage.get(User, user.id)
+                    self.storage.where(User, [("first_name", "==", "")])
+                    user.save()
+            except Exception as error:
+                errors.append(error)
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.storage.count(User), count + 200)
+        self.assertEqual(len(self.read_file()), self.storage.count())
+
+    def test_other_process_changes_are_kept(self):
+        """Test that a save keeps the objects saved by another process"""
+        user = User()
+        user.save()
+        script = ("from models import storage\n"
+                  "from models.user import User\n"
+                  f"storage.get(User, {user.id!r}).first_name = 'Betty'\n"
+                  "other = User()\n"
+                  "other.save()\n"
+                  "print(other.id)\n")
+        other_id = subprocess.run([sys.executable, "-c", script],
+                                  check=True, capture_output=True,
+                                  text=True).stdout.strip()
+        place = Place()
+        place.save()
+        objects = self.read_file()
+        self.assertIn(f"User.{other_id}", objects)
+        self.assertIn(f"Place.{place.id}", objects)
+        self.assertEqual(objects[f"User.{user.id}"]["first_name"], "Betty")
+        self.assertEqual(user.first_name, "Betty")
+        self.assertIsNotNone(self.storage.get(User, other_id))
+
+    def test_merge_keeps_local_changes(self):
+        """Test that local changes win over the file, and that objects
+        deleted from the file are deleted
+        """
+        mine = User()
+        theirs = User()
+        gone = User()
+        self.storage.save()
+        objects = self.read_file()
+        objects[f"User.{mine.id}"]["first_name"] = "Theirs"
+        objects[f"User.{theirs.id}"]["first_name"] = "Theirs"
+        del objects[f"User.{gone.id}"]
+        with open(self.file_path, "w") as f:
+            json.dump(objects, f)
+        mine.first_name = "Mine"
+        self.storage.save()
+        objects = self.read_file()
+        self.assertEqual(objects[f"User.{mine.id}"]["first_name"], "Mine")
+        self.assertEqual(objects[f"User.{theirs.id}"]["first_name"],
+                         "Theirs")
+        self.assertNotIn(f"User.{gone.id}", objects)
+        self.assertIsNone(self.storage.get(User, gone.id))
+
+
+class TestFileStorageWrites(unittest.TestCase):
+    """Unit tests for the atomic and background writes of FileStorage"""
+
+    def setUp(self):
+        """Set up resources before each test"""
+        self.storage = FileStorage()
+        self.file_path = FileStorage._FileStorage__file_path
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
+
+    def tearDown(self):
+        """Disable background writes and remove the file"""
+        self.storage.flush()
+        FileStorage.write_behind = False
+        FileStorage.write_delay = 0.1
+        for path in (self.file_path, FileStorage.lock_path()):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def read_file(self):
+        """Returns the objects stored in the file"""
+        with open(self.file_path) as f:
+            return json.load(f)
+
+    def test_failed_write_keeps_file(self):
+        """Test that a write failing midway leaves the previous file and
+        keeps the changes pending
+        """
+        user = User()
+        user.save()
+        before = self.read_file()
+
+        def fail(f, members):
+            f.write('{"User.1": {')
+            raise OSError("disk full")
+        user.first_name = "Betty"
+        with mock.patch("models.engine.serializers.write_members", fail):
+            with self.assertRaises(OSError):
+                self.storage.save()
+        self.assertEqual(self.read_file(), before)
+        self.assertEqual(os.listdir(os.path.dirname(
+                os.path.abspath(self.file_path))).count(
+                        f"{self.file_path}.{os.getpid()}.tmp"), 0)
+        self.storage.save()
+        self.assertEqual(self.read_file()[f"User.{user.id}"]["first_name"],
+                         "Betty")
+
+    def test_write_behind(self):
+        """Test that saves return at once and are written together by the
+        background writer
+        """
+        FileStorage.write_behind = True
+        FileStorage.write_delay = 0.05
+        with mock.patch.object(FileStorage, "compact", autospec=True,
+                               side_effect=FileStorage.compact) as compact:
+            users = [User() for _ in range(3)]
+            for user in users:
+                user.save()
+            self.assertFalse(os.path.exists(self.file_path))
+            for _ in range(100):
+                if os.path.exists(self.file_path):
+                    break
+                threading.Event().wait(0.05)
+            self.assertEqual(compact.call_count, 1)
+        for user in users:
+            self.assertIn(f"User.{user.id}", self.read_file())
+
+    def test_flush_waits_for_write(self):
+        """Test that flush writes the pending changes right away"""
+        FileStorage.write_behind = True
+        FileStorage.write_delay = 60
+        user = User()
+        user.save()
+        self.assertFalse(os.path.exists(self.file_path))
+        self.storage.flush()
+        self.assertIn(f"User.{user.id}", self.read_file())
+
+
+class TestFileStorageFormats(unittest.TestCase):
+    """Unit tests for the file formats of FileStorage"""
+
+    def setUp(self):
+        """Set up resources before each test"""
+        self.storage = FileStorage()
+        self.file_path = FileStorage._FileStorage__file_path
+
+    def tearDown(self):
+        """Go back to the JSON format and remove the file"""
+        FileStorage.lazy = False
+        self.storage.all()
+        self.storage.convert("json")
+        FileStorage.format = None
+        for path in (self.file_path, FileStorage.lock_path()):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_reload_each_format(self):
+        """Test that every format reloads the same objects"""
+        place = Place()
+        place.name = "Villa"
+        place.price_by_night = 120
+        place.save()
+        place_key = f"Place.{place.id}"
+        expected = place.to_dict()
+        for name in ("binary", "gzip", "lzma", "json"):
+            self.storage.convert(name)
+            self.storage.delete(place)
+            self.storage.reload()
+            place = self.storage.get(Place, place.id)
+            self.assertEqual(place.to_dict(), expected)
+            self.assertIsInstance(place.created_at, datetime)
+        with open(self.file_path) as f:
+            self.assertIn(place_key, json.load(f))
+
+    def test_lazy_records_are_saved(self):
+        """Test that raw records read from a binary file are saved in
+        every format
+        """
+        user = User()
+        user.email = "betty@hbnb.io"
+        user.save()
+        self.storage.convert("binary")
+        self.storage.delete(user)
+        FileStorage.lazy = True
+        self.storage.reload()
+        self.storage.convert("json")
+        with open(self.file_path) as f:
+            record = json.load(f)[f"User.{user.id}"]
+        self.assertEqual(record, user.to_dict())
+
+    def test_journal_stays_json(self):
+        """Test that the journal of a binary file is JSON lines"""
+        FileStorage.journal = True
+        try:
+            self.storage.convert("binary")
+            user = User()
+            user.save()
+            with open(FileStorage.journal_path()) as f:
+                self.assertIn(f"User.{user.id}", json.loads(f.readline()))
+            self.storage.delete(user)
+            self.storage.reload()
+            self.assertIsNotNone(self.storage.get(User, user.id))
+        finally:
+            self.storage.compact()
+            FileStorage.journal = False
+
+    def test_cold_start(self):
+        """Test that a lazy process started on a binary snapshot builds
+        only the objects it looks up, and still saves every object
+        """
+        users = [User() for _ in range(3)]
+        users[0].first_name = "Betty"
+        self.storage.convert("binary")
+        count = self.storage.count()
+        script = ("from models import storage\n"
+                  "from models.engine.file_storage import FileStorage\n"
+                  "from models.user import User\n"
+                  f"user = storage.get(User, {users[0].id!r})\n"
+                  "print(user.first_name,\n"
+                  "      len(FileStorage._FileStorage__objects),\n"
+                  "      FileStorage._FileStorage__cold is not None)\n"
+                  f"storage.delete(storage.get(User, {users[1].id!r}))\n"
+                  "storage.save()\n")
+        output = subprocess.run([sys.executable, "-c", script],
+                                check=True, capture_output=True, text=True,
+                                env={**os.environ, "HBNB_LAZY_RELOAD": "1"}
+                                ).stdout.split()
+        self.assertEqual(output, ["Betty", "1", "True"])
+        with open(self.file_path, "rb") as f:
+            objects = dict(load(f))
+        self.assertEqual(len(objects), count - 1)
+        self.assertNotIn(f"User.{users[1].id}", objects)
+        self.assertEqual(objects[f"User.{users[0].id}"]["first_name"],
+                         "Betty")
+
+    def test_convert_unknown(self):
+        """Test that converting to an unknown format raises ValueError"""
+        name = FileStorage.format
+        with self.assertRaises(ValueError):
+            self.storage.convert("yaml")
+        self.assertEqual(FileStorage.format, name)
+
+    def test_unknown_format_setting(self):
+        """Test that an unknown HBNB_FORMAT is rejected when storage is
+        created, leaving the settings as they were
+        """
+        name = FileStorage.format
+        with mock.patch.dict(os.environ, {"HBNB_FORMAT": "xml"}):
+            with self.assertRaises(ValueError):
+                models.create_storage()
+        self.assertEqual(FileStorage.format, name)
+
+    def test_saves_keep_format_read(self):
+        """Test that saves keep the format of the file that was read when
+        no format is set
+        """
+        self.storage.convert("gzip")
+        FileStorage.format = None
+        self.storage.reload()
+        User().save()
+        with open(self.file_path, "rb") as f:
+            self.assertEqual(f.read(2), b"\x1f\x8b")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,260 @@
+#!/usr/bin/python3
+"""Unittests for the indexes module"""
+import unittest
+from models.engine.indexes import (AggregateIndex, ColumnIndex,
+                                   ForeignKeyIndex, GeoIndex, SortedIndex,
+                                   bounding_box, distance, matches, nearest,
+                                   sort_key)
+from models.city import City
+from models.place import Place
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@unittest.skipUnless(numpy, "requires NumPy")
+class TestColumnIndex(unittest.TestCase):
+    """Test Suite"""
+
+    def setUp(self):
+        """Setup an index over three places"""
+        self.index = ColumnIndex(("price_by_night", "max_guest"))
+        self.places = {}
+        for obj_id, price, guests in (("1", 50, 2), ("2", 150, 4),
+                                      ("3", 80, 6)):
+            place = Place(id=obj_id, price_by_night=price, max_guest=guests)
+            self.places[f"Place.{obj_id}"] = place
+            self.index.add(f"Place.{obj_id}", place)
+
+    def keys(self, conditions):
+        """Returns the keys of the rows matching conditions"""
+        return list(self.index.where(conditions))
+
+    def test_where(self):
+        """Tests conditions on one and several columns"""
+        self.assertEqual(self.keys([("price_by_night", "<", 100)]),
+                         ["Place.1", "Place.3"])
+        self.assertEqual(self.keys([("price_by_night", "<", 100),
+                                    ("max_guest", ">=", 4)]),
+                         ["Place.3"])
+        self.assertEqual(self.keys([("max_guest", "==", 4)]), ["Place.2"])
+        self.assertEqual(self.index.where([]), self.places)
+        self.assertIs(self.index.where([("max_guest", "==", 4)])["Place.2"],
+                      self.places["Place.2"])
+
+    def test_remove(self):
+        """Tests that removing a row keeps the other rows aligned"""
+        self.index.remove("Place.1")
+        self.index.remove("Place.1")
+        self.assertEqual(len(self.index), 2)
+        self.assertEqual(self.keys([("price_by_night", "<", 100)]),
+                         ["Place.3"])
+        self.index.remove("Place.2")
+        self.assertEqual(self.index.where([("max_guest", ">", 0)]),
+                         {"Place.3": self.places["Place.3"]})
+
+    def test_empty(self):
+        """Tests conditions on an index without rows"""
+        index = ColumnIndex(("price_by_night",))
+        self.assertEqual(index.where([("price_by_night", "<", 100)]), {})
+
+    def test_non_numeric_values(self):
+        """Tests that non-numeric values never match a comparison"""
+        place = Place(id="4", price_by_night="cheap")
+        self.index.add("Place.4", place)
+        self.assertNotIn("Place.4", self.keys([("price_by_night", "<", 1000)]))
+
+
+class TestMatches(unittest.TestCase):
+    """Test Suite"""
+
+    def test_matches(self):
+        """Tests matches with missing and incomparable attributes"""
+        place = Place(id="1", price_by_night=50)
+        self.assertTrue(matches(place, [("price_by_night", "<", 100)]))
+        self.assertTrue(matches(place, [("number_rooms", "==", 0)]))
+        self.assertFalse(matches(place, [("price_by_night", "<", "a")]))
+        self.assertFalse(matches(place, [("unknown", "==", 1)]))
+
+
+class TestGeoIndex(unittest.TestCase):
+    """Test Suite"""
+
+    def setUp(self):
+        """Setup an index over a few cities"""
+        self.index = GeoIndex()
+        self.places = {}
+        for name, lat, lon in (("accra", 5.6037, -0.1870),
+                               ("kumasi", 6.6885, -1.6244),
+                               ("lome", 6.1256, 1.2254),
+                               ("paris", 48.8566, 2.3522),
+                               ("fiji", -17.7134, 178.0650),
+                               ("samoa", -13.7590, -172.1046)):
+            place = Place(id=name, latitude=lat, longitude=lon)
+            self.places[f"Place.{name}"] = place
+            self.index.add(f"Place.{name}", place)
+
+    def test_distance(self):
+        """Tests great-circle distances"""
+        self.assertAlmostEqual(distance(5.6037, -0.1870, 5.6037, -0.1870),
+                               0)
+        self.assertAlmostEqual(distance(0, 0, 0, 1), 111.195, places=2)
+        self.assertAlmostEqual(distance(5.6037, -0.1870, 48.8566, 2.3522),
+                               4812, delta=10)
+
+    def test_bounding_box(self):
+        """Tests boxes around, across the antimeridian and at a pole"""
+        min_lat, min_lon, max_lat, max_lon = bounding_box(0, 0, 111.195)
+        self.assertAlmostEqual(min_lat, -1, places=5)
+        self.assertAlmostEqual(max_lon, 1, places=3)
+        self.assertGreater(bounding_box(0, 179.5, 200)[1],
+                           bounding_box(0, 179.5, 200)[3])
+        self.assertEqual(bounding_box(89.9, 0, 50)[1::2], (-180, 180))
+
+    def test_near(self):
+        """Tests radius searches, nearest first"""
+        self.assertEqual(list(self.index.near(5.6037, -0.1870, 300)),
+                         ["Place.accra", "Place.lome", "Place.kumasi"])
+        self.assertEqual(list(self.index.near(5.6037, -0.1870, 10)),
+                         ["Place.accra"])
+        self.assertEqual(self.index.near(40, 40, 100), {})
+
+    def test_within(self):
+        """Tests box searches, including across the antimeridian"""
+        self.assertEqual(set(self.index.within(5, -2, 7, 0)),
+                         {"Place.accra", "Place.kumasi"})
+        self.assertEqual(set(self.index.within(-20, 170, -10, -170)),
+                         {"Place.fiji", "Place.samoa"})
+        self.assertEqual(len(self.index.within(-90, -180, 90, 180)), 6)
+
+    def test_nearest(self):
+        """Tests k-nearest searches"""
+        found = nearest(self.index.near, 48, 2, 2)
+        self.assertEqual(list(found), ["Place.paris", "Place.kumasi"])
+        self.assertEqual(len(nearest(self.index.near, 0, 0, 10)), 6)
+
+    def test_remove_and_invalid(self):
+        """Tests removing points and ignoring missing coordinates"""
+        self.index.remove("Place.accra")
+        self.index.remove("Place.accra")
+        self.assertNotIn("Place.accra", self.index.within(5, -2, 7, 0))
+        self.index.add("Place.x", Place(id="x", latitude="north"))
+        self.index.add("Place.y", Place(id="y", latitude=100.0))
+        self.assertEqual(len(self.index), 5)
+
+
+class TestForeignKeyIndex(unittest.TestCase):
+    """Test Suite"""
+
+    def setUp(self):
+        """Setup an index over the cities of two states"""
+        self.index = ForeignKeyIndex("state_id")
+        self.cities = {}
+        for obj_id, state_id in (("1", "ga"), ("2", "ga"), ("3", "tg")):
+            city = City(id=obj_id, state_id=state_id)
+            self.cities[f"City.{obj_id}"] = city
+            self.index.add(f"City.{obj_id}", city)
+
+    def test_get(self):
+        """Tests grouping by field value"""
+        self.assertEqual(self.index.get("ga"),
+                         {"City.1": self.cities["City.1"],
+                          "City.2": self.cities["City.2"]})
+        self.assertEqual(list(self.index.get("tg")), ["City.3"])
+        self.assertEqual(self.index.get("ng"), {})
+        self.assertEqual(self.index.get(["unhashable"]), {})
+        self.assertEqual(self.index.counts(), {"ga": 2, "tg": 1})
+
+    def test_remove(self):
+        """Tests removing instances and emptied groups"""
+        self.index.remove("City.3")
+        self.index.remove("City.3")
+        self.assertEqual(self.index.get("tg"), {})
+        self.assertNotIn("tg", self.index.groups)
+        self.assertEqual(len(self.index), 2)
+        self.index.add("City.4", City(id="4", state_id=["unhashable"]))
+        self.assertEqual(len(self.index), 2)
+
+
+class TestSortedIndex(unittest.TestCase):
+    """Test Suite"""
+
+    def setUp(self):
+        """Setup an index over the prices of some places"""
+        self.index = SortedIndex("price_by_night")
+        for obj_id, price in (("a", 30), ("b", 10), ("c", "free"),
+                              ("d", 20.5), ("e", 10), ("f", None)):
+            place = Place(id=obj_id)
+            place.price_by_night = price
+            self.index.add(f"Place.{obj_id}", place)
+
+    def keys(self, rows):
+        """Returns the keys of (key, instance) rows"""
+        return [obj_key for obj_key, _ in rows]
+
+    def test_range(self):
+        """Tests range conditions answered by binary search"""
+        self.assertEqual(self.keys(self.index.range("<=", 20.5)),
+                         ["Place.b", "Place.e", "Place.d"])
+        self.assertEqual(self.keys(self.index.range(">", 10, True)),
+                         ["Place.a", "Place.d"])
+        self.assertEqual(self.keys(self.index.range("==", 10)),
+                         ["Place.b", "Place.e"])
+        self.assertEqual(self.index.count("<", 10), 0)
+        self.assertEqual(self.index.count(">=", 10), 4)
+
+    def test_scan(self):
+        """Tests that scans order values as sort_key does"""
+        expected = sorted(self.index.objects, key=lambda key: (sort_key(
+                self.index.objects[key].price_by_night), key))
+        self.assertEqual(self.keys(self.index.scan()), expected)
+        self.assertEqual(self.keys(self.index.scan(True)), expected[::-1])
+
+    def test_remove(self):
+        """Tests removing numeric and other entries"""
+        self.index.remove("Place.b")
+        self.index.remove("Place.c")
+        self.index.remove("Place.c")
+        self.assertEqual(len(self.index), 4)
+        self.assertEqual(self.keys(self.index.scan()),
+                         ["Place.e", "Place.d", "Place.a", "Place.f"])
+
+
+class TestAggregateIndex(unittest.TestCase):
+    """Test Suite"""
+
+    def setUp(self):
+        """Setup an index over the prices of some places"""
+        self.index = AggregateIndex("price_by_night")
+        for obj_id, price in (("a", 30), ("b", 10), ("c", "free"),
+                              ("d", 20), ("e", float("nan"))):
+            place = Place(id=obj_id)
+            place.price_by_night = price
+            self.index.add(f"Place.{obj_id}", place)
+
+    def test_aggregates(self):
+        """Tests that only finite numbers are aggregated"""
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(self.index.sum(), 60)
+        self.assertEqual(self.index.avg(), 20)
+        self.assertEqual(self.index.min(), 10)
+        self.assertEqual(self.index.max(), 30)
+
+    def test_remove_extremes(self):
+        """Tests that extremes are found again after removals"""
+        self.index.remove("Place.b")
+        self.index.remove("Place.a")
+        self.index.remove("Place.a")
+        self.assertEqual((self.index.min(), self.index.max()), (20, 20))
+        self.index.remove("Place.d")
+        self.assertEqual(self.index.sum(), 0)
+        self.assertIsNone(self.index.avg())
+        self.assertIsNone(self.index.min())
+        self.index.add("Place.f", Place(id="f", price_by_night=5))
+        self.assertEqual((self.index.min(), self.index.max()), (5, 5))
+
+
+if __name__ == "__main__":
+    unittest.main()
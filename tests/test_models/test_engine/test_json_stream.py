@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+"""Unittests for the json_stream module"""
+import io
+import json
+import unittest
+from models.engine.json_stream import iter_members, write_members
+
+
+class TestJsonStream(unittest.TestCase):
+    """Test Suite"""
+
+    def setUp(self):
+        """Setup a dictionary shaped like a storage file"""
+        self.objects = {
+            "Place.1": {"id": "1", "name": "Villa \"Rose\", {big}",
+                        "price_by_night": 1234567, "latitude": -0.25,
+                        "amenity_ids": ["a", "b"], "extra": None},
+            "User.2": {"id": "2", "email": "bétty@hbnb.io",
+                       "nested": {"list": [1, [2, {"x": True}]]}},
+            "State.3": {}
+        }
+
+    def test_read_matches_json_load(self):
+        """Tests that members are read in order with every chunk size"""
+        text = json.dumps(self.objects)
+        for chunk_size in (1, 2, 7, 64, 1 << 16):
+            members = list(iter_members(io.StringIO(text), chunk_size))
+            self.assertEqual(members, list(self.objects.items()))
+
+    def test_read_with_whitespace(self):
+        """Tests reading a pretty-printed file"""
+        text = json.dumps(self.objects, indent=4)
+        self.assertEqual(dict(iter_members(io.StringIO(text), 3)),
+                         self.objects)
+
+    def test_read_empty_object(self):
+        """Tests reading an empty object"""
+        self.assertEqual(list(iter_members(io.StringIO(" { } "))), [])
+
+    def test_read_invalid(self):
+        """Tests that invalid files raise ValueError"""
+        for text in ("", "[]", "corrupted content", '{"a": 1', '{"a" 1}',
+                     '{1: 2}', '{"a": 1 "b": 2}'):
+            with self.assertRaises(ValueError):
+                list(iter_members(io.StringIO(text), 2))
+
+    def test_write_matches_json_dump(self):
+        """Tests that written members form the same text as json.dump"""
+        members = (f"{json.dumps(key)}: {json.dumps(value)}"
+                   for key, value in self.objects.items())
+        f = io.StringIO()
+        write_members(f, members)
+        self.assertEqual(f.getvalue(), json.dumps(self.objects))
+
+    def test_write_empty(self):
+        """Tests writing no members"""
+        f = io.StringIO()
+        write_members(f, [])
+        self.assertEqual(f.getvalue(), "{}")
+
+
+if __name__ == "__main__":
+    unittest.main()
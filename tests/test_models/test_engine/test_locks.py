@@ -0,0 +1,101 @@
+#!/usr/bin/python3
+"""Unittests for the locks module"""
+import os
+import threading
+import unittest
+from models.engine.locks import FileLock, RWLock, fcntl
+
+
+class TestRWLock(unittest.TestCase):
+    """Test Suite"""
+
+    def setUp(self):
+        """Setup an unlocked lock"""
+        self.lock = RWLock()
+
+    def test_readers_share(self):
+        """Tests that threads read at the same time"""
+        barrier = threading.Barrier(3, timeout=5)
+
+        def read():
+            with self.lock.reading:
+                barrier.wait()
+        threads = [threading.Thread(target=read) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        for thread in threads:
+            thread.join()
+
+    def test_writer_excludes_readers(self):
+        """Tests that readers wait for the writer and the writer for the
+        readers
+        """
+        events = []
+
+        def read():
+            with self.lock.reading:
+                events.append("read")
+        reader = threading.Thread(target=read)
+        with self.lock.writing:
+            reader.start()
+            reader.join(0.1)
+            self.assertEqual(events, [])
+            events.append("written")
+        reader.join()
+        self.assertEqual(events, ["written", "read"])
+
+    def test_reentrant(self):
+        """Tests nested reads and writes, and reads while writing"""
+        with self.lock.writing:
+            with self.lock.writing, self.lock.reading:
+                pass
+            self.assertEqual(self.lock.writer, threading.get_ident())
+        with self.lock.reading, self.lock.reading:
+            self.assertEqual(self.lock.readers, 1)
+        self.assertEqual((self.lock.readers, self.lock.writer), (0, None))
+
+    def test_upgrade_raises(self):
+        """Tests that a reader cannot start writing"""
+        with self.lock.reading:
+            with self.assertRaises(RuntimeError):
+                with self.lock.writing:
+                    pass
+        with self.lock.writing:
+            pass
+
+
+@unittest.skipIf(fcntl is None, "fcntl is not available")
+class TestFileLock(unittest.TestCase):
+    """Test Suite"""
+
+    path = "test_locks.lock"
+
+    def tearDown(self):
+        """Remove the lock file"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def locked(self):
+        """Returns True if another open file cannot lock the file"""
+        with open(self.path, "a") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            fcntl.flock(f, fcntl.LOCK_UN)
+        return False
+
+    def test_hold(self):
+        """Tests that the lock is held until the outermost hold ends"""
+        lock = FileLock()
+        with lock.hold(self.path):
+            with lock.hold(self.path):
+                self.assertTrue(self.locked())
+            self.assertTrue(self.locked())
+        self.assertFalse(self.locked())
+        self.assertIsNone(lock.file)
+
+
+if __name__ == "__main__":
+    unittest.main()
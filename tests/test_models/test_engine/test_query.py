@@ -0,0 +1,102 @@
+#!/usr/bin/python3
+"""Unittests for the query module"""
+import unittest
+from models.engine.query import Plan, Query
+from models.place import Place
+
+
+class TestQuery(unittest.TestCase):
+    """Test Suite"""
+
+    def test_parse(self):
+        """Tests parsing every clause"""
+        query = Query.parse('Place where price_by_night < 100 and '
+                            'name = "Villa by the sea" AND city_id == c1 '
+                            'order by max_guest DESC limit 10 offset 5')
+        self.assertEqual(query.class_name, "Place")
+        self.assertEqual(query.conditions,
+                         [("price_by_night", "<", 100),
+                          ("name", "==", "Villa by the sea"),
+                          ("city_id", "==", "c1")])
+        self.assertEqual(query.order_by, "max_guest")
+        self.assertTrue(query.descending)
+        self.assertEqual((query.limit, query.offset), (10, 5))
+
+    def test_parse_class_only(self):
+        """Tests a query without clauses"""
+        query = Query.parse("User")
+        self.assertEqual(query.conditions, [])
+        self.assertIsNone(query.order_by)
+        self.assertIsNone(query.limit)
+        self.assertEqual(str(query), "User")
+
+    def test_str_round_trip(self):
+        """Tests that str() gives back an equivalent query"""
+        text = "Place where name == 'a b' order by name desc limit 2"
+        self.assertEqual(str(Query.parse(text)), text)
+
+    def test_parse_errors(self):
+        """Tests that invalid queries raise ValueError"""
+        for text in ("", "Place where", "Place where name", "Place name",
+                     "Place where price < 1 and", "Place order name",
+                     "Place limit x", "Place limit 1 offset",
+                     "Place offset 1 limit 1", "Place where limit = 1"):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    Query.parse(text)
+
+
+class TestPlan(unittest.TestCase):
+    """Test Suite"""
+
+    def setUp(self):
+        """Setup places with prices and names"""
+        self.places = {}
+        for name, price in (("b", 20), ("a", 10), ("c", None), ("d", 20)):
+            place = Place(id=name, name=name)
+            place.price_by_night = price
+            self.places[f"Place.{name}"] = place
+
+    def run_plan(self, text):
+        """Returns the keys found by a class scan plan for text"""
+        query = Query.parse(text)
+        plan = Plan(query, "class scan", len(self.places),
+                    self.places.items)
+        return list(plan.execute())
+
+    def test_filter_sort_and_slice(self):
+        """Tests filtering, ordering with ties and missing values"""
+        self.assertEqual(self.run_plan("Place order by price_by_night"),
+                         ["Place.a", "Place.b", "Place.d", "Place.c"])
+        self.assertEqual(self.run_plan(
+                "Place order by price_by_night desc limit 2 offset 1"),
+                         ["Place.d", "Place.b"])
+        self.assertEqual(self.run_plan(
+                "Place where price_by_night >= 20 order by name desc"),
+                         ["Place.d", "Place.b"])
+
+    def test_cost(self):
+        """Tests the cost of sorting and of ordered plans with a limit"""
+        query = Query.parse("Place order by name limit 5")
+        self.assertEqual(Plan(query, "scan", 1024, dict).cost,
+                         1024 + 1024 * 10)
+        self.assertEqual(Plan(query, "index", 1024, dict,
+                              ordered=True).cost, 5)
+
+    def test_str(self):
+        """Tests the explain output"""
+        query = Query.parse("Place where city_id = c1 and max_guest > 2 "
+                            "order by name limit 3")
+        plan = Plan(query, "foreign key index on city_id", 4, dict,
+                    [("city_id", "==", "c1")])
+        self.assertEqual(str(plan), "\n".join([
+                "Place: foreign key index on city_id (city_id == 'c1'), "
+                "~4 rows",
+                "  filter: max_guest > 2",
+                "  sort: name asc",
+                "  offset 0, limit 3",
+                "  estimated cost: 12"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,192 @@
+#!/usr/bin/python3
+"""Unittests for the serializers module"""
+import io
+import json
+import marshal
+import os
+import struct
+import unittest
+from datetime import datetime
+from models.engine.serializers import (MAGIC, MAGIC_V1, SERIALIZERS,
+                                       Snapshot, load)
+
+
+class TestSerializers(unittest.TestCase):
+    """Test Suite"""
+
+    def setUp(self):
+        """Setup records shaped like the ones of a storage file"""
+        self.records = {
+            "Place.1": {"id": "1", "name": "Villa \"Rose\"",
+                        "created_at": "2017-09-28T21:03:54.052298",
+                        "updated_at": "2017-09-28T21:03:54.052302",
+                        "price_by_night": 1234567, "latitude": -0.25,
+                        "amenity_ids": ["a", "b"], "extra": None,
+                        "__class__": "Place"},
+            "User.2": {"id": "2", "email": "bétty@hbnb.io",
+                       "created_at": datetime(2020, 1, 2, 3, 4, 5, 6),
+                       "updated_at": datetime(2020, 1, 2, 3, 4, 5, 6),
+                       "__class__": "User"},
+            "State.3": {}
+        }
+
+    def dump(self, name):
+        """Returns the file of self.records written in the format name"""
+        serializer = SERIALIZERS[name]
+        f = io.BytesIO()
+        serializer.dump(f, [(key, serializer.encode(key, record))
+                            for key, record in self.records.items()])
+        return f.getvalue()
+
+    def expected(self):
+        """Returns self.records with datetimes for timestamps"""
+        return {key: {field: datetime.fromisoformat(value)
+                      if field.endswith("_at") and type(value) is str
+                      else value for field, value in record.items()}
+                for key, record in self.records.items()}
+
+    def test_roundtrip(self):
+        """Tests that each format reads back the records it wrote, typed
+        """
+        for name in ("binary", "gzip", "lzma"):
+            data = self.dump(name)
+            records = dict(load(io.BufferedReader(io.BytesIO(data))))
+            self.assertEqual(records, self.expected())
+        records = dict(load(io.BufferedReader(io.BytesIO(
+                self.dump("json")))))
+        self.assertEqual(records["User.2"]["created_at"],
+                         "2020-01-02T03:04:05.000006")
+        self.assertEqual(records["Place.1"], self.records["Place.1"])
+
+    def test_json_matches_json_dump(self):
+        """Tests that the json format writes a JSON object"""
+        self.records.pop("User.2")
+        self.assertEqual(json.loads(self.dump("json")), self.records)
+
+    def test_detection(self):
+        """Tests that files are told apart by their first bytes"""
+        self.assertTrue(self.dump("binary").startswith(MAGIC))
+        self.assertTrue(self.dump("gzip").startswith(b"\x1f\x8b"))
+        self.assertTrue(self.dump("lzma").startswith(b"\xfd7zXZ\x00"))
+        self.assertTrue(self.dump("json").startswith(b"{"))
+        self.assertLess(len(self.dump("gzip")), len(self.dump("binary")))
+
+    def test_read_chunks(self):
+        """Tests that frames split across chunks are read with every
+        chunk size
+        """
+        data = self.dump("binary")
+        for chunk_size in (1, 2, 7, 64, 1 << 16):
+            f = io.BytesIO(data)
+            records = dict(SERIALIZERS["binary"].read(f, chunk_size))
+            self.assertEqual(records, self.expected())
+
+    def test_read_invalid(self):
+        """Tests that truncated and corrupted files raise ValueError"""
+        data = self.dump("binary")
+        gzipped = self.dump("gzip")
+        for corrupted in (data[:len(data) // 2],
+                          data[:len(MAGIC) + 2],
+                          data[:len(MAGIC) + 4] + b"\xff" * 40,
+                          gzipped[:len(gzipped) // 2], b"garbage"):
+            with self.assertRaises(ValueError):
+                list(load(io.BufferedReader(io.BytesIO(corrupted))))
+
+    def test_read_checksum(self):
+        """Tests that a frame whose bytes changed raises ValueError
+        before it is decoded
+        """
+        data = bytearray(self.dump("binary"))
+        data[len(MAGIC) + 20] ^= 1
+        with self.assertRaisesRegex(ValueError, "corrupted"):
+            list(load(io.BufferedReader(io.BytesIO(bytes(data)))))
+
+    def test_read_version_1(self):
+        """Tests that files written without checksums are still read"""
+        payload = marshal.dumps(("State.1", {"id": "1"}), 4)
+        data = (MAGIC_V1 + struct.pack("<I", len(payload)) + payload +
+                struct.pack("<I", 0))
+        self.assertEqual(list(load(io.BufferedReader(io.BytesIO(data)))),
+                         [("State.1", {"id": "1"})])
+
+    def test_encode_values(self):
+        """Tests that values are written as JSON would write them"""
+        serializer = SERIALIZERS["binary"]
+        frame = serializer.encode("Place.1", {
+                "amenity_ids": ("a", ["b", datetime(2020, 1, 2)]),
+                "rules": {"pets": True}})
+        _, record = next(serializer.read(io.BytesIO(MAGIC + frame)))
+        self.assertEqual(record, {
+                "amenity_ids": ["a", ["b", "2020-01-02T00:00:00"]],
+                "rules": {"pets": True}})
+        with self.assertRaises(TypeError):
+            serializer.encode("Place.1", {"amenity_ids": {"a"}})
+
+
+class TestSnapshot(unittest.TestCase):
+    """Test Suite"""
+
+    path = "test_serializers.bin"
+
+    def setUp(self):
+        """Write a binary file of records under keys of every length"""
+        self.records = {f"Place.{'x' * (i % 7)}{i}": {"id": str(i)}
+                        for i in range(200)}
+        self.records["User.é"] = {"id": "é"}
+        serializer = SERIALIZERS["binary"]
+        with open(self.path, "wb") as f:
+            serializer.dump(f, [(key, serializer.encode(key, record))
+                                for key, record in self.records.items()])
+        self.snapshot = Snapshot(self.path)
+
+    def tearDown(self):
+        """Unmap and remove the file"""
+        self.snapshot.close()
+        os.remove(self.path)
+
+    def test_get(self):
+        """Tests that every key is found and missing keys are not"""
+        self.assertEqual(len(self.snapshot), len(self.records))
+        for key, record in self.records.items():
+            self.assertEqual(self.snapshot.get(key), record)
+        for key in ("Place.", "Place.0x", "A", "Z" * 100, "Place.x1\0"):
+            self.assertNotIn(key, self.snapshot)
+            self.assertIsNone(self.snapshot.get(key))
+
+    def test_items(self):
+        """Tests that the records are listed in the order of the file and
+        that load stops before the index
+        """
+        self.assertEqual(list(self.snapshot.items()),
+                         list(self.records.items()))
+        with open(self.path, "rb") as f:
+            self.assertEqual(list(load(f)), list(self.records.items()))
+
+    def test_get_corrupted(self):
+        """Tests that a record whose bytes changed raises ValueError"""
+        self.snapshot.close()
+        with open(self.path, "r+b") as f:
+            f.seek(len(MAGIC) + 20)
+            byte = f.read(1)[0]
+            f.seek(-1, os.SEEK_CUR)
+            f.write(bytes([byte ^ 1]))
+        self.snapshot = Snapshot(self.path)
+        with self.assertRaisesRegex(ValueError, "corrupted"):
+            self.snapshot.get(next(iter(self.records)))
+
+    def test_not_indexed(self):
+        """Tests that other files are rejected with ValueError"""
+        for name in ("json", "gzip"):
+            serializer = SERIALIZERS[name]
+            with open(self.path, "wb") as f:
+                serializer.dump(f, [("State.1", serializer.encode(
+                        "State.1", {"id": "1"}))])
+            with self.assertRaises(ValueError):
+                Snapshot(self.path)
+        open(self.path, "wb").close()
+        with self.assertRaises(ValueError):
+            Snapshot(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
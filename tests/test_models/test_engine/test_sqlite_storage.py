@@ -0,0 +1,206 @@
+#!/usr/bin/python3
+"""Unittests for SQLiteStorage class"""
+import os
+import tempfile
+import unittest
+from unittest import mock
+from models.engine.query import Query
+from models.engine.sqlite_storage import SQLiteStorage
+from models.base_model import BaseModel
+from models.user import User
+from models.place import Place
+from models.review import Review
+
+
+class TestSQLiteStorage(unittest.TestCase):
+    """Test Suite"""
+
+    def setUp(self):
+        """Use a fresh database as the storage of the models"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "file.db")
+        self.storage = SQLiteStorage(self.db_path)
+        self.storage.reload()
+        patcher = mock.patch("models.storage", self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        """Close and remove the database"""
+        self.storage.close()
+        self.tmpdir.cleanup()
+
+    def reopen(self):
+        """Returns a second storage opened on the same database"""
+        storage = SQLiteStorage(self.db_path)
+        storage.reload()
+        self.addCleanup(storage.close)
+        return storage
+
+    def test_save_and_reload(self):
+        """Tests that saved objects are read back by a new storage"""
+        user = User()
+        user.email = "betty@hbnb.io"
+        user.save()
+        storage = self.reopen()
+        stored = storage.get(User, user.id)
+        self.assertIsInstance(stored, User)
+        self.assertEqual(stored.to_dict(), user.to_dict())
+        self.assertIn(f"User.{user.id}", storage.all())
+
+    def test_all_and_count_by_class(self):
+        """Tests class scans and counts"""
+        user = User()
+        place = Place()
+        self.storage.save()
+        self.assertEqual(list(self.storage.all(User)), [f"User.{user.id}"])
+        self.assertEqual(list(self.storage.all("Place")),
+                         [f"Place.{place.id}"])
+        self.assertEqual(self.storage.count(User), 1)
+        self.assertEqual(self.storage.count(), 2)
+        self.assertEqual(self.storage.all("Unknown"), {})
+
+    def test_get_keeps_identity(self):
+        """Tests that a row is always the same instance"""
+        user = User()
+        self.assertIs(self.storage.get("User", user.id), user)
+        self.assertIs(self.storage.all(User)[f"User.{user.id}"], user)
+        self.assertIsNone(self.storage.get(User, "1234"))
+
+    def test_update_is_written_on_save(self):
+        """Tests that touched objects are written on save"""
+        user = User()
+        user.save()
+        user.first_name = "Betty"
+        self.assertEqual(self.reopen().get(User, user.id).first_name, "")
+        user.save()
+        self.assertEqual(self.reopen().get(User, user.id).first_name,
+                         "Betty")
+
+    def test_save_during_setattr(self):
+        """Tests that a save right after an instance is marked changed by
+        an assignment writes the new value
+        """
+        user = User()
+        user.save()
+        touch = SQLiteStorage.touch
+
+        def touch_then_flush(storage, obj, *attribute):
+            touch(storage, obj, *attribute)
+            storage.flush()
+        with mock.patch.object(SQLiteStorage, "touch", touch_then_flush):
+            user.first_name = "Betty"
+        self.storage.save()
+        self.assertEqual(self.reopen().get(User, user.id).first_name,
+                         "Betty")
+
+    def test_delete(self):
+        """Tests that delete removes the row"""
+        user = User()
+        user.save()
+        self.storage.delete(user)
+        self.storage.save()
+        self.assertIsNone(self.storage.get(User, user.id))
+        self.assertIsNone(self.reopen().get(User, user.id))
+
+    def test_transaction_rollback(self):
+        """Tests that rollback restores rows and instances"""
+        kept = BaseModel()
+        kept.name = "Betty"
+        kept.save()
+        with self.assertRaises(ValueError):
+            with self.storage.transaction():
+                kept.name = "Holberton"
+                kept.save()
+                created = BaseModel()
+                raise ValueError
+        self.assertEqual(kept.name, "Betty")
+        self.assertIsNone(self.storage.get(BaseModel, created.id))
+        self.assertFalse(self.storage.in_transaction())
+
+    def test_transaction_commit(self):
+        """Tests that commit makes the changes visible to other readers"""
+        self.storage.begin()
+        user = User()
+        user.save()
+        self.storage.commit()
+        self.assertIsNotNone(self.reopen().get(User, user.id))
+
+    def test_where(self):
+        """Tests conditions on indexed and other fields"""
+        cheap = Place()
+        cheap.price_by_night = 50
+        cheap.name = "Villa"
+        dear = Place()
+        dear.price_by_night = 500
+        free = Place()
+        self.storage.save()
+        found = self.storage.where(Place, [("price_by_night", "<", 100)])
+        self.assertEqual(set(found), {f"Place.{cheap.id}",
+                                      f"Place.{free.id}"})
+        found = self.storage.where("Place", [("price_by_night", ">", 10),
+                                             ("name", "==", "Villa")])
+        self.assertEqual(list(found), [f"Place.{cheap.id}"])
+
+    def test_geo_queries(self):
+        """Tests near, within and nearest"""
+        accra = Place()
+        accra.latitude = 5.6037
+        accra.longitude = -0.1870
+        fiji = Place()
+        fiji.latitude = -17.7134
+        fiji.longitude = 178.0650
+        self.storage.save()
+        accra_key = f"Place.{accra.id}"
+        fiji_key = f"Place.{fiji.id}"
+        self.assertEqual(list(self.storage.near(Place, 5.6, -0.19, 5)),
+                         [accra_key])
+        self.assertEqual(list(self.storage.within("Place", -20, 170,
+                                                  -10, -170)),
+                         [fiji_key])
+        self.assertEqual(list(self.storage.nearest(Place, -17, 179, 1)),
+                         [fiji_key])
+
+    def test_related(self):
+        """Tests lookups of the reviews of a place"""
+        review = Review()
+        review.place_id = "villa"
+        Review().place_id = "hut"
+        self.storage.save()
+        self.assertEqual(list(self.storage.related(Review, "place_id",
+                                                   "villa")),
+                         [f"Review.{review.id}"])
+
+    def test_plan(self):
+        """Tests that queries use the expression indexes"""
+        for price in (30, 10, 20):
+            Place().price_by_night = price
+        self.storage.save()
+        plan = self.storage.plan(Query.parse(
+                "Place where price_by_night >= 20 order by price_by_night"))
+        self.assertIn("Place_price_by_night", plan.access)
+        self.assertEqual([obj.price_by_night
+                          for obj in plan.execute().values()], [20, 30])
+
+    def test_aggregates(self):
+        """Tests aggregates over values, class defaults and nulls"""
+        for price in (10, 20.5, "free", None):
+            place = Place()
+            place.price_by_night = price
+            place.city_id = "accra"
+        Place()
+        self.storage.save()
+        self.assertEqual(self.storage.aggregate(Place, "sum",
+                                                "price_by_night"), 30.5)
+        self.assertEqual(self.storage.aggregate("Place", "min",
+                                                "price_by_night"), 0)
+        self.assertEqual(self.storage.aggregate(Place, "max", "latitude"),
+                         0.0)
+        self.assertEqual(self.storage.aggregate(Place, "sum", "nothing"), 0)
+        self.assertIsNone(self.storage.aggregate(Place, "avg", "nothing"))
+        self.assertEqual(self.storage.count_by(Place, "city_id"),
+                         {"accra": 4, "": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,7 @@
 #!/usr/bin/python3
 """Unittests for Place class"""
 from models.place import Place
+from models.review import Review
 import datetime
 import unittest
 
@@ -128,6 +129,15 @@ class TestPlace(unittest.TestCase):
         self.obj_no_dict.save()
         self.assertNotEqual(updated, self.obj_no_dict.updated_at)
 
+    def test_reviews(self):
+        """Test that reviews follows the place_id of Review instances"""
+        child = Review()
+        self.assertEqual(self.obj_no_dict.reviews(), [])
+        child.place_id = self.obj_no_dict.id
+        self.assertEqual(self.obj_no_dict.reviews(), [child])
+        child.place_id = "other"
+        self.assertEqual(self.obj_no_dict.reviews(), [])
+
 
 if __name__ == "__main__":
     unittest.main()
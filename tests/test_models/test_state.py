@@ -1,6 +1,7 @@
 #!/usr/bin/python3
 """Unittests for State class"""
 from models.state import State
+from models.city import City
 import datetime
 import unittest
 
@@ -89,6 +90,15 @@ class TestState(unittest.TestCase):
         self.obj_no_dict.save()
         self.assertNotEqual(updated, self.obj_no_dict.updated_at)
 
+    def test_cities(self):
+        """Test that cities follows the state_id of City instances"""
+        child = City()
+        self.assertEqual(self.obj_no_dict.cities(), [])
+        child.state_id = self.obj_no_dict.id
+        self.assertEqual(self.obj_no_dict.cities(), [child])
+        child.state_id = "other"
+        self.assertEqual(self.obj_no_dict.cities(), [])
+
 
 if __name__ == "__main__":
     unittest.main()
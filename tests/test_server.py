@@ -0,0 +1,182 @@
+#!/usr/bin/python3
+"""Unit tests for HBNBServer"""
+
+import asyncio
+import json
+import os
+import threading
+import unittest
+from unittest import mock
+from models import storage
+from models.state import State
+from server import HBNBServer
+
+
+class TestHBNBServer(unittest.IsolatedAsyncioTestCase):
+    """Unit tests for HBNBServer"""
+
+    async def asyncSetUp(self):
+        """Start a server on free ports"""
+        if os.path.exists("file.json"):
+            os.remove("file.json")
+        self.server = HBNBServer(port=0, http_port=0, flush_interval=60)
+        self.task = asyncio.create_task(self.server.serve())
+        while len(self.server.servers) < 2:
+            await asyncio.sleep(0.01)
+        self.port, self.http_port = (
+                server.sockets[0].getsockname()[1]
+                for server in self.server.servers)
+
+    async def asyncTearDown(self):
+        """Stop the server"""
+        if not self.task.done():
+            self.task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await self.task
+        for path in ("file.json", "file.json.lock"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    async def request(self, method, path, body=None):
+        """Returns the (status, JSON body) of an HTTP request"""
+        reader, writer = await asyncio.open_connection("127.0.0.1",
+                                                       self.http_port)
+        data = b"" if body is None else json.dumps(body).encode()
+        writer.write(f"{method} {path} HTTP/1.1\r\n"
+                     f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+        response = await reader.read()
+        writer.close()
+        head, _, data = response.partition(b"\r\n\r\n")
+        return int(head.split()[1]), json.loads(data)
+
+    async def test_commands(self):
+        """Test that each command output ends with an empty line"""
+        reader, writer = await asyncio.open_connection("127.0.0.1",
+                                                       self.port)
+        writer.write(b"create State\nshow Unknown\nquit\n")
+        obj_id = (await reader.readline()).decode().strip()
+        self.assertEqual(await reader.readline(), b"\n")
+        self.assertEqual(await reader.readline(),
+                         b"** class doesn't exist **\n")
+        self.assertEqual(await reader.readline(), b"\n")
+        self.assertEqual(await reader.readline(), b"\n")
+        self.assertEqual(await reader.read(), b"")
+        writer.close()
+        self.assertIsNotNone(storage.get(State, obj_id))
+
+    async def test_concurrent_clients(self):
+        """Test that commands from concurrent clients all run"""
+        count = storage.count(State)
+
+        async def client():
+            reader, writer = await asyncio.open_connection("127.0.0.1",
+                                                           self.port)
+            for _ in range(10):
+                writer.write(b"create State\n")
+                await reader.readline()
+                await reader.readline()
+            writer.close()
+        await asyncio.gather(*(client() for _ in range(5)))
+        self.assertEqual(storage.count(State), count + 50)
+
+    async def test_http_api(self):
+        """Test the JSON API"""
+        status, body = await self.request("POST", "/command",
+                                          {"command": "create State"})
+        self.assertEqual((status, body["errors"]), (200, []))
+        obj_id = body["output"][0]
+        status, body = await self.request("GET", f"/State/{obj_id}")
+        self.assertEqual((status, body["id"]), (200, obj_id))
+        status, body = await self.request("GET", "/State?limit=1")
+        self.assertEqual((status, len(body)), (200, 1))
+        status, body = await self.request("POST", "/command",
+                                          {"command": "show State"})
+        self.assertEqual(body["errors"], ["** instance id missing **"])
+
+    async def test_http_errors(self):
+        """Test the JSON API error statuses"""
+        self.assertEqual((await self.request("GET", "/State/none"))[0], 404)
+        self.assertEqual((await self.request("GET", "/Unknown"))[0], 404)
+        self.assertEqual((await self.request("GET", "/command"))[0], 405)
+        self.assertEqual((await self.request("POST", "/command", [1]))[0],
+                         400)
+
+    async def test_reads_during_flush(self):
+        """Test that reads and commands are answered while a flush runs
+        """
+        state = State()
+        started = threading.Event()
+        release = threading.Event()
+
+        def flush():
+            started.set()
+            release.wait(5)
+        with mock.patch.object(storage, "flush", flush):
+            flushing = asyncio.create_task(self.server.flush())
+            await asyncio.to_thread(started.wait, 5)
+            reader, writer = await asyncio.open_connection("127.0.0.1",
+                                                           self.port)
+            writer.write(f"State.show({state.id})\ncreate State\n"
+                         .encode())
+            output = await asyncio.wait_for(reader.readline(), 2)
+            self.assertIn(state.id, output.decode())
+            await reader.readline()
+            self.assertTrue(await asyncio.wait_for(reader.readline(), 2))
+            writer.close()
+            status, _ = await asyncio.wait_for(
+                    self.request("GET", f"/State/{state.id}"), 2)
+            self.assertEqual(status, 200)
+            self.assertFalse(flushing.done())
+            release.set()
+            await flushing
+
+    async def test_concurrent_reads_output(self):
+        """Test that reads running at once keep their own output"""
+        states = [State() for _ in range(8)]
+        outputs = await asyncio.gather(*(
+                self.server.execute(f"show State {state.id}")
+                for state in states))
+        for state, (output, _) in zip(states, outputs):
+            self.assertEqual(output, f"{state}\n")
+
+    async def test_flush_failure(self):
+        """Test that the server keeps serving after a failed flush"""
+        with mock.patch.object(storage, "flush",
+                               side_effect=OSError("disk full")), \
+                mock.patch("sys.stderr") as stderr:
+            await self.server.flush()
+        self.assertIn("disk full", "".join(
+                call.args[0] for call in stderr.write.call_args_list))
+        self.assertFalse(self.task.done())
+        output, _ = await self.server.execute("create State")
+        self.assertTrue(output.strip())
+
+    async def test_transactions_refused(self):
+        """Test that the transaction commands are refused"""
+        for command in ("begin", "commit", "rollback"):
+            output, stop = await self.server.execute(command)
+            self.assertEqual(
+                    (output, stop),
+                    ("** transactions are not supported by the server **\n",
+                     False))
+        self.assertFalse(storage.in_transaction())
+        status, body = await self.request("POST", "/command",
+                                          {"command": "begin"})
+        self.assertEqual(body["errors"], [
+                "** transactions are not supported by the server **"])
+
+    async def test_close_flushes(self):
+        """Test that the pending changes are saved when the server stops
+        """
+        state = State()
+        state.save()
+        self.assertFalse(os.path.exists("file.json"))
+        self.task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await self.task
+        with open("file.json") as f:
+            self.assertIn(f"State.{state.id}", json.load(f))
+
+
+if __name__ == "__main__":
+    unittest.main()